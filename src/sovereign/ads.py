@@ -0,0 +1,588 @@
+"""
+Aggregated Discovery Service (ADS)
+
+Serves the same rendered resources as the REST discovery endpoint over
+long-lived gRPC streams. Rather than each proxy polling every resource type,
+each subscription waits for its rendered resources to change, the same way
+long-polls do, and a response is only pushed to the client when they have.
+
+Both variants of the protocol are supported: state-of-the-world, which sends
+every resource of a type on each change, and incremental (delta), which only
+sends the resources that were added, changed or removed.
+
+Requires the ``grpc`` extra, e.g. ``pip install sovereign[grpc]``
+"""
+
+import abc
+import asyncio
+import importlib
+import itertools
+import json
+import pkgutil
+from dataclasses import dataclass, field
+from functools import cache
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from fastapi.exceptions import HTTPException
+from pydantic import ValidationError
+
+from sovereign import application_logger as log
+from sovereign import config, stats
+from sovereign.cache.types import Entry
+from sovereign.rendering_common import filter_resources, resource_name, type_urls
+from sovereign.types import DiscoveryRequest
+from sovereign.utils.auth import authenticate
+from sovereign.utils.version_info import compute_hash
+from sovereign.v2.web import get_response_version
+from sovereign.views.discovery import changed_entry, read_entry
+
+try:
+    import grpc
+    from envoy.service.discovery.v3 import ads_pb2_grpc, discovery_pb2
+    from google.protobuf import any_pb2, json_format
+
+    GRPC_AVAILABLE = True
+except ImportError:
+    GRPC_AVAILABLE = False
+
+
+API_VERSION = "v3"
+# type.googleapis.com/envoy.config.cluster.v3.Cluster -> clusters
+RESOURCE_TYPES = {
+    type_url: resource_type
+    for resource_type, type_url in type_urls[API_VERSION].items()
+}
+
+EntryReader = Callable[[DiscoveryRequest, str | None], Awaitable[Entry | None]]
+# (request, version, timeout, request hash) -> the entry, once its version differs
+ChangeWaiter = Callable[
+    [DiscoveryRequest, str, float, str | None], Awaitable[Entry | None]
+]
+
+
+@cache
+def register_resource_types() -> None:
+    """
+    Resources, and any typed config nested in them, can only be packed once their
+    message types are registered with protobuf, which happens on import.
+    """
+    for package_name in ("envoy", "xds", "udpa"):
+        try:
+            package = importlib.import_module(package_name)
+        except ImportError:
+            continue
+        for module in pkgutil.walk_packages(package.__path__, f"{package_name}."):
+            if module.name.endswith("_pb2"):
+                importlib.import_module(module.name)
+
+
+def pack(resource: dict[str, Any], type_url: str) -> "any_pb2.Any":
+    resource.setdefault("@type", type_url)
+    return json_format.ParseDict(resource, any_pb2.Any())
+
+
+def pack_resources(text: str, type_url: str) -> list["any_pb2.Any"]:
+    return [pack(resource, type_url) for resource in json.loads(text)["resources"]]
+
+
+def versioned_resources(
+    resources: list[dict[str, Any]],
+) -> dict[str, tuple[str, dict[str, Any]]]:
+    """
+    Rendered resources keyed by name, along with a version for each resource,
+    so that only the resources which changed between renders need to be sent.
+    """
+    return {
+        resource_name(resource): (compute_hash(resource), resource)
+        for resource in resources
+    }
+
+
+@dataclass
+class Subscription:
+    type_url: str
+    request: DiscoveryRequest
+    # the version last sent to, or reported by, the client
+    version: str
+    # the version of the rendered entry last read, which may not have been sent
+    rendered: str | None = None
+    nonce: str = ""
+    task: asyncio.Task[None] | None = field(default=None, repr=False)
+
+
+@dataclass
+class DeltaSubscription:
+    type_url: str
+    # always requests every resource, subscribed names are filtered here
+    request: DiscoveryRequest
+    wildcard: bool
+    names: set[str] = field(default_factory=set)
+    # versions of the resources the client currently has
+    sent: dict[str, str] = field(default_factory=dict)
+    # the version of the rendered entry last read
+    rendered: str | None = None
+    nonce: str = ""
+    changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    task: asyncio.Task[None] | None = field(default=None, repr=False)
+
+
+class StreamError(Exception):
+    def __init__(self, code: "grpc.StatusCode", details: str) -> None:
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+
+class Stream(abc.ABC):
+    """
+    State for a single ADS stream: one subscription per resource type, each
+    watched by its own task that queues a response whenever its version changes.
+    """
+
+    def __init__(
+        self,
+        read: EntryReader,
+        wait_for_change: ChangeWaiter,
+        check_interval: float,
+        recheck_interval: float,
+        host: str,
+    ) -> None:
+        self.read = read
+        self.wait_for_change = wait_for_change
+        self.check_interval = check_interval
+        self.recheck_interval = recheck_interval
+        self.host = host
+        self.node: dict[str, Any] | None = None
+        self.subscriptions: dict[str, Any] = {}
+        self.responses: asyncio.Queue[Any] = asyncio.Queue()
+        self.nonces = itertools.count(1)
+
+    async def run(self, requests: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        reader = asyncio.create_task(self.receive(requests))
+        try:
+            while (response := await self.responses.get()) is not None:
+                if isinstance(response, StreamError):
+                    raise response
+                yield response
+        finally:
+            reader.cancel()
+            for subscription in self.subscriptions.values():
+                if subscription.task is not None:
+                    subscription.task.cancel()
+
+    async def receive(self, requests: AsyncIterator[Any]) -> None:
+        try:
+            async for request in requests:
+                self.handle(request)
+        except StreamError as e:
+            await self.responses.put(e)
+            return
+        # the client closed its side of the stream
+        await self.responses.put(None)
+
+    @abc.abstractmethod
+    def handle(self, request: Any) -> None:
+        """Updates the subscriptions of the stream from a request"""
+
+    def set_node(self, request: Any) -> None:
+        if self.node is not None:
+            return
+        if not request.HasField("node"):
+            raise StreamError(
+                grpc.StatusCode.INVALID_ARGUMENT,
+                "The first request on a stream must include the node",
+            )
+        self.node = json_format.MessageToDict(
+            request.node, preserving_proto_field_name=True
+        )
+        self.node.setdefault("cluster", "")
+
+    def resource_type(self, type_url: str) -> str | None:
+        resource_type = RESOURCE_TYPES.get(type_url)
+        if resource_type is None:
+            stats.increment("ads.request", tags=["result:unknown_type"])
+            log.warning(f"ADS request for unsupported type {type_url}")
+        return resource_type
+
+    def record_response(self, request: Any, subscription: Any, tags: list[str]):
+        if request.HasField("error_detail"):
+            stats.increment("ads.request", tags=[*tags, "result:nack"])
+            log.warning(
+                f"Client {self.node.get('id') if self.node else None} rejected "
+                f"{subscription.type_url} nonce {request.response_nonce}: "
+                f"{request.error_detail.message}"
+            )
+        else:
+            stats.increment("ads.request", tags=[*tags, "result:ack"])
+
+    def discovery_request(
+        self,
+        resource_type: str,
+        version_info: str,
+        resource_names: list[str],
+    ) -> DiscoveryRequest:
+        try:
+            discovery_request = DiscoveryRequest(
+                node=self.node,
+                version_info=version_info,
+                resource_names=resource_names,
+                resource_type=resource_type,
+                api_version=API_VERSION,
+                desired_controlplane=self.host,
+            )
+            authenticate(discovery_request)
+        except ValidationError as e:
+            raise StreamError(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except HTTPException as e:
+            code = (
+                grpc.StatusCode.UNAUTHENTICATED
+                if e.status_code == 401
+                else grpc.StatusCode.INVALID_ARGUMENT
+            )
+            raise StreamError(code, e.detail)
+        return discovery_request
+
+    @abc.abstractmethod
+    async def check(self, subscription: Any, request_hash: str | None) -> None:
+        """Queues a response if the resources of the subscription changed"""
+
+    async def wait(self, subscription: Any, request_hash: str | None) -> None:
+        """
+        Returns once the rendered resources of the subscription have a version
+        other than the one last read, or the recheck interval passes.
+        """
+        try:
+            await self.wait_for_change(
+                subscription.request,
+                subscription.rendered or "",
+                self.recheck_interval,
+                request_hash,
+            )
+        except Exception:
+            log.exception(
+                f"Failed to wait for {subscription.request.resource_type} to change"
+            )
+            await asyncio.sleep(self.check_interval)
+
+    async def watch(self, subscription: Any) -> None:
+        request = subscription.request
+        request_hash = None
+        if config.worker_v2_enabled:
+            request_hash = request.cache_key(config.cache.hash_rules)
+
+        while True:
+            try:
+                await self.check(subscription, request_hash)
+            except HTTPException as e:
+                # turned away by admission control, tried again after the interval
+                stats.increment(
+                    "ads.check.shed", tags=[f"resource_type:{request.resource_type}"]
+                )
+                log.debug(f"Check for {request.resource_type} was shed: {e.detail}")
+            except Exception:
+                stats.increment(
+                    "ads.check.error", tags=[f"resource_type:{request.resource_type}"]
+                )
+                log.exception(f"Failed to check {request.resource_type} for changes")
+            else:
+                await self.wait(subscription, request_hash)
+                continue
+            await asyncio.sleep(self.check_interval)
+
+    def log_unpackable(self, resource_type: str | None, version: str) -> None:
+        stats.increment("ads.response.error", tags=[f"resource_type:{resource_type}"])
+        log.exception(
+            f"Rendered {resource_type} version {version} "
+            "could not be converted to protobuf"
+        )
+
+
+class StateOfTheWorldStream(Stream):
+    def handle(self, request: "discovery_pb2.DiscoveryRequest") -> None:
+        self.set_node(request)
+        resource_type = self.resource_type(request.type_url)
+        if resource_type is None:
+            return
+
+        tags = [f"resource_type:{resource_type}"]
+        subscription: Subscription | None = self.subscriptions.get(request.type_url)
+
+        if subscription is not None:
+            if request.response_nonce != subscription.nonce:
+                # a response to something we've since replaced
+                stats.increment("ads.request", tags=[*tags, "result:stale"])
+                return
+            self.record_response(request, subscription, tags)
+            if list(request.resource_names) == subscription.request.resource_names:
+                return
+
+        discovery_request = self.discovery_request(
+            resource_type, request.version_info, list(request.resource_names)
+        )
+
+        stats.increment("ads.request", tags=[*tags, "result:subscribe"])
+        if subscription is not None and subscription.task is not None:
+            subscription.task.cancel()
+        subscription = Subscription(
+            type_url=request.type_url,
+            request=discovery_request,
+            version=request.version_info,
+            nonce=subscription.nonce if subscription is not None else "",
+        )
+        subscription.task = asyncio.create_task(self.watch(subscription))
+        self.subscriptions[request.type_url] = subscription
+
+    async def check(self, subscription: Subscription, request_hash: str | None):
+        # with the v2 worker, the stored version can be compared without reading resources
+        if request_hash is not None:
+            if get_response_version(request_hash) == subscription.version:
+                subscription.rendered = subscription.version
+                return
+
+        entry = await self.read(subscription.request, request_hash)
+        if entry is None:
+            return
+        subscription.rendered = entry.version
+        # like the REST endpoint, never replace the client's resources with nothing
+        if entry.len == 0 or entry.version == subscription.version:
+            return
+
+        resource_type = subscription.request.resource_type
+        try:
+            resources = pack_resources(entry.text, subscription.type_url)
+        except json_format.ParseError:
+            self.log_unpackable(resource_type, entry.version)
+            # don't retry until there is a new version
+            subscription.version = entry.version
+            return
+
+        subscription.version = entry.version
+        subscription.nonce = str(next(self.nonces))
+        stats.increment("ads.response.pushed", tags=[f"resource_type:{resource_type}"])
+        await self.responses.put(
+            discovery_pb2.DiscoveryResponse(
+                version_info=entry.version,
+                resources=resources,
+                type_url=subscription.type_url,
+                nonce=subscription.nonce,
+            )
+        )
+
+
+class DeltaStream(Stream):
+    def handle(self, request: "discovery_pb2.DeltaDiscoveryRequest") -> None:
+        self.set_node(request)
+        resource_type = self.resource_type(request.type_url)
+        if resource_type is None:
+            return
+
+        tags = [f"resource_type:{resource_type}"]
+        subscription: DeltaSubscription | None = self.subscriptions.get(
+            request.type_url
+        )
+        subscribe = set(request.resource_names_subscribe)
+        unsubscribe = set(request.resource_names_unsubscribe)
+
+        if subscription is None:
+            subscription = DeltaSubscription(
+                type_url=request.type_url,
+                request=self.discovery_request(resource_type, "", []),
+                # a first request without names is a wildcard subscription
+                wildcard=not subscribe or "*" in subscribe,
+                # resources the client already has, e.g. after reconnecting
+                sent=dict(request.initial_resource_versions),
+            )
+            stats.increment("ads.request", tags=[*tags, "result:subscribe"])
+            subscription.task = asyncio.create_task(self.watch(subscription))
+            self.subscriptions[request.type_url] = subscription
+        elif request.response_nonce:
+            if request.response_nonce == subscription.nonce:
+                self.record_response(request, subscription, tags)
+            else:
+                stats.increment("ads.request", tags=[*tags, "result:stale"])
+
+        if not subscribe and not unsubscribe:
+            return
+
+        if "*" in subscribe:
+            subscription.wildcard = True
+        if "*" in unsubscribe:
+            subscription.wildcard = False
+        subscription.names |= subscribe - {"*"}
+        subscription.names -= unsubscribe
+        for name in unsubscribe:
+            # the client has dropped these, they don't need to be removed
+            subscription.sent.pop(name, None)
+        subscription.changed.set()
+
+    async def wait(
+        self, subscription: DeltaSubscription, request_hash: str | None
+    ) -> None:
+        # changes to the subscribed names are checked straight away
+        waiters = {
+            asyncio.ensure_future(subscription.changed.wait()),
+            asyncio.ensure_future(super().wait(subscription, request_hash)),
+        }
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def check(self, subscription: DeltaSubscription, request_hash: str | None):
+        changed = subscription.changed.is_set()
+        subscription.changed.clear()
+
+        if not changed and request_hash is not None:
+            if get_response_version(request_hash) == subscription.rendered:
+                return
+
+        entry = await self.read(subscription.request, request_hash)
+        if entry is None:
+            return
+        unchanged = entry.version == subscription.rendered
+        subscription.rendered = entry.version
+        # like the REST endpoint, never remove all of the client's resources
+        if entry.len == 0 or (not changed and unchanged):
+            return
+
+        rendered = json.loads(entry.text)["resources"]
+        if not subscription.wildcard:
+            rendered = (
+                filter_resources(rendered, sorted(subscription.names))
+                if subscription.names
+                else []
+            )
+        current = versioned_resources(rendered)
+
+        updated = [
+            name
+            for name, (version, _) in current.items()
+            if subscription.sent.get(name) != version
+        ]
+        removed = [name for name in subscription.sent if name not in current]
+        if not updated and not removed:
+            return
+
+        resource_type = subscription.request.resource_type
+        try:
+            resources = [
+                discovery_pb2.Resource(
+                    name=name,
+                    version=current[name][0],
+                    resource=pack(current[name][1], subscription.type_url),
+                )
+                for name in updated
+            ]
+        except json_format.ParseError:
+            self.log_unpackable(resource_type, entry.version)
+            return
+
+        for name in updated:
+            subscription.sent[name] = current[name][0]
+        for name in removed:
+            del subscription.sent[name]
+        subscription.nonce = str(next(self.nonces))
+        stats.increment(
+            "ads.delta.resources.updated",
+            value=len(updated),
+            tags=[f"resource_type:{resource_type}"],
+        )
+        stats.increment(
+            "ads.delta.resources.removed",
+            value=len(removed),
+            tags=[f"resource_type:{resource_type}"],
+        )
+        await self.responses.put(
+            discovery_pb2.DeltaDiscoveryResponse(
+                system_version_info=entry.version,
+                resources=resources,
+                removed_resources=removed,
+                type_url=subscription.type_url,
+                nonce=subscription.nonce,
+            )
+        )
+
+
+class AggregatedDiscoveryService:
+    def __init__(
+        self,
+        read: EntryReader = read_entry,
+        check_interval: float | None = None,
+        wait_for_change: ChangeWaiter = changed_entry,
+        recheck_interval: float | None = None,
+    ) -> None:
+        if not GRPC_AVAILABLE:
+            raise ImportError(
+                "Enabled the gRPC ADS server but grpcio/xds-protos are not installed"
+            )
+        register_resource_types()
+        self.read = read
+        self.wait_for_change = wait_for_change
+        self.check_interval = (
+            check_interval
+            if check_interval is not None
+            else config.ads.check_interval_secs
+        )
+        self.recheck_interval = (
+            recheck_interval
+            if recheck_interval is not None
+            else config.ads.recheck_interval_secs
+        )
+
+    async def _serve(
+        self,
+        stream_type: type[Stream],
+        request_iterator: AsyncIterator[Any],
+        context: "grpc.aio.ServicerContext",
+    ) -> AsyncIterator[Any]:
+        metadata = dict(context.invocation_metadata() or ())
+        stream = stream_type(
+            self.read,
+            self.wait_for_change,
+            self.check_interval,
+            self.recheck_interval,
+            metadata.get("host", "no_host_provided"),
+        )
+        tags = [f"variant:{stream_type.__name__}"]
+        stats.increment("ads.stream.opened", tags=tags)
+        try:
+            async for response in stream.run(request_iterator):
+                yield response
+        except StreamError as e:
+            await context.abort(e.code, e.details)
+        finally:
+            stats.increment("ads.stream.closed", tags=tags)
+
+    async def StreamAggregatedResources(
+        self,
+        request_iterator: AsyncIterator["discovery_pb2.DiscoveryRequest"],
+        context: "grpc.aio.ServicerContext",
+    ) -> AsyncIterator["discovery_pb2.DiscoveryResponse"]:
+        async for response in self._serve(
+            StateOfTheWorldStream, request_iterator, context
+        ):
+            yield response
+
+    async def DeltaAggregatedResources(
+        self,
+        request_iterator: AsyncIterator["discovery_pb2.DeltaDiscoveryRequest"],
+        context: "grpc.aio.ServicerContext",
+    ) -> AsyncIterator["discovery_pb2.DeltaDiscoveryResponse"]:
+        async for response in self._serve(DeltaStream, request_iterator, context):
+            yield response
+
+
+def create_server(service: AggregatedDiscoveryService) -> "grpc.aio.Server":
+    server = grpc.aio.server()
+    ads_pb2_grpc.add_AggregatedDiscoveryServiceServicer_to_server(service, server)
+    return server
+
+
+async def serve() -> None:
+    address = f"{config.ads.host}:{config.ads.port}"
+    server = create_server(AggregatedDiscoveryService())
+    server.add_insecure_port(address)
+    await server.start()
+    log.info(f"ADS server listening on {address}")
+    await server.wait_for_termination()
@@ -1,17 +1,20 @@
+import asyncio
 import traceback
 from collections import namedtuple
 
+import requests
 import uvicorn
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response
 from starlette_context.middleware import RawContextMiddleware
 
-from sovereign import __version__, logs
+from sovereign import WORKER_URL, __version__, logs
 from sovereign.configuration import ConfiguredResourceTypes, config
 from sovereign.error_info import ErrorInfo
-from sovereign.middlewares import LoggingMiddleware, RequestContextLogMiddleware
+from sovereign.middlewares import AccessLogMiddleware
 from sovereign.response_class import json_response_class
 from sovereign.utils.resources import get_package_file
+from sovereign.v2.web import get_slow_renders
 from sovereign.views import api, crypto, discovery, healthchecks, interface
 
 Router = namedtuple("Router", "module tags prefix")
@@ -63,8 +66,7 @@ def init_app() -> FastAPI:
             router.module, tags=router.tags, prefix=router.prefix
         )
 
-    application.add_middleware(RequestContextLogMiddleware)  # type: ignore
-    application.add_middleware(LoggingMiddleware)  # type: ignore
+    application.add_middleware(AccessLogMiddleware)  # type: ignore
 
     if dsn := config.sentry_dsn.get_secret_value():
         try:
@@ -130,6 +132,28 @@ def init_app() -> FastAPI:
         response.status_code = 299
         return response
 
+    @application.get(
+        "/admin/slow_renders",
+        summary="The slowest recent renders, with the time spent in each stage",
+    )
+    async def slow_renders() -> Response:
+        if config.worker_v2_enabled:
+            # worker v2 has no HTTP server, its nodes keep their slow renders
+            # in the data store instead
+            renders = await asyncio.to_thread(get_slow_renders)
+            return JSONResponse([timing.model_dump() for timing in renders])
+        try:
+            response = await asyncio.to_thread(
+                requests.get, f"{WORKER_URL}/admin/slow_renders", timeout=5
+            )
+        except requests.RequestException:
+            raise HTTPException(status_code=503, detail="Worker unavailable")
+        return Response(
+            response.content,
+            status_code=response.status_code,
+            media_type="application/json",
+        )
+
     return application
 
 
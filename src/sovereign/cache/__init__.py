@@ -20,6 +20,7 @@ from sovereign.cache.filesystem import FilesystemCache
 from sovereign.cache.types import CacheResult, Entry
 from sovereign.configuration import config
 from sovereign.types import DiscoveryRequest, RegisterClientRequest
+from sovereign.utils.admission import admission
 
 CACHE_READ_TIMEOUT = config.cache.read_timeout
 REMOTE_TTL = 300  # 5 minutes - TTL for entries read from remote cache
@@ -59,6 +60,12 @@ class CacheManagerBase:
 
 @final
 class CacheReader(CacheManagerBase):
+    def __init__(self) -> None:
+        super().__init__()
+        # long-poll requests, parked until the cached version for their client id changes
+        self.parked: dict[str, dict[asyncio.Future[Entry], str]] = {}
+        self._watcher: asyncio.Task[None] | None = None
+
     def try_read(self, key: str) -> CacheResult | None:
         # Try filesystem first
         if value := self.local.get(key):
@@ -114,31 +121,72 @@ class CacheReader(CacheManagerBase):
         if entry := self.get(req):
             return entry
 
-        log.info(f"Cache entry not found for {cid}, registering and waiting")
-        registered = False
-        start = asyncio.get_event_loop().time()
-        attempt = 1
-        while (asyncio.get_event_loop().time() - start) < timeout_s:
-            if not registered:
-                try:
-                    if self.register_over_http(req):
-                        stats.increment(metric, tags=["status:registered"])
-                        registered = True
-                        log.info(f"Client {cid} registered")
-                    else:
-                        stats.increment(metric, tags=["status:ratelimited"])
-                        await asyncio.sleep(min(attempt, CACHE_READ_TIMEOUT))
-                        attempt *= 2
-                except Exception as e:
-                    stats.increment(metric, tags=["status:failed"])
-                    log.exception(f"Tried to register client but failed: {e}")
-            if entry := self.get(req):
-                log.info(f"Entry has been populated for {cid}")
-                return entry
-            await asyncio.sleep(poll_interval_s)
+        with admission.waiter():
+            log.info(f"Cache entry not found for {cid}, registering and waiting")
+            registered = False
+            start = asyncio.get_event_loop().time()
+            attempt = 1
+            while (asyncio.get_event_loop().time() - start) < timeout_s:
+                if not registered:
+                    try:
+                        if self.register_over_http(req):
+                            stats.increment(metric, tags=["status:registered"])
+                            registered = True
+                            log.info(f"Client {cid} registered")
+                        else:
+                            stats.increment(metric, tags=["status:ratelimited"])
+                            await asyncio.sleep(min(attempt, CACHE_READ_TIMEOUT))
+                            attempt *= 2
+                    except Exception as e:
+                        stats.increment(metric, tags=["status:failed"])
+                        log.exception(f"Tried to register client but failed: {e}")
+                if entry := self.get(req):
+                    log.info(f"Entry has been populated for {cid}")
+                    return entry
+                await asyncio.sleep(poll_interval_s)
 
         return None
 
+    async def wait_for_change(
+        self, req: DiscoveryRequest, version: str, timeout_s: float
+    ) -> Entry | None:
+        """Park a long-poll request until the cached entry for its client id has a
+        version other than the given one, or the timeout expires.
+
+        The worker writes to the filesystem cache from another process, so a single
+        task per process reads the parked client ids once per poll interval, rather
+        than each parked request polling the cache itself.
+        """
+        cid = client_id(req)
+        future: asyncio.Future[Entry] = asyncio.get_running_loop().create_future()
+        self.parked.setdefault(cid, {})[future] = version
+        try:
+            if self._watcher is None or self._watcher.done():
+                self._watcher = asyncio.create_task(self._watch_parked())
+            return await asyncio.wait_for(future, timeout_s)
+        except TimeoutError:
+            return None
+        finally:
+            futures = self.parked.get(cid, {})
+            futures.pop(future, None)
+            if not futures:
+                self.parked.pop(cid, None)
+
+    async def _watch_parked(self) -> None:
+        while self.parked:
+            await asyncio.sleep(config.cache.poll_interval_secs)
+            for cid, futures in list(self.parked.items()):
+                try:
+                    entry = self.local.get(cid)
+                except Exception as e:
+                    log.warning(f"Failed to read parked client {cid} from cache: {e}")
+                    continue
+                if entry is None:
+                    continue
+                for future, version in list(futures.items()):
+                    if entry.version != version and not future.done():
+                        future.set_result(entry)
+
     def register_over_http(self, req: DiscoveryRequest) -> bool:
         registration = RegisterClientRequest(request=req)
         log.debug(f"Sending registration to worker for {req}")
@@ -151,6 +199,8 @@ class CacheReader(CacheManagerBase):
             match response.status_code:
                 case 200 | 202:
                     log.debug("Worker responded OK to registration")
+                    if depth := response.headers.get("X-Sovereign-Queue-Depth"):
+                        admission.report_queue_depth(int(depth))
                     return True
                 case code:
                     log.debug(f"Worker responded with {code} to registration")
@@ -205,7 +255,11 @@ class CacheReader(CacheManagerBase):
 @final
 class CacheWriter(CacheManagerBase):
     def set(
-        self, key: str, value: Entry, timeout: int | None = None
+        self,
+        key: str,
+        value: Entry,
+        timeout: int | None = None,
+        remote: bool = True,
     ) -> tuple[bool, list[tuple[str, str]]]:
         msg = []
         cached = False
@@ -223,7 +277,7 @@ class CacheWriter(CacheManagerBase):
             )
             msg.append(("warning", f"Failed to write to filesystem cache: {e}"))
             stats.increment("cache.fs.write.error")
-        if self.remote:
+        if self.remote and remote:
             try:
                 self.remote.set(key, value, timeout)
                 log.info(
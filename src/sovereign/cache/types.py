@@ -2,7 +2,7 @@ from typing import Any
 
 from pydantic import BaseModel
 
-from sovereign.types import Node
+from sovereign.types import Node, ResourceIndex
 
 
 class CacheResult(BaseModel):
@@ -15,3 +15,4 @@ class Entry(BaseModel):
     len: int
     version: str
     node: Node
+    index: ResourceIndex | None = None
@@ -56,6 +56,11 @@ class StatsdConfig(BaseModel):
     namespace: str = "sovereign"
     enabled: bool = False
     use_ms: bool = True
+    # aggregate counters and send metrics in batches from a background thread
+    aggregate: bool = False
+    flush_interval_secs: float = 1.0
+    # timing samples kept per metric and tag set, per flush; 0 keeps every sample
+    max_samples_per_context: int = 0
 
     @field_validator("host", mode="before")
     @classmethod
@@ -166,6 +171,20 @@ class AuthConfiguration(BaseSettings):
     enabled: bool = Field(False, alias="SOVEREIGN_AUTH_ENABLED")
     auth_passwords: SecretStr = Field(SecretStr(""), alias="SOVEREIGN_AUTH_PASSWORDS")
     encryption_key: SecretStr = Field(SecretStr(""), alias="SOVEREIGN_ENCRYPTION_KEY")
+    # verified auth tokens are remembered, so that each token is only decrypted
+    # once per ttl. 0 slots disables it
+    verified_token_cache_slots: int = Field(
+        16384, alias="SOVEREIGN_AUTH_VERIFIED_TOKEN_CACHE_SLOTS"
+    )
+    verified_token_cache_ttl_secs: int = Field(
+        600, alias="SOVEREIGN_AUTH_VERIFIED_TOKEN_CACHE_TTL_SECS"
+    )
+    # an empty path keeps the table in memory, for this process only. To share it,
+    # use a file in a directory that only the service user can write to
+    verified_token_cache_path: str = Field(
+        "",
+        alias="SOVEREIGN_AUTH_VERIFIED_TOKEN_CACHE_PATH",
+    )
     model_config = SettingsConfigDict(
         env_file=".env",
         extra="ignore",
@@ -209,6 +228,16 @@ class AccessLogConfiguration(BaseSettings):
     enabled: bool = Field(True, alias="SOVEREIGN_ENABLE_ACCESS_LOGS")
     log_fmt: Optional[str] = Field(None, alias="SOVEREIGN_LOG_FORMAT")
     ignore_empty_fields: bool = Field(False, alias="SOVEREIGN_LOG_IGNORE_EMPTY")
+    # format and write access logs in batches from a background thread
+    batched: bool = Field(False, alias="SOVEREIGN_ACCESS_LOG_BATCHED")
+    buffer_size: int = Field(10000, alias="SOVEREIGN_ACCESS_LOG_BUFFER_SIZE")
+    flush_interval_secs: float = Field(
+        0.5, alias="SOVEREIGN_ACCESS_LOG_FLUSH_INTERVAL_SECS"
+    )
+    # fraction of 304 (not modified) responses to log
+    not_modified_sample_rate: float = Field(
+        1.0, alias="SOVEREIGN_ACCESS_LOG_NOT_MODIFIED_SAMPLE_RATE"
+    )
     model_config = SettingsConfigDict(
         env_file=".env",
         extra="ignore",
@@ -249,6 +278,8 @@ class ContextConfiguration(BaseSettings):
         10, alias="SOVEREIGN_CONTEXT_REFRESH_RETRY_INTERVAL_SECS"
     )
     cooldown: int = Field(15, alias="SOVEREIGN_CONTEXT_REFRESH_COOLDOWN")
+    # keys of context items to index, by context name, for lookups in templates
+    indexes: Dict[str, list[str]] = Field(default_factory=dict)
     model_config = SettingsConfigDict(
         env_file=".env",
         extra="ignore",
@@ -310,6 +341,12 @@ class TracingConfig(BaseSettings):
     endpoint: str = Field("/v2/api/spans")
     trace_id_128bit: bool = Field(True)
     tags: Dict[str, Union[Loadable, str]] = dict()
+    # fraction of traces recorded, decided when the root span starts
+    sample_rate: float = Field(1.0)
+    # spans waiting to be exported, further spans are dropped
+    queue_size: int = Field(10000)
+    batch_size: int = Field(100)
+    flush_interval_secs: float = Field(1.0)
     model_config = SettingsConfigDict(
         env_file=".env",
         extra="ignore",
@@ -341,6 +378,8 @@ class TracingConfig(BaseSettings):
             values["endpoint"] = endpoint
         if trace_id_128bit := getenv("SOVEREIGN_TRACING_TRACE_ID_128BIT"):
             values["trace_id_128bit"] = trace_id_128bit
+        if sample_rate := getenv("SOVEREIGN_TRACING_SAMPLE_RATE"):
+            values["sample_rate"] = sample_rate
         return values
 
 
@@ -358,6 +397,136 @@ class SupervisordConfig(BaseSettings):
     )
 
 
+class AdsConfig(BaseSettings):
+    enabled: bool = Field(False, alias="SOVEREIGN_ADS_ENABLED")
+    host: str = Field("0.0.0.0", alias="SOVEREIGN_ADS_HOST")
+    port: int = Field(8081, alias="SOVEREIGN_ADS_PORT")
+    # subscriptions are checked when their resources change, and after this
+    # long without a change anyway
+    recheck_interval_secs: float = Field(
+        30.0, alias="SOVEREIGN_ADS_RECHECK_INTERVAL_SECS"
+    )
+    # how long a check that failed, or was shed, waits before it is retried
+    check_interval_secs: float = Field(1.0, alias="SOVEREIGN_ADS_CHECK_INTERVAL_SECS")
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra="ignore",
+        env_file_encoding="utf-8",
+        populate_by_name=True,
+    )
+
+
+class LongPollConfig(BaseSettings):
+    # up-to-date discovery requests are held until their version changes, instead
+    # of returning 304 straight away. Envoy's request_timeout for the REST config
+    # source has to be longer than the hold timeout.
+    enabled: bool = Field(False, alias="SOVEREIGN_LONG_POLL_ENABLED")
+    hold_timeout_secs: float = Field(
+        30.0, alias="SOVEREIGN_LONG_POLL_HOLD_TIMEOUT_SECS"
+    )
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra="ignore",
+        env_file_encoding="utf-8",
+        populate_by_name=True,
+    )
+
+
+class DnsCacheConfig(BaseSettings):
+    # cache the addresses that templates resolve, and resolve the addresses
+    # found in a context whenever it is refreshed
+    enabled: bool = Field(False, alias="SOVEREIGN_DNS_CACHE_ENABLED")
+    ttl_secs: float = Field(30.0, alias="SOVEREIGN_DNS_CACHE_TTL_SECS")
+    # how long a hostname that failed to resolve is remembered
+    negative_ttl_secs: float = Field(5.0, alias="SOVEREIGN_DNS_CACHE_NEGATIVE_TTL_SECS")
+    # how long expired addresses are still used while the hostname fails to resolve
+    stale_ttl_secs: float = Field(300.0, alias="SOVEREIGN_DNS_CACHE_STALE_TTL_SECS")
+    prefetch_concurrency: int = Field(
+        16, alias="SOVEREIGN_DNS_CACHE_PREFETCH_CONCURRENCY"
+    )
+    # keys in context data whose values are hostnames
+    prefetch_keys: list[str] = ["address"]
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra="ignore",
+        env_file_encoding="utf-8",
+        populate_by_name=True,
+    )
+
+
+class AdmissionConfig(BaseSettings):
+    # discovery requests that have to wait for a render are turned away with a
+    # 503 and a Retry-After header while the worker is backlogged
+    enabled: bool = Field(False, alias="SOVEREIGN_ADMISSION_ENABLED")
+    # requests waiting for a render, per web process
+    max_waiters: int = Field(256, alias="SOVEREIGN_ADMISSION_MAX_WAITERS")
+    # render jobs queued in the worker
+    max_queue_depth: int = Field(1000, alias="SOVEREIGN_ADMISSION_MAX_QUEUE_DEPTH")
+    queue_depth_ttl_secs: float = Field(
+        5.0, alias="SOVEREIGN_ADMISSION_QUEUE_DEPTH_TTL_SECS"
+    )
+    min_retry_after_secs: int = Field(
+        1, alias="SOVEREIGN_ADMISSION_MIN_RETRY_AFTER_SECS"
+    )
+    max_retry_after_secs: int = Field(
+        30, alias="SOVEREIGN_ADMISSION_MAX_RETRY_AFTER_SECS"
+    )
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra="ignore",
+        env_file_encoding="utf-8",
+        populate_by_name=True,
+    )
+
+
+class InternalRequestsConfig(BaseSettings):
+    # requests made by the UI and API are only rendered when they are made,
+    # after requests from Envoy, and their responses are kept apart from
+    # those of registered clients
+    max_entries: int = Field(256, alias="SOVEREIGN_INTERNAL_REQUESTS_MAX_ENTRIES")
+    ttl_secs: int = Field(300, alias="SOVEREIGN_INTERNAL_REQUESTS_TTL_SECS")
+    # internal requests waiting to be rendered, beyond which they are turned away
+    queue_size: int = Field(32, alias="SOVEREIGN_INTERNAL_REQUESTS_QUEUE_SIZE")
+    # how long an internal request waits for requests from Envoy before it is
+    # rendered anyway, so that a busy worker still answers the UI and /deepcheck
+    max_wait_secs: float = Field(1.0, alias="SOVEREIGN_INTERNAL_REQUESTS_MAX_WAIT_SECS")
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra="ignore",
+        env_file_encoding="utf-8",
+        populate_by_name=True,
+    )
+
+
+class DeepCheckConfig(BaseSettings):
+    # how long the result of /deepcheck is reused for, so that frequent checks
+    # from load balancers don't each render every template
+    cache_ttl_secs: float = Field(5.0, alias="SOVEREIGN_DEEPCHECK_CACHE_TTL_SECS")
+    # templates and the worker that haven't responded by then fail the check
+    timeout_secs: float = Field(10.0, alias="SOVEREIGN_DEEPCHECK_TIMEOUT_SECS")
+    # results are kept per query, for at most this many queries
+    max_results: int = Field(64, alias="SOVEREIGN_DEEPCHECK_MAX_RESULTS")
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra="ignore",
+        env_file_encoding="utf-8",
+        populate_by_name=True,
+    )
+
+
+class SlowRendersConfig(BaseSettings):
+    # the slowest renders are kept with their time per stage, for /admin/slow_renders
+    size: int = Field(20, alias="SOVEREIGN_SLOW_RENDERS_SIZE")
+    # renders older than this are forgotten, however slow they were
+    max_age_secs: int = Field(3600, alias="SOVEREIGN_SLOW_RENDERS_MAX_AGE_SECS")
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra="ignore",
+        env_file_encoding="utf-8",
+        populate_by_name=True,
+    )
+
+
 class LegacyConfig(BaseSettings):
     regions: Optional[list[str]] = None
     eds_priority_matrix: Optional[Dict[str, Dict[str, int]]] = None
@@ -488,9 +657,16 @@ class SovereignConfigv2(BaseSettings):
 
     # Web/Discovery
     authentication: AuthConfiguration = AuthConfiguration()
+    ads: AdsConfig = AdsConfig()
+    long_poll: LongPollConfig = LongPollConfig()
+    admission: AdmissionConfig = AdmissionConfig()
+    deepcheck: DeepCheckConfig = DeepCheckConfig()
+    internal_requests: InternalRequestsConfig = InternalRequestsConfig()
+    slow_renders: SlowRendersConfig = SlowRendersConfig()
 
     # Cache
     cache: CacheConfiguration = CacheConfiguration()
+    dns_cache: DnsCacheConfig = DnsCacheConfig()
 
     # Worker
     worker_host: Optional[str] = Field("localhost", alias="SOVEREIGN_WORKER_HOST")
@@ -521,6 +697,27 @@ class SovereignConfigv2(BaseSettings):
     worker_v2_queue_invsibility_time: Optional[int] = Field(
         None, alias="SOVEREIGN_WORKER_V2_QUEUE_INVISIBILITY_TIME"
     )
+    # only used by the sqlite data store
+    worker_v2_compress_responses: bool = Field(
+        False, alias="SOVEREIGN_WORKER_V2_COMPRESS_RESPONSES"
+    )
+    worker_v2_change_check_interval_secs: float = Field(
+        0.05, alias="SOVEREIGN_WORKER_V2_CHANGE_CHECK_INTERVAL_SECS"
+    )
+    worker_v2_context_codec: str = Field(
+        "pickle", alias="SOVEREIGN_WORKER_V2_CONTEXT_CODEC"
+    )
+    # discovery entries that haven't been requested within the ttl are deleted,
+    # and are no longer re-rendered when contexts change
+    worker_v2_discovery_entry_ttl_secs: int = Field(
+        86400, alias="SOVEREIGN_WORKER_V2_DISCOVERY_ENTRY_TTL_SECS"
+    )
+    worker_v2_discovery_entry_compaction_interval_secs: int = Field(
+        300, alias="SOVEREIGN_WORKER_V2_DISCOVERY_ENTRY_COMPACTION_INTERVAL_SECS"
+    )
+    worker_v2_access_flush_interval_secs: float = Field(
+        30, alias="SOVEREIGN_WORKER_V2_ACCESS_FLUSH_INTERVAL_SECS"
+    )
 
     # Supervisord settings
     supervisord: SupervisordConfig = SupervisordConfig()
@@ -17,6 +17,8 @@ from sovereign.dynamic_config import Loadable
 from sovereign.events import Event, Topic, bus
 from sovereign.statistics import configure_statsd
 from sovereign.types import DiscoveryRequest
+from sovereign.utils.indexes import context_indexes
+from sovereign.utils.resolver import dns_cache
 from sovereign.utils.timer import wait_until
 
 stats = configure_statsd()
@@ -86,6 +88,10 @@ class TemplateContext:
 
     def get_context(self, req: DiscoveryRequest) -> dict[str, Any]:
         ret = {r.name: r.data for r in self.results.values()}
+        if context_indexes.declared:
+            ret["indexes"] = context_indexes.for_contexts(
+                {r.name: (r.data, None) for r in self.results.values()}
+            )
         for fn in self.middleware:
             fn(req, ret)
         return ret
@@ -167,6 +173,9 @@ class ContextTask(pydantic.BaseModel):
     async def refresh(self, output: dict[str, "ContextResult"]) -> None:
         result = await self.try_load()
         if result.state == ContextStatus.READY:
+            # resolved before renders are triggered, which then read the cache
+            if dns_cache.config.enabled:
+                await asyncio.to_thread(dns_cache.prefetch_context, result.data)
             output[self.name] = result
 
     async def try_load(self) -> "ContextResult":
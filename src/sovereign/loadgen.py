@@ -0,0 +1,496 @@
+"""
+Replays the polling of a fleet of Envoy proxies against Sovereign, to
+reproduce production load locally.
+
+    sovereign-loadgen samples/discovery_request.json --nodes 2000 --qps 500 \\
+        --clusters T1,T2 --zones us-east-1a,us-east-1b \\
+        --envoy-versions 1.30.0,1.34.1 --types clusters,listeners,routes
+
+Each seed is the body of a discovery request. Seeds are fanned out into the
+given number of nodes, which are given a cluster, zone and Envoy version
+from the lists, and which request a subset of --resource-names for the
+resource types that Envoy requests by name. Every node polls every resource
+type and sends back the version it was last given, so that it is answered
+with a 304 until its resources change, like Envoy. With --churn, a poll
+forgets its version now and then, as a restarted proxy would.
+
+Requests are sent at the target rate to the app in this process, through an
+ASGI transport, or to a running server with --url. In process, the v1
+worker still has to be running, since the app asks it to render over HTTP;
+start it with sovereign-worker first. A node doesn't poll a
+resource type again before its last poll was answered; those polls are
+counted as skipped. Latency is measured from when a request was due to be
+sent, so that a server falling behind can't hide its latency by slowing the
+load down. In process, the app and the generator share an event loop, so
+anything that blocks the app holds the load up too; --url against a server
+started with sovereign-web gives the figures that compare with production.
+
+Every --interval seconds, and for the whole run at the end, the latency
+percentiles, the status codes, the cache hit ratio and the worker's backlog
+are reported. The cache hit ratio is worked out from the metrics that the
+server sends to the listener started with --statsd-port. The backlog of the
+v2 worker is read from its queue, the backlog of the v1 worker from its
+metrics.
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import random
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from sovereign import WORKER_URL, config
+from sovereign.v2.web import queue_depth
+
+try:
+    import httpx
+
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+# resource types that Envoy requests by name, the others are requested whole
+NAMED_TYPES = ("routes", "endpoints")
+# counted once for each request that had to wait for a render
+RENDER_WAITS = (
+    "client.registration|status:registered",
+    "v2.worker.discovery_response|source:after_polling",
+)
+V1_BACKLOG = "template.on_demand_queue_size"
+PERCENTILES = (50, 90, 99)
+ANSWERED = ("200", "304", "404")
+
+
+@dataclass
+class Stream:
+    """The polling of one resource type by one node"""
+
+    seed: dict[str, Any]
+    node: dict[str, Any]
+    resource_type: str
+    resource_names: list[str]
+    # Envoy sends an empty version until it has been given resources
+    version_info: str = ""
+    polling: bool = False
+
+    def body(self) -> bytes:
+        return json.dumps(
+            {
+                **self.seed,
+                "node": self.node,
+                "resource_names": self.resource_names,
+                "version_info": self.version_info,
+            }
+        ).encode()
+
+
+def with_envoy_version(build_version: str | None, version: str) -> str:
+    """Replaces the version in a build version, eg. <commit>/1.9.0/Clean/RELEASE"""
+    parts = (build_version or "").split("/")
+    if len(parts) < 2:
+        parts = ["0" * 40, version, "Clean", "RELEASE"]
+    parts[1] = version
+    return "/".join(parts)
+
+
+def fleet(
+    seeds: list[dict[str, Any]],
+    nodes: int,
+    resource_types: list[str],
+    clusters: list[str] | None = None,
+    zones: list[str] | None = None,
+    envoy_versions: list[str] | None = None,
+    resource_names: list[str] | None = None,
+    rng: random.Random | None = None,
+) -> list[Stream]:
+    """Fans the seeds out into nodes, with one stream per node and resource type"""
+    rng = rng or random.Random()
+    streams = []
+    for n in range(nodes):
+        seed = seeds[n % len(seeds)]
+        node = copy.deepcopy(seed["node"])
+        node["id"] = f"loadgen-{n}"
+        if clusters:
+            node["cluster"] = rng.choice(clusters)
+        if zones:
+            node["locality"] = {**node.get("locality", {}), "zone": rng.choice(zones)}
+        if envoy_versions:
+            # the structured version would take precedence over build_version
+            node.pop("user_agent_build_version", None)
+            node["build_version"] = with_envoy_version(
+                node.get("build_version"), rng.choice(envoy_versions)
+            )
+        for resource_type in resource_types:
+            names = list(seed.get("resource_names", []))
+            if resource_names and resource_type in NAMED_TYPES:
+                names = rng.sample(resource_names, rng.randint(1, len(resource_names)))
+            streams.append(Stream(seed, node, resource_type, names))
+    return streams
+
+
+class MetricsListener(asyncio.DatagramProtocol):
+    """
+    Receives the metrics that the server sends over DogStatsD, for the
+    cache hit ratio and the backlog of the v1 worker. Counters are kept
+    in total and for each of their tags, as "<name>|<tag>".
+    """
+
+    def __init__(self, namespace: str) -> None:
+        self.prefix = f"{namespace}." if namespace else ""
+        self.counters: Counter[str] = Counter()
+        self.gauges: dict[str, float] = {}
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        for line in data.decode(errors="replace").splitlines():
+            self.parse(line)
+
+    def parse(self, line: str) -> None:
+        # <name>:<value>|<type>[|@<sample rate>][|#<tag>,<tag>]
+        name, _, rest = line.partition(":")
+        value, _, rest = rest.partition("|")
+        kind, *extra = rest.split("|")
+        try:
+            amount = float(value)
+        except ValueError:
+            return
+        name = name.removeprefix(self.prefix)
+        if kind == "g":
+            self.gauges[name] = amount
+        elif kind == "c":
+            tags: list[str] = []
+            for item in extra:
+                if item.startswith("@"):
+                    amount /= float(item[1:]) or 1.0
+                elif item.startswith("#"):
+                    tags = item[1:].split(",")
+            self.counters[name] += amount
+            for tag in tags:
+                self.counters[f"{name}|{tag}"] += amount
+
+    @property
+    def render_waits(self) -> float:
+        return sum(self.counters[name] for name in RENDER_WAITS)
+
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    ret = {
+        f"p{p}": round(ordered[min(len(ordered) - 1, len(ordered) * p // 100)], 2)
+        for p in PERCENTILES
+    }
+    ret["max"] = round(ordered[-1], 2)
+    return ret
+
+
+@dataclass
+class Window:
+    """What happened over a reporting interval, or over the whole run"""
+
+    started: float
+    latencies: list[float] = field(default_factory=list)
+    by_status: dict[str, list[float]] = field(default_factory=dict)
+    skipped: int = 0
+    render_waits: float = 0.0
+
+    def record(self, status: str, latency_ms: float) -> None:
+        self.latencies.append(latency_ms)
+        self.by_status.setdefault(status, []).append(latency_ms)
+
+    def summary(
+        self, now: float, render_waits: float | None, backlog: int | None
+    ) -> dict[str, Any]:
+        elapsed = now - self.started
+        answered = sum(len(self.by_status.get(status, [])) for status in ANSWERED)
+        hit_ratio = None
+        if render_waits is not None and answered:
+            waits = render_waits - self.render_waits
+            hit_ratio = round(max(0.0, 1 - waits / answered), 4)
+        return {
+            "seconds": round(elapsed, 1),
+            "requests": len(self.latencies),
+            "qps": round(len(self.latencies) / elapsed, 1) if elapsed else 0.0,
+            "skipped": self.skipped,
+            "statuses": {s: len(v) for s, v in sorted(self.by_status.items())},
+            "latency_ms": percentiles(self.latencies),
+            "cache_hit_ratio": hit_ratio,
+            "backlog": backlog,
+        }
+
+
+def format_summary(summary: dict[str, Any]) -> str:
+    statuses = " ".join(f"{s}={n}" for s, n in summary["statuses"].items())
+    latency = " ".join(f"{p}={v}ms" for p, v in summary["latency_ms"].items())
+    hit_ratio = summary["cache_hit_ratio"]
+    hits = "-" if hit_ratio is None else f"{hit_ratio:.1%}"
+    backlog = "-" if summary["backlog"] is None else summary["backlog"]
+    return (
+        f"{summary['seconds']:>7}s {summary['requests']:>7} req"
+        f" {summary['qps']:>8}/s  {statuses}  {latency}"
+        f"  skipped={summary['skipped']} hits={hits} backlog={backlog}"
+    )
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        client: "httpx.AsyncClient",
+        streams: list[Stream],
+        qps: float,
+        api_version: str = "v3",
+        churn: float = 0.0,
+        concurrency: int = 256,
+        timeout: float = 30.0,
+        listener: MetricsListener | None = None,
+        in_process: bool = True,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.client = client
+        self.streams = streams
+        self.qps = qps
+        self.api_version = api_version
+        self.churn = churn
+        self.slots = asyncio.Semaphore(concurrency)
+        # the ASGI transport doesn't apply the client's timeouts
+        self.timeout = timeout
+        self.listener = listener
+        self.in_process = in_process
+        self.rng = rng or random.Random()
+        self.total = Window(started=time.monotonic())
+        self.window = Window(started=self.total.started)
+        self.timeline: list[dict[str, Any]] = []
+
+    def backlog(self) -> int | None:
+        if config.worker_v2_enabled:
+            # an in-memory queue can only be read from inside the server
+            if self.in_process or config.worker_v2_queue_provider != "memory":
+                return queue_depth()
+            return None
+        if self.listener is not None and V1_BACKLOG in self.listener.gauges:
+            return int(self.listener.gauges[V1_BACKLOG])
+        return None
+
+    def render_waits(self) -> float | None:
+        return None if self.listener is None else self.listener.render_waits
+
+    def snapshot(self) -> dict[str, Any]:
+        """Summarizes the interval since the last snapshot, and starts the next"""
+        now = time.monotonic()
+        waits = self.render_waits()
+        summary = self.window.summary(now, waits, self.backlog())
+        self.timeline.append(summary)
+        self.window = Window(started=now, render_waits=waits or 0.0)
+        return summary
+
+    def summary(self) -> dict[str, Any]:
+        summary = self.total.summary(
+            time.monotonic(), self.render_waits(), self.backlog()
+        )
+        summary["latency_ms_by_status"] = {
+            status: percentiles(latencies)
+            for status, latencies in sorted(self.total.by_status.items())
+        }
+        return summary
+
+    async def poll(self, stream: Stream, due: float) -> None:
+        if self.rng.random() < self.churn:
+            stream.version_info = ""
+        try:
+            # includes waiting for a free connection, so a run ends in time
+            async with asyncio.timeout(self.timeout), self.slots:
+                response = await self.client.post(
+                    f"/{self.api_version}/discovery:{stream.resource_type}",
+                    content=stream.body(),
+                    headers={"Content-Type": "application/json"},
+                )
+            status = str(response.status_code)
+            version = response.headers.get("X-Sovereign-Response-Version")
+            if response.status_code == 200 and version:
+                stream.version_info = version
+        except Exception as e:
+            # in process, what the app raises reaches the client
+            status = type(e).__name__
+        finally:
+            stream.polling = False
+        latency_ms = (time.monotonic() - due) * 1000
+        self.total.record(status, latency_ms)
+        self.window.record(status, latency_ms)
+
+    async def run(self, duration: float, interval: float | None = None) -> None:
+        start = time.monotonic()
+        self.total = Window(started=start, render_waits=self.render_waits() or 0.0)
+        self.window = Window(started=start, render_waits=self.total.render_waits)
+        reporter = None
+        if interval:
+            reporter = asyncio.create_task(self.report_every(interval))
+        order = list(range(len(self.streams)))
+        self.rng.shuffle(order)
+        tasks: set[asyncio.Task[None]] = set()
+        sent = 0
+        end = start + duration
+        # a generator that has fallen behind stops on time, not when caught up
+        while (due := start + sent / self.qps) < end and time.monotonic() < end:
+            await asyncio.sleep(max(0.0, due - time.monotonic()))
+            stream = self.streams[order[sent % len(order)]]
+            sent += 1
+            if stream.polling:
+                self.total.skipped += 1
+                self.window.skipped += 1
+                continue
+            stream.polling = True
+            task = asyncio.create_task(self.poll(stream, due))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        if reporter is not None:
+            reporter.cancel()
+
+    async def report_every(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            print(format_summary(self.snapshot()), flush=True)
+
+
+def http_client(
+    url: str | None, concurrency: int, timeout: float
+) -> "httpx.AsyncClient":
+    limits = httpx.Limits(max_connections=concurrency)
+    if url:
+        return httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout)
+    from sovereign.app import app
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://loadgen",
+        limits=limits,
+        timeout=timeout,
+    )
+
+
+def worker_is_running(timeout: float = 2.0) -> bool:
+    try:
+        return httpx.get(f"{WORKER_URL}/health", timeout=timeout).is_success
+    except httpx.HTTPError:
+        return False
+
+
+def csv(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="sovereign-loadgen",
+        description=__doc__.strip().splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument("seeds", nargs="+", help="discovery request JSON files")
+    parser.add_argument(
+        "--url",
+        help="a running server, eg. http://127.0.0.1:8080 (default: in process)",
+    )
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--qps", type=float, default=100.0)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds")
+    parser.add_argument("--types", type=csv, default=["clusters"])
+    parser.add_argument("--clusters", type=csv)
+    parser.add_argument("--zones", type=csv)
+    parser.add_argument("--envoy-versions", type=csv)
+    parser.add_argument("--resource-names", type=csv)
+    parser.add_argument("--api-version", default="v3")
+    parser.add_argument(
+        "--churn",
+        type=float,
+        default=0.0,
+        help="the chance that a poll forgets its version, as a restarted proxy",
+    )
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds")
+    parser.add_argument(
+        "--statsd-port",
+        type=int,
+        help="listen for the server's metrics on this UDP port",
+    )
+    parser.add_argument("--random-seed", type=int)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+async def loadgen(args: argparse.Namespace) -> dict[str, Any]:
+    rng = random.Random(args.random_seed)
+    seeds = [json.loads(Path(path).read_text()) for path in args.seeds]
+    streams = fleet(
+        seeds,
+        args.nodes,
+        args.types,
+        clusters=args.clusters,
+        zones=args.zones,
+        envoy_versions=args.envoy_versions,
+        resource_names=args.resource_names,
+        rng=rng,
+    )
+    listener = None
+    transport = None
+    if args.statsd_port:
+        transport, listener = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: MetricsListener(config.statsd.namespace),
+            local_addr=("127.0.0.1", args.statsd_port),
+        )
+    try:
+        async with http_client(args.url, args.concurrency, args.timeout) as client:
+            generator = LoadGenerator(
+                client,
+                streams,
+                args.qps,
+                api_version=args.api_version,
+                churn=args.churn,
+                concurrency=args.concurrency,
+                timeout=args.timeout,
+                listener=listener,
+                in_process=args.url is None,
+                rng=rng,
+            )
+            print(
+                f"Polling {len(streams)} streams of {args.nodes} nodes"
+                f" at {args.qps}/s for {args.duration}s",
+                flush=True,
+            )
+            await generator.run(args.duration, args.interval)
+    finally:
+        if transport is not None:
+            transport.close()
+    return {"summary": generator.summary(), "timeline": generator.timeline}
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    if not HTTPX_AVAILABLE:
+        print("sovereign-loadgen needs httpx: pip install sovereign[httpx]")
+        return 1
+    if args.url is None and not config.worker_v2_enabled and not worker_is_running():
+        print(
+            f"No worker is running at {WORKER_URL}, which renders for the app"
+            " in this process: start it with sovereign-worker, or use --url"
+        )
+        return 1
+    results = asyncio.run(loadgen(args))
+    summary = results["summary"]
+    print(f"Total:\n{format_summary(summary)}")
+    for status, latency in summary["latency_ms_by_status"].items():
+        print(f"  {status}: " + " ".join(f"{p}={v}ms" for p, v in latency.items()))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import atexit
+import sys
+import threading
+from typing import IO, Any, Callable
+
+import structlog
+
+from sovereign.logging.types import EventDict, ProcessedMessage
+from sovereign.statistics import configure_statsd
+
+# the renderer used for access logs that aren't batched, so that
+# turning batching on or off doesn't change what the lines look like
+_renderer = structlog.processors.JSONRenderer()
+
+
+def _dumps(message: ProcessedMessage) -> bytes:
+    return _renderer(None, "info", message).encode()
+
+
+class AccessLogWriter:
+    """
+    Formats and writes access logs from a background thread, in batches.
+
+    Requests only append their log fields to a bounded buffer. When the buffer
+    is full, entries are dropped and counted rather than slowing down requests.
+    """
+
+    def __init__(
+        self,
+        formatter: Callable[[EventDict], ProcessedMessage],
+        buffer_size: int,
+        flush_interval: float,
+        stream: IO[bytes] | None = None,
+    ) -> None:
+        self.formatter = formatter
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.stream = stream
+        self.buffer: list[EventDict] = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def submit(self, event_dict: EventDict) -> None:
+        with self.lock:
+            if len(self.buffer) >= self.buffer_size:
+                self.dropped += 1
+                return
+            self.buffer.append(event_dict)
+        if self.thread is None:
+            self.start()
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is not None:
+                return
+            # started on first use, so that each web worker process has its own
+            self.thread = threading.Thread(
+                target=self.run, name="access-log-writer", daemon=True
+            )
+            self.thread.start()
+        atexit.register(self.flush)
+
+    def run(self) -> None:
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+            dropped, self.dropped = self.dropped, 0
+        stats = configure_statsd()
+        if dropped:
+            stats.increment("access_log.dropped", value=dropped)
+        if not batch:
+            return
+        lines = []
+        for event_dict in batch:
+            try:
+                lines.append(_dumps(self.formatter(event_dict)))
+            except Exception:
+                stats.increment("access_log.format_error")
+        self._write(b"\n".join(lines) + b"\n")
+        stats.increment("access_log.written", value=len(lines))
+
+    def _write(self, data: bytes) -> None:
+        stream: Any = self.stream or getattr(sys.stdout, "buffer", None)
+        if stream is None:
+            sys.stdout.write(data.decode())
+            sys.stdout.flush()
+            return
+        stream.write(data)
+        stream.flush()
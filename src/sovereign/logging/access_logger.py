@@ -1,12 +1,13 @@
-from copy import deepcopy
+import random
 from functools import cached_property
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import structlog
 from starlette_context import context
 from structlog.stdlib import BoundLogger
 
 from sovereign.configuration import SovereignConfigv2
+from sovereign.logging.access_log_writer import AccessLogWriter
 from sovereign.logging.base_logger import BaseLogger
 from sovereign.logging.types import EventDict, LoggingType, ProcessedMessage
 
@@ -16,6 +17,19 @@ class AccessLogger(BaseLogger):
         self._access_logs_enabled = config.logging.access_logs.enabled
         self._ignore_empty = config.logging.access_logs.ignore_empty_fields
         self._user_log_fmt = config.logging.access_logs.log_fmt
+        self._not_modified_sample_rate = (
+            config.logging.access_logs.not_modified_sample_rate
+        )
+
+        self.writer: Optional[AccessLogWriter] = None
+        if config.logging.access_logs.batched:
+            self.writer = AccessLogWriter(
+                formatter=lambda event_dict: self.format_access_log_fields(
+                    self.logger, "info", event_dict
+                ),
+                buffer_size=config.logging.access_logs.buffer_size,
+                flush_interval=config.logging.access_logs.flush_interval_secs,
+            )
 
         self.logger: BoundLogger = structlog.wrap_logger(
             root_logger,
@@ -59,15 +73,34 @@ class AccessLogger(BaseLogger):
             "detail": "{ERROR_DETAIL}",
         }
 
+    @cached_property
+    def _compiled_log_fmt(self) -> list[tuple[str, str, Optional[str]]]:
+        """
+        Pairs each output field with the name of the event field it copies,
+        when its format is exactly one placeholder. Those are looked up
+        directly instead of going through str.format.
+        """
+        compiled = []
+        for k, v in self.get_configured_log_format.items():
+            name = None
+            if v.startswith("{") and v.endswith("}") and v[1:-1].isidentifier():
+                name = v[1:-1]
+            compiled.append((k, v, name))
+        return compiled
+
     def format_access_log_fields(
         self, logger: BoundLogger, method_name: str, event_dict: EventDict
     ) -> ProcessedMessage:
         formatted_dict: Dict[str, Any] = dict()
-        for k, v in self.get_configured_log_format.items():
-            try:
-                value: str = v.format(**event_dict)
-            except KeyError:
-                value = "-"
+        for k, v, name in self._compiled_log_fmt:
+            value: str
+            if name is not None:
+                value = format(event_dict[name]) if name in event_dict else "-"
+            else:
+                try:
+                    value = v.format(**event_dict)
+                except KeyError:
+                    value = "-"
             if value in (None, "-") and self._ignore_empty:
                 continue
             formatted_dict[k] = value
@@ -76,10 +109,29 @@ class AccessLogger(BaseLogger):
     def merge_starlette_contextvars(
         self, _, __, event_dict: EventDict
     ) -> ProcessedMessage:
-        merged_context = deepcopy(event_dict)
+        merged_context = dict(event_dict)
         for k, v in context.data.items():
             merged_context[k] = v
         return merged_context
 
     def queue_log_fields(self, **kwargs: Any) -> None:
         context.update(kwargs)
+
+    def log_request(self, status_code: int) -> None:
+        """
+        Logs the current request with the fields queued for it.
+
+        304 responses are sampled. With batched access logs, the fields are
+        handed to the writer thread and formatted there.
+        """
+        if not self.is_enabled:
+            return
+        if status_code == 304 and self._not_modified_sample_rate < 1.0:
+            if random.random() >= self._not_modified_sample_rate:
+                return
+        if self.writer is None:
+            self.logger.info("request")
+            return
+        self.writer.submit(
+            {"type": LoggingType.ACCESS, "event": "request", **context.data}
+        )
@@ -2,69 +2,81 @@ import os
 import time
 from uuid import uuid4
 
-from fastapi.requests import Request
-from fastapi.responses import Response
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.datastructures import URL, Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from sovereign import _request_id_ctx_var, config, get_request_id, logs, stats
+from sovereign import _request_id_ctx_var, config, logs, stats
 
 
-class RequestContextLogMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
-        response = Response("Internal server error", status_code=500)
-        token = _request_id_ctx_var.set(str(uuid4()))
-        try:
-            response = await call_next(request)
-        finally:
-            req_id = get_request_id()
-            req_id = response.headers.setdefault("X-Request-Id", get_request_id())
-            logs.access_logger.queue_log_fields(REQUEST_ID=req_id)
-            _request_id_ctx_var.reset(token)
-        return response
+class AccessLogMiddleware:
+    """
+    Sets the request id, gathers access log fields, and records the
+    duration of each request.
+
+    This is a pure ASGI middleware, since BaseHTTPMiddleware runs every
+    request in a separate task and re-streams the response through it.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
 
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(
-        self, request: Request, call_next: RequestResponseEndpoint
-    ) -> Response:
         start_time = time.time()
-        response = Response("Internal server error", status_code=500)
+        request_headers = Headers(scope=scope)
+        response_headers: Headers = Headers()
+        status_code = 500
 
         source_ip, source_port = "0.0.0.0", 0
-        if addr := request.client:
-            source_ip = addr.host
-            source_port = addr.port
-        if xff := request.headers.get("X-Forwarded-For"):
+        if addr := scope.get("client"):
+            source_ip, source_port = addr
+        if xff := request_headers.get("X-Forwarded-For"):
             source_ip = xff.split(",")[0]  # leftmost address
         logs.access_logger.queue_log_fields(
             ENVIRONMENT=config.legacy_fields.environment,
-            HOST=request.headers.get("host", "-"),
-            METHOD=request.method,
-            PATH=request.url.path,
-            QUERY=dict(request.query_params.items()),
+            HOST=request_headers.get("host", "-"),
+            METHOD=scope["method"],
+            PATH=scope["path"],
+            QUERY=dict(QueryParams(scope["query_string"]).items()),
             SOURCE_IP=source_ip,
             SOURCE_PORT=source_port,
             PID=os.getpid(),
-            USER_AGENT=request.headers.get("user-agent", "-"),
-            BYTES_RX=request.headers.get("content-length", "-"),
+            USER_AGENT=request_headers.get("user-agent", "-"),
+            BYTES_RX=request_headers.get("content-length", "-"),
         )
+
+        request_id = str(uuid4())
+        token = _request_id_ctx_var.set(request_id)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_headers, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.setdefault("X-Request-Id", request_id)
+                response_headers = headers
+            await send(message)
+
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_wrapper)
         finally:
+            _request_id_ctx_var.reset(token)
             duration = time.time() - start_time
             logs.access_logger.queue_log_fields(
-                BYTES_TX=response.headers.get("content-length", "-"),
-                STATUS_CODE=response.status_code,
+                REQUEST_ID=response_headers.get("X-Request-Id", request_id),
+                BYTES_TX=response_headers.get("content-length", "-"),
+                STATUS_CODE=status_code,
                 DURATION=duration,
             )
-            if "discovery" in str(request.url):
+            if "discovery" in str(URL(scope=scope)):
                 request_info = {
-                    "path": request.url.path,
-                    "xds_type": response.headers.get("X-Sovereign-Requested-Type"),
-                    "client_version": response.headers.get("X-Sovereign-Client-Build"),
-                    "response_code": response.status_code,
+                    "path": scope["path"],
+                    "xds_type": response_headers.get("X-Sovereign-Requested-Type"),
+                    "client_version": response_headers.get("X-Sovereign-Client-Build"),
+                    "response_code": status_code,
                 }
                 tags = [
                     ":".join(map(str, [k, v]))
@@ -73,5 +85,4 @@ class LoggingMiddleware(BaseHTTPMiddleware):
                 ]
                 stats.increment("discovery.rq_total", tags=tags)
                 stats.timing("discovery.rq_ms", value=duration * 1000, tags=tags)
-            logs.access_logger.logger.info("request")
-        return response
+            logs.access_logger.log_request(status_code)
@@ -9,6 +9,7 @@ The templates are configurable. `todo See ref:Configuration#Templates`
 
 import importlib
 import os
+import time
 import traceback
 from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Pipe, Process, cpu_count
@@ -24,12 +25,12 @@ from sovereign import cache, stats
 from sovereign.cache.types import Entry
 from sovereign.configuration import config
 from sovereign.rendering_common import (
-    add_type_urls,
-    deserialize_config,
-    filter_resources,
+    deserialize_config,  # noqa: F401
+    stream_resources,
 )
-from sovereign.types import DiscoveryRequest, ProcessedTemplate
+from sovereign.types import DiscoveryRequest
 from sovereign.utils import templates
+from sovereign.utils.render_timing import StageTimer, slow_renders
 
 writer = cache.CacheWriter()
 # limit render jobs to number of cores
@@ -40,6 +41,10 @@ class RenderJob(pydantic.BaseModel):
     id: str
     request: DiscoveryRequest
     context: dict[str, Any]
+    # internal requests are only cached locally, for a limited time
+    internal: bool = False
+    # how long the context took to assemble, before the job was made
+    context_secs: float = 0.0
 
     def submit(self):
         return POOL.submit(self._run)
@@ -62,6 +67,10 @@ class RenderJob(pydantic.BaseModel):
             log.warning(f"Render job for {self.id} has been running longer than 60s")
         while rx.poll(timeout=10):
             level, message = rx.recv()
+            if level == "timing":
+                # the render ran in another process, its timing is kept in this one
+                slow_renders.add(message)
+                continue
             logger = getattr(log, level)
             logger(message)
 
@@ -70,39 +79,61 @@ class RenderJob(pydantic.BaseModel):
 def generate(job: RenderJob, tx: Connection) -> None:
     request = job.request
     tags = [f"type:{request.resource_type}"]
+    timer = StageTimer(
+        "template.render.stage_ms",
+        client_id=job.id,
+        template=request.resource_type,
+        tags=[f"type:{request.resource_type}"],
+        started=time.perf_counter() - job.context_secs,
+    )
+    timer.add("context", job.context_secs)
     try:
         with stats.timed("template.render_ms", tags=tags):
-            content = request.template.generate(
-                discovery_request=request,
-                host_header=request.desired_controlplane,
-                resource_names=request.resources,
-                utils=templates,
-                **job.context,
+            with timer.stage("template"):
+                content = request.template.stream(
+                    discovery_request=request,
+                    host_header=request.desired_controlplane,
+                    resource_names=request.resources,
+                    utils=templates,
+                    **job.context,
+                )
+            response = stream_resources(
+                content,
+                request.api_version,
+                request.resource_type,
+                request.resources,
+                timer=timer,
             )
-            if not request.template.is_python_source:
-                assert isinstance(content, str)
-                content = deserialize_config(content)
-            assert isinstance(content, dict)
-            resources = filter_resources(content["resources"], request.resources)
-            add_type_urls(request.api_version, request.resource_type, resources)
-            response = ProcessedTemplate(resources=resources)
             tx.send(
                 (
                     "info",
                     f"Completed rendering of {request}: client_id={job.id} version={response.version_info} "
-                    f"resources={len(response.resources)} pid={os.getpid()}",
+                    f"resources={response.count} pid={os.getpid()}",
                 )
             )
-            cached, cache_result = writer.set(
-                job.id,
-                Entry(
-                    text=response.model_dump_json(indent=None),
-                    len=len(response.resources),
-                    version=response.version_info,
-                    node=request.node,
-                ),
+            with timer.stage("serialize"):
+                text = response.text
+            entry = Entry(
+                text=text,
+                len=response.count,
+                index=response.index,
+                version=response.version_info,
+                node=request.node,
             )
-            tx.send(cache_result)
+            with timer.stage("cache_write"):
+                if job.internal:
+                    cached, cache_result = writer.set(
+                        job.id,
+                        entry,
+                        timeout=config.internal_requests.ttl_secs,
+                        remote=False,
+                    )
+                else:
+                    cached, cache_result = writer.set(job.id, entry)
+            for message in cache_result:
+                tx.send(message)
+            timing = timer.finish(resources=response.count, size=len(text))
+            tx.send(("timing", timing))
             if cached:
                 tags.append("result:ok")
             else:
@@ -121,4 +152,6 @@ def generate(job: RenderJob, tx: Connection) -> None:
             mod.capture_exception(e)
     finally:
         stats.increment("template.render", tags=tags)
+        # renders run in a forked process, which exits without flushing
+        stats.flush_pending()
         tx.close()
@@ -1,12 +1,17 @@
 import importlib
-from typing import Any
+import time
+import zlib
+from typing import Any, Iterable
 
+import pydantic_core
 import yaml
 from starlette.exceptions import HTTPException
 from yaml.parser import ParserError
 from yaml.scanner import ScannerError
 
 from sovereign import config, logs
+from sovereign.types import ResourceIndex
+from sovereign.utils.render_timing import StageTimer
 
 type_urls = {
     "v2": {
@@ -89,3 +94,173 @@ def resource_name(resource: dict[str, Any]) -> str:
     raise KeyError(
         f"Failed to determine the name or cluster_name of the following resource: {resource}"
     )
+
+
+class _Writer:
+    """Accumulates serialized JSON, counting the characters it will decode to"""
+
+    def __init__(self, prefix: bytes) -> None:
+        self.buffer = bytearray(prefix)
+        self.chars = len(prefix)
+
+    def write(self, data: bytes) -> tuple[int, int]:
+        start = self.chars
+        self.buffer += data
+        self.chars += len(data) if data.isascii() else len(data.decode())
+        return start, self.chars
+
+
+class ResourceStream:
+    """
+    Filters, adds type urls to, hashes and serializes generated resources
+    one at a time, so that a template yielding many resources is never
+    held in memory as several lists at once.
+
+    The version and text are the same as those of a ProcessedTemplate
+    made from the filtered resources. Resources are only kept when
+    ``keep`` is set, otherwise only their serialized form is, along with
+    an index of where each named resource and virtual host is in it.
+    """
+
+    def __init__(
+        self,
+        api_version: str,
+        resource_type: str,
+        requested: list[str],
+        keep: bool = False,
+    ) -> None:
+        self.type_url = type_urls.get(api_version, {}).get(resource_type)
+        self.requested = set(requested)
+        self.keep = keep
+        self.resources: list[dict[str, Any]] = []
+        self.index = ResourceIndex()
+        self.count = 0
+        # compute_hash(resources) is the crc32 of repr((resources,))
+        self.crc = zlib.crc32(b"([")
+        self.writer = _Writer(b'{"resources":[')
+        # seconds spent in each stage, added to a StageTimer by stream_resources
+        self.template_secs = 0.0
+        self.hash_secs = 0.0
+        self.serialize_secs = 0.0
+
+    def add(self, resource: Any) -> None:
+        if not isinstance(resource, dict):
+            raise ValueError(f"Generated resource is not a mapping: {resource!r}")
+        if self.requested and resource_name(resource) not in self.requested:
+            return
+        if self.type_url is not None and not resource.get("@type"):
+            resource["@type"] = self.type_url
+        start = time.perf_counter()
+        separator = b", " if self.count else b""
+        self.crc = zlib.crc32(separator + repr(resource).encode(), self.crc)
+        hashed = time.perf_counter()
+        if self.keep:
+            self.resources.append(resource)
+        else:
+            if self.count:
+                self.writer.write(b",")
+            self._write(resource)
+        self.count += 1
+        self.hash_secs += hashed - start
+        self.serialize_secs += time.perf_counter() - hashed
+
+    def _write(self, resource: dict[str, Any]) -> None:
+        # when names are repeated, the first resource is indexed, since
+        # that is the one found by searching the text
+        name = resource.get("name") or resource.get("cluster_name")
+        vhosts = resource.get("virtual_hosts")
+        if not isinstance(name, str):
+            self.writer.write(pydantic_core.to_json(resource))
+            return
+        if not isinstance(vhosts, list) or not all(
+            isinstance(k, str) for k in resource
+        ):
+            self.index.resources.setdefault(
+                name, self.writer.write(pydantic_core.to_json(resource))
+            )
+            return
+        # a route configuration is written key by key, to find its virtual hosts
+        offsets: dict[str, tuple[int, int]] = {}
+        start, _ = self.writer.write(b"{")
+        for position, (key, value) in enumerate(resource.items()):
+            prefix = b"," if position else b""
+            self.writer.write(prefix + pydantic_core.to_json(key) + b":")
+            if value is not vhosts:
+                self.writer.write(pydantic_core.to_json(value))
+                continue
+            self.writer.write(b"[")
+            for number, vhost in enumerate(vhosts):
+                if number:
+                    self.writer.write(b",")
+                span = self.writer.write(pydantic_core.to_json(vhost))
+                if isinstance(vhost, dict) and isinstance(vhost.get("name"), str):
+                    offsets.setdefault(vhost["name"], span)
+            self.writer.write(b"]")
+        _, end = self.writer.write(b"}")
+        if name not in self.index.resources:
+            self.index.resources[name] = (start, end)
+            self.index.virtual_hosts[name] = offsets
+
+    def consume(self, generated: Iterable[Any]) -> "ResourceStream":
+        # resources from python templates are made as they are asked for
+        resources = iter(generated)
+        while True:
+            start = time.perf_counter()
+            try:
+                resource = next(resources)
+            except StopIteration:
+                return self
+            finally:
+                self.template_secs += time.perf_counter() - start
+            self.add(resource)
+
+    def add_stages(self, timer: StageTimer) -> None:
+        timer.add("template", self.template_secs)
+        timer.add("hash", self.hash_secs)
+        timer.add("serialize", self.serialize_secs)
+
+    @property
+    def version_info(self) -> str:
+        return str(zlib.crc32(b"],)", self.crc) & 0xFFFFFFFF)
+
+    @property
+    def text(self) -> str:
+        """The resources and version serialized as a ProcessedTemplate would be"""
+        if self.keep:
+            resources = b",".join(pydantic_core.to_json(r) for r in self.resources)
+            body = b'{"resources":[' + resources
+        else:
+            body = bytes(self.writer.buffer)
+        return (
+            body + b'],"version_info":"' + self.version_info.encode() + b'"}'
+        ).decode()
+
+
+def stream_resources(
+    content: Any,
+    api_version: str,
+    resource_type: str,
+    requested: list[str],
+    keep: bool = False,
+    timer: StageTimer | None = None,
+) -> ResourceStream:
+    """
+    Processes the output of XdsTemplate.stream, which is an iterator of
+    resources for python templates, or text to deserialize for others.
+    The time spent in each stage is added to the timer, if there is one.
+    """
+    stream = ResourceStream(api_version, resource_type, requested, keep=keep)
+    try:
+        if isinstance(content, str):
+            start = time.perf_counter()
+            try:
+                content = deserialize_config(content)["resources"]
+            finally:
+                if timer is not None:
+                    timer.add("deserialize", time.perf_counter() - start)
+        elif isinstance(content, dict):
+            content = content["resources"]
+        return stream.consume(content)
+    finally:
+        if timer is not None:
+            stream.add_stages(timer)
@@ -1,3 +1,4 @@
+import asyncio
 import configparser
 import tempfile
 import warnings
@@ -62,6 +63,13 @@ def worker():
         )
 
 
+def ads():
+    from sovereign.ads import serve
+
+    log.debug("Starting ADS server")
+    asyncio.run(serve())
+
+
 def write_supervisor_conf() -> Path:
     proc_env = {
         "LANG": "en_US.UTF-8",
@@ -101,10 +109,20 @@ def write_supervisor_conf() -> Path:
         "command": "nice -n 2 sovereign-worker",  # run worker with reduced CPU priority (higher niceness value)
     }
 
+    ads_server = None
+    if config.ads.enabled:
+        conf["program:ads"] = ads_server = {
+            **base,
+            "numprocs": "1",
+            "command": "sovereign-ads",
+        }
+
     if user := asgi_config.user:
         supervisord["user"] = user
         web["user"] = user
         worker["user"] = user
+        if ads_server is not None:
+            ads_server["user"] = user
 
     log.debug("Writing supervisor config")
     with tempfile.NamedTemporaryFile("w", delete=False) as f:
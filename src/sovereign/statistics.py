@@ -1,3 +1,4 @@
+import atexit
 import logging
 from functools import wraps
 from typing import Any, Callable, Dict, Optional
@@ -19,6 +20,15 @@ class StatsDProxy:
         except TypeError:
             return self.do_nothing
 
+    def flush_pending(self) -> None:
+        """
+        Sends aggregated and buffered metrics now. A forked process has to
+        call this before it exits, since it doesn't run atexit handlers.
+        """
+        if self.statsd is not None:
+            self.statsd.flush_aggregated_metrics()
+            self.statsd.flush()
+
     def do_nothing(self, *args: Any, **kwargs: Any) -> None:
         _ = args[0]
 
@@ -50,7 +60,18 @@ def configure_statsd() -> StatsDProxy:
         from datadog import DogStatsd
 
         module: Optional[DogStatsd]
-        module = DogStatsd()
+        if config.enabled and config.aggregate:
+            # Counters are summed and timings sampled in memory, then flushed
+            # as a few packets per interval instead of one packet per metric
+            module = DogStatsd(
+                disable_aggregation=False,
+                disable_buffering=False,
+                flush_interval=config.flush_interval_secs,
+                max_metric_samples_per_context=config.max_samples_per_context,
+            )
+            atexit.register(module.stop, timeout=1)
+        else:
+            module = DogStatsd()
         if config.enabled and module:
             module.host = config.host
             module.port = int(config.port)
@@ -1,3 +1,7 @@
+import atexit
+import queue
+import random
+import threading
 import time
 import uuid
 from contextlib import nullcontext
@@ -7,11 +11,13 @@ from typing import Any, TypedDict
 import requests
 from typing_extensions import NotRequired
 
-from sovereign import config
+from sovereign import application_logger as log
+from sovereign import config, stats
 from sovereign.configuration import TracingConfig
 
 _trace_id_ctx_var: ContextVar[str] = ContextVar("trace_id", default="")
 _span_id_ctx_var: ContextVar[str] = ContextVar("span_id", default="")
+_sampled_ctx_var: ContextVar[bool] = ContextVar("sampled", default=True)
 
 
 def get_trace_id() -> str:
@@ -48,6 +54,89 @@ class Trace(TypedDict):
     parentSpanId: NotRequired[str]
 
 
+class SpanExporter:
+    """
+    Sends finished spans to the collector from a background thread, in
+    batches, over a single pooled connection.
+
+    Spans are dropped and counted when the queue is full, so that a slow
+    or unavailable collector never holds up the code being traced.
+    """
+
+    def __init__(self, tracing: TracingConfig) -> None:
+        self.url = f"{tracing.collector}{tracing.endpoint}"
+        self.batch_size = tracing.batch_size
+        self.flush_interval = tracing.flush_interval_secs
+        self.spans: queue.Queue[Trace] = queue.Queue(maxsize=tracing.queue_size)
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+
+    def submit(self, trace: Trace) -> None:
+        try:
+            self.spans.put_nowait(trace)
+        except queue.Full:
+            stats.increment("tracing.spans.dropped")
+            return
+        if self.thread is None:
+            self.start()
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is not None:
+                return
+            # started on first use, so that each web worker process has its own
+            self.thread = threading.Thread(
+                target=self.run, name="span-exporter", daemon=True
+            )
+            self.thread.start()
+        atexit.register(self.flush)
+
+    def run(self) -> None:
+        while True:
+            batch = [self.spans.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.spans.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.send(batch)
+
+    def flush(self) -> None:
+        """Sends every queued span, e.g. before the process exits"""
+        batch: list[Trace] = []
+        while True:
+            try:
+                batch.append(self.spans.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) == self.batch_size:
+                self.send(batch)
+                batch = []
+        if batch:
+            self.send(batch)
+
+    def send(self, batch: list[Trace]) -> None:
+        try:
+            response = self.session.post(self.url, json=batch, timeout=5)
+            response.raise_for_status()
+        # pylint: disable=broad-except
+        except Exception as e:
+            stats.increment("tracing.spans.failed", value=len(batch))
+            log.warning(f"Failed to submit {len(batch)} spans: {e}")
+            return
+        stats.increment("tracing.spans.sent", value=len(batch))
+
+
+EXPORTER: SpanExporter | None = None
+if not TRACING_DISABLED:
+    EXPORTER = SpanExporter(TRACING)
+
+
 class Tracer:
     def __init__(self, span_name):
         if TRACING_DISABLED:
@@ -56,24 +145,31 @@ class Tracer:
         self.tracing: TracingConfig = TRACING
         span_id = get_span_id()
         self.parent_span_id = None
-        if span_id != "":
+        self.trace_id = get_trace_id()
+        if span_id != "" and self.trace_id != "":
             # We are already inside a trace context
             self.parent_span_id = span_id
-        self.trace_id = get_trace_id()
+            self.sampled = _sampled_ctx_var.get()
+        else:
+            # A new trace, which is either recorded entirely or not at all
+            self.trace_id = self.gen_id()
+            self.sampled = random.random() < self.tracing.sample_rate
         self.span_id = self.gen_id()
         self.span_name = span_name
 
     def gen_id(self):
         if self.tracing.trace_id_128bit:
-            trace_id = generate_128bit()
-        else:
-            trace_id = generate_64bit()
-        _trace_id_ctx_var.set(trace_id)
-        return trace_id
+            return generate_128bit()
+        return generate_64bit()
 
     def __enter__(self):
         if TRACING_DISABLED:
             return nullcontext()
+        self.tokens = (
+            _trace_id_ctx_var.set(self.trace_id),
+            _span_id_ctx_var.set(self.span_id),
+            _sampled_ctx_var.set(self.sampled),
+        )
         self.trace = Trace(
             {
                 "traceId": self.trace_id,
@@ -90,14 +186,13 @@ class Tracer:
     def __exit__(self, exc_type, exc_value, traceback):
         if TRACING_DISABLED:
             return
+        trace_id, span_id, sampled = self.tokens
+        _trace_id_ctx_var.reset(trace_id)
+        _span_id_ctx_var.reset(span_id)
+        _sampled_ctx_var.reset(sampled)
         self.trace["duration"] = time.time() - self.trace["timestamp"]
         self.submit()
 
     def submit(self):
-        print(f"{self.span_name}: {self.trace['duration']}")
-        try:
-            url = f"{self.tracing.collector}{self.tracing.endpoint}"
-            requests.post(url, json=self.trace)
-        # pylint: disable=broad-except
-        except Exception as e:
-            print(f"Failed to submit trace: {self.trace}, Error:{e}")
+        if self.sampled and EXPORTER is not None:
+            EXPORTER.submit(self.trace)
@@ -1,17 +1,28 @@
 import hashlib
 import importlib
-from functools import cached_property
+import json
+from functools import cache, cached_property, lru_cache
 from types import ModuleType
+from typing import Iterator, NamedTuple
 
 import jmespath
 from jinja2 import Template
+from jmespath.parser import ParsedResult
 from pydantic import (
     BaseModel,
     ConfigDict,
     Field,
+    ValidationError,
     computed_field,
 )
-from typing_extensions import Any, cast
+from typing_extensions import Any
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 from sovereign.dynamic_config import Loadable
 from sovereign.utils.version_info import compute_hash
@@ -129,27 +140,42 @@ class XdsTemplate(BaseModel):
         return self.loadable.load()
 
     def generate(self, *args: Any, **kwargs: Any) -> dict[str, Any] | str | None:
-        if isinstance(self.code, ModuleType):
-            try:
-                template_fn = self.code.call  # type: ignore
-                return {"resources": list(template_fn(*args, **kwargs))}
-            except TypeError as e:
-                if not set(str(e).split()).issuperset(missing_arguments):
-                    raise ValueError(
-                        f"Tried to render template '{self.resource_type}'. "
-                        f"Error calling function: {str(e)}"
-                    )
-                message_start = str(e).find(":")
-                missing_args = str(e)[message_start + 2 :]
-                supplied_args = list(kwargs.keys())
-                raise TypeError(
-                    f"Tried to render template '{self.resource_type}' using partial arguments. "
-                    f"Missing args: {missing_args}. Supplied args: {args} "
-                    f"Supplied keyword args: {supplied_args}. "
-                    f"Add to `depends_on` to ensure required context is provided."
+        content = self.stream(*args, **kwargs)
+        if isinstance(content, str):
+            return content
+        return {"resources": list(content)}
+
+    def stream(self, *args: Any, **kwargs: Any) -> Iterator[dict[str, Any]] | str:
+        """
+        Like generate, but resources from python templates are returned
+        as they are yielded, instead of being collected into a list.
+        """
+        code = self.code
+        if isinstance(code, ModuleType):
+            return self._call(code, args, kwargs)
+        return code.render(*args, **kwargs)
+
+    def _call(
+        self, code: ModuleType, args: tuple[Any, ...], kwargs: dict[str, Any]
+    ) -> Iterator[dict[str, Any]]:
+        try:
+            template_fn = code.call  # type: ignore
+            yield from template_fn(*args, **kwargs)
+        except TypeError as e:
+            if not set(str(e).split()).issuperset(missing_arguments):
+                raise ValueError(
+                    f"Tried to render template '{self.resource_type}'. "
+                    f"Error calling function: {str(e)}"
                 )
-        else:
-            return self.code.render(*args, **kwargs)
+            message_start = str(e).find(":")
+            missing_args = str(e)[message_start + 2 :]
+            supplied_args = list(kwargs.keys())
+            raise TypeError(
+                f"Tried to render template '{self.resource_type}' using partial arguments. "
+                f"Missing args: {missing_args}. Supplied args: {args} "
+                f"Supplied keyword args: {supplied_args}. "
+                f"Add to `depends_on` to ensure required context is provided."
+            )
 
     @property
     def source(self) -> str:
@@ -220,19 +246,9 @@ class DiscoveryRequest(BaseModel):
     @computed_field  # type: ignore[prop-decorator]
     @cached_property
     def envoy_version(self) -> str:
-        try:
-            version = str(self.node.user_agent_build_version.version)
-            assert version != "0.0.0"
-        except AssertionError:
-            try:
-                build_version = self.node.build_version
-                if build_version is None:
-                    return "default"
-                _, version, *_ = build_version.split("/")
-            except (AttributeError, ValueError):
-                # TODO: log/metric this?
-                return "default"
-        return version
+        return parse_envoy_version(
+            str(self.node.user_agent_build_version.version), self.node.build_version
+        )
 
     @property
     def resources(self) -> Resources:
@@ -240,41 +256,17 @@ class DiscoveryRequest(BaseModel):
 
     # noinspection PyShadowingBuiltins
     def cache_key(self, rules: list[str]) -> str:
-        map = self.model_dump()
-        hash = hashlib.sha256()
-        for expr in sorted(rules):
-            value = cast(str, jmespath.search(expr, map))
-            val_str = f"{expr}={repr(value)}"
-            hash.update(val_str.encode())
-        return hash.hexdigest()
+        hash_rules = compile_hash_rules(tuple(rules))
+        if hash_rules.fields is None:
+            map = self.model_dump()
+        else:
+            map = self.model_dump(include=hash_rules.fields)
+        return hash_rules.key(map)
 
     @computed_field  # type: ignore[misc]
     @property
     def template(self) -> XdsTemplate:
-        # lazy load configured templates
-        mod = importlib.import_module("sovereign.configuration")
-        templates = mod.XDS_TEMPLATES
-
-        version = self.envoy_version
-        selection = "default"
-        for v in templates.keys():
-            if version.startswith(v):
-                selection = v
-        selected_version = templates[selection]
-        try:
-            assert self.resource_type
-            return selected_version[self.resource_type]
-        except AssertionError:
-            raise RuntimeError(
-                "DiscoveryRequest has no resource type set, cannot find template"
-            )
-        except KeyError:
-            raise KeyError(
-                (
-                    f"Unable to get {self.resource_type} for template "
-                    f'version "{selection}". Envoy client version: {version}'
-                )
-            )
+        return select_template(self.envoy_version, self.resource_type)
 
     def debug(self):
         return f"version={self.envoy_version}, cluster={self.node.cluster}, resource={self.resource_type}, names={self.resources}"
@@ -283,6 +275,235 @@ class DiscoveryRequest(BaseModel):
         return f"DiscoveryRequest({self.debug()})"
 
 
+def parse_envoy_version(user_agent_version: str, build_version: str | None) -> str:
+    """
+    The Envoy version from the node's structured build version, falling back to
+    the version in its build_version string, eg. <commit>/1.9.0/Clean/RELEASE
+    """
+    if user_agent_version != "0.0.0":
+        return user_agent_version
+    if build_version is None:
+        return "default"
+    try:
+        _, version, *_ = build_version.split("/")
+    except (AttributeError, ValueError):
+        # TODO: log/metric this?
+        return "default"
+    return version
+
+
+def select_template(envoy_version: str, resource_type: str | None) -> XdsTemplate:
+    # lazy load configured templates
+    mod = importlib.import_module("sovereign.configuration")
+    templates = mod.XDS_TEMPLATES
+
+    selection = "default"
+    for v in templates.keys():
+        if envoy_version.startswith(v):
+            selection = v
+    selected_version = templates[selection]
+    if not resource_type:
+        raise RuntimeError(
+            "DiscoveryRequest has no resource type set, cannot find template"
+        )
+    try:
+        return selected_version[resource_type]
+    except KeyError:
+        raise KeyError(
+            (
+                f"Unable to get {resource_type} for template "
+                f'version "{selection}". Envoy client version: {envoy_version}'
+            )
+        )
+
+
+def _leading_fields(ast: dict[str, Any]) -> tuple[list[str], bool]:
+    """
+    The field names that a parsed jmespath expression starts with, eg. node.cluster
+    gives ['node', 'cluster'], and whether the expression is only made of those fields.
+    """
+    match ast["type"]:
+        case "field":
+            return [ast["value"]], True
+        case "subexpression":
+            fields, only_fields = _leading_fields(ast["children"][0])
+            right = ast["children"][1]
+            if only_fields and right["type"] == "field":
+                return [*fields, right["value"]], True
+            return fields, False
+        case "index_expression":
+            fields, _ = _leading_fields(ast["children"][0])
+            return fields, False
+    return [], False
+
+
+class HashRules:
+    """
+    Cache key rules, sorted and compiled once rather than on every request.
+    Keeps track of the top-level request fields that the rules read, so that
+    only those have to be serialized.
+    """
+
+    def __init__(self, rules: tuple[str, ...]) -> None:
+        # rules that are only a chain of fields, such as node.cluster, are looked
+        # up directly, which gives the same result as searching with jmespath
+        self.expressions: list[tuple[str, tuple[str, ...] | None, ParsedResult]] = []
+        self.fields: set[str] | None = set()
+        self.node_fields: set[str] | None = set()
+        for rule in sorted(rules):
+            expression = jmespath.compile(rule)
+            fields, only_fields = _leading_fields(expression.parsed)
+            path = tuple(fields) if only_fields else None
+            self.expressions.append((rule, path, expression))
+            if not fields:
+                self.fields = self.node_fields = None
+            if self.fields is None:
+                continue
+            self.fields.add(fields[0])
+            if fields[0] == "node" and self.node_fields is not None:
+                if len(fields) == 1:
+                    self.node_fields = None
+                else:
+                    self.node_fields.add(fields[1])
+
+    def key(self, data: dict[str, Any]) -> str:
+        hash = hashlib.sha256()
+        for rule, path, expression in self.expressions:
+            if path is None:
+                value = expression.search(data)
+            else:
+                value = data
+                for name in path:
+                    value = value.get(name) if isinstance(value, dict) else None
+            hash.update(f"{rule}={repr(value)}".encode())
+        return hash.hexdigest()
+
+
+@cache
+def compile_hash_rules(rules: tuple[str, ...]) -> HashRules:
+    return HashRules(rules)
+
+
+class RequestSummary(NamedTuple):
+    request_hash: str
+    version_info: str
+    envoy_version: str
+    resource_names: list[str]
+    node_id: str
+    node_metadata: dict[str, Any]
+
+
+# fields that can be read from a discovery request body without validating it,
+# with the same values that a validated DiscoveryRequest would give
+_BODY_FIELDS = {"version_info", "resource_names", "is_internal_request", "type_url"}
+_NODE_FIELDS = {
+    "id",
+    "cluster",
+    "metadata",
+    "locality",
+    "build_version",
+    "user_agent_name",
+    "user_agent_version",
+    "client_features",
+}
+_DERIVED_FIELDS = {"envoy_version", "template", "node"}
+
+
+@cache
+def _default(model: type[BaseModel], field: str) -> Any:
+    # computing defaults from pydantic is slow when there is a default_factory
+    return model.model_fields[field].get_default(call_default_factory=True)
+
+
+@lru_cache(maxsize=256)
+def _template_data(envoy_version: str, resource_type: str | None) -> dict[str, Any]:
+    return select_template(envoy_version, resource_type).model_dump()
+
+
+def _loads(body: bytes) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def summarize_request(
+    body: bytes,
+    rules: list[str],
+    **fields: str | None,
+) -> RequestSummary | None:
+    """
+    Computes the cache key of a discovery request straight from its JSON body,
+    reading only the fields used by the hash rules, so that up-to-date clients
+    can be answered without building a DiscoveryRequest.
+
+    Fields that sovereign sets on the request, such as resource_type, are passed
+    as keyword arguments. Returns None when the request can't be summarized this
+    way, in which case it should go through full validation.
+    """
+    hash_rules = compile_hash_rules(tuple(rules))
+    if hash_rules.fields is None or hash_rules.node_fields is None:
+        return None
+    if not hash_rules.fields <= _BODY_FIELDS | _DERIVED_FIELDS | fields.keys():
+        return None
+    if not hash_rules.node_fields <= _NODE_FIELDS:
+        return None
+    try:
+        raw = _loads(body)
+        if raw.get("error_detail"):
+            # rejected configuration is logged, which needs the full request
+            return None
+        node = raw["node"]
+        metadata = node.get("metadata", {})
+        if not isinstance(metadata, dict) or not isinstance(node["cluster"], str):
+            return None
+        version = node.get("user_agent_build_version", {}).get("version", {})
+        envoy_version = parse_envoy_version(
+            str(SemanticVersion.model_validate(version)), node.get("build_version")
+        )
+
+        data: dict[str, Any] = {}
+        for field in hash_rules.fields:
+            if field in fields:
+                data[field] = fields[field]
+            elif field == "envoy_version":
+                data[field] = envoy_version
+            elif field == "template":
+                data[field] = _template_data(envoy_version, fields.get("resource_type"))
+            elif field == "node":
+                data[field] = {
+                    name: _node_field(node, name) for name in hash_rules.node_fields
+                }
+            else:
+                data[field] = raw.get(field, _default(DiscoveryRequest, field))
+        return RequestSummary(
+            request_hash=hash_rules.key(data),
+            version_info=raw.get("version_info", "0"),
+            envoy_version=envoy_version,
+            resource_names=raw.get(
+                "resource_names", _default(DiscoveryRequest, "resource_names")
+            ),
+            node_id=node.get("id", "-"),
+            node_metadata=metadata,
+        )
+    except (
+        ValueError,
+        TypeError,
+        KeyError,
+        AttributeError,
+        RuntimeError,
+        ValidationError,
+    ):
+        return None
+
+
+def _node_field(node: dict[str, Any], name: str) -> Any:
+    if name == "locality":
+        return Locality.model_validate(node.get("locality", {})).model_dump()
+    if name in node:
+        return node[name]
+    return _default(Node, name)
+
+
 class DiscoveryResponse(BaseModel):
     version_info: str = Field(
         ..., title="The version of the configuration in the response"
@@ -300,5 +521,17 @@ class ProcessedTemplate(BaseModel):
         return compute_hash(self.resources)
 
 
+class ResourceIndex(BaseModel):
+    """
+    Where each resource, and each virtual host of a route configuration,
+    is found in the text of a rendered response, as [start, end) offsets,
+    so that one of them can be read without parsing the whole response.
+    """
+
+    resources: dict[str, tuple[int, int]] = Field(default_factory=dict)
+    # route configuration name -> virtual host name -> offsets
+    virtual_hosts: dict[str, dict[str, tuple[int, int]]] = Field(default_factory=dict)
+
+
 class RegisterClientRequest(BaseModel):
     request: DiscoveryRequest
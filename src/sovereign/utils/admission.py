@@ -0,0 +1,101 @@
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from fastapi import HTTPException
+
+from sovereign import config, stats
+from sovereign.configuration import AdmissionConfig
+
+# weight of the latest wait in the average time that a render is waited for
+SMOOTHING = 0.2
+# how often the worker's queue is asked for its depth
+DEPTH_REFRESH_SECS = 1.0
+
+
+class AdmissionController:
+    """
+    Limits how many discovery requests in this process wait for a render,
+    and turns requests away while the worker's queue is too deep, so that
+    a backlog doesn't tie up the event loop until requests start timing out.
+
+    Only requests that have to wait for a render are counted. Requests that
+    can be answered from the cache are always served.
+    """
+
+    def __init__(self, config: AdmissionConfig) -> None:
+        self.config = config
+        self.waiters = 0
+        # seconds that waiting for a render has recently taken
+        self.wait_secs = 1.0
+        self.depth = 0
+        self.depth_reported_at = -math.inf
+
+    def report_queue_depth(self, depth: int) -> None:
+        self.depth = depth
+        self.depth_reported_at = time.monotonic()
+
+    def queue_depth(self) -> int:
+        # a depth that isn't reported again is forgotten, since no renders
+        # are requested, and so no depth reported, while requests are shed
+        if time.monotonic() - self.depth_reported_at > self.config.queue_depth_ttl_secs:
+            return 0
+        return self.depth
+
+    def retry_after(self, load: float) -> int:
+        """Seconds until the backlog has likely cleared, from how far over budget it is"""
+        seconds = math.ceil(self.wait_secs * load)
+        return min(
+            max(seconds, self.config.min_retry_after_secs),
+            self.config.max_retry_after_secs,
+        )
+
+    def admit(self, queue_depth: Callable[[], int | None] | None = None) -> None:
+        now = time.monotonic()
+        if (
+            queue_depth is not None
+            and now - self.depth_reported_at >= DEPTH_REFRESH_SECS
+        ):
+            if (depth := queue_depth()) is not None:
+                self.report_queue_depth(depth)
+        depth = self.queue_depth()
+        if self.waiters < self.config.max_waiters and (
+            depth < self.config.max_queue_depth
+        ):
+            return
+        waiters_load = self.waiters / max(self.config.max_waiters, 1)
+        queue_load = depth / max(self.config.max_queue_depth, 1)
+        reason = "waiters" if waiters_load >= queue_load else "queue_depth"
+        stats.increment("discovery.admission.shed", tags=[f"reason:{reason}"])
+        raise HTTPException(
+            status_code=503,
+            detail="Too many requests are waiting for resources to be rendered",
+            headers={
+                "Retry-After": str(self.retry_after(max(waiters_load, queue_load)))
+            },
+        )
+
+    @contextmanager
+    def waiter(
+        self, queue_depth: Callable[[], int | None] | None = None
+    ) -> Iterator[None]:
+        """
+        Wraps waiting for a render. Raises a 503 HTTPException if the
+        request isn't admitted.
+        """
+        if not self.config.enabled:
+            yield
+            return
+        self.admit(queue_depth)
+        self.waiters += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.waiters -= 1
+            elapsed = time.monotonic() - start
+            self.wait_secs += SMOOTHING * (elapsed - self.wait_secs)
+
+
+admission = AdmissionController(config.admission)
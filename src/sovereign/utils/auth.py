@@ -1,3 +1,5 @@
+from typing import Any
+
 from cryptography.fernet import InvalidToken
 from fastapi.exceptions import HTTPException
 
@@ -5,18 +7,40 @@ from sovereign import application_logger as log
 from sovereign import server_cipher_container, stats
 from sovereign.configuration import config
 from sovereign.types import DiscoveryRequest
+from sovereign.utils.verified_tokens import VerifiedTokenCache
 
 AUTH_ENABLED = config.authentication.enabled
 
+verified_tokens = VerifiedTokenCache(
+    secret="\0".join(
+        [
+            config.authentication.encryption_key.get_secret_value(),
+            config.authentication.auth_passwords.get_secret_value(),
+        ]
+    ).encode(),
+    slots=config.authentication.verified_token_cache_slots,
+    ttl=config.authentication.verified_token_cache_ttl_secs,
+    path=config.authentication.verified_token_cache_path,
+    logger=log,
+)
+
 
 @stats.timed("discovery.auth.ms")
 def validate_authentication_string(s: str) -> bool:
+    # only tokens that could be decrypted are cached, malformed ones still raise
+    if isinstance(s, str) and (valid := verified_tokens.get(s)) is not None:
+        stats.increment("discovery.auth.cache.hit")
+        stats.increment("discovery.auth.success" if valid else "discovery.auth.failed")
+        return valid
+    stats.increment("discovery.auth.cache.miss")
     try:
         password = server_cipher_container.decrypt(s)
     except Exception:
         stats.increment("discovery.auth.failed")
         raise
-    if password in config.passwords:
+    valid = password in config.passwords
+    verified_tokens.set(s, valid)
+    if valid:
         stats.increment("discovery.auth.success")
         return True
     stats.increment("discovery.auth.failed")
@@ -24,6 +48,16 @@ def validate_authentication_string(s: str) -> bool:
 
 
 def authenticate(request: DiscoveryRequest) -> None:
+    node = getattr(request, "node", None)
+    authenticate_node(getattr(node, "id", "-"), getattr(node, "metadata", None))
+
+
+def authenticate_node(node_id: str, metadata: dict[str, Any] | None) -> None:
+    """
+    Checks the auth field in the metadata of the node making a discovery request.
+    Takes the node's fields rather than a request, so that requests can be
+    authenticated before they are validated.
+    """
     if not AUTH_ENABLED:
         return
     if not server_cipher_container.key_available:
@@ -32,11 +66,11 @@ def authenticate(request: DiscoveryRequest) -> None:
             "An encryption key must be provided via SOVEREIGN_ENCRYPTION_KEY. "
         )
     try:
-        encrypted_auth = request.node.metadata["auth"]
+        encrypted_auth = metadata["auth"]
     except KeyError:
         raise HTTPException(
             status_code=401,
-            detail=f"Discovery request from {request.node.id} is missing auth field",
+            detail=f"Discovery request from {node_id} is missing auth field",
         )
     except Exception as e:
         description = getattr(e, "detail", "unknown")
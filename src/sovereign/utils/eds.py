@@ -1,16 +1,22 @@
+import hashlib
 import random
-from copy import deepcopy
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
 
 from starlette.exceptions import HTTPException
 
 from sovereign.configuration import config
 from sovereign.types import DiscoveryRequest
+from sovereign.utils.resolver import dns_cache
 from sovereign.utils.templates import resolve
 
 HARD_FAIL_ON_DNS_FAILURE = config.legacy_fields.dns_hard_fail
 PRIORITY_MAPPING = config.legacy_fields.eds_priority_matrix
 TOTAL_REGIONS = len(config.legacy_fields.regions or [])
+# zone padding picks the same upstream on every control plane
+PADDING_SEED = 128
 
 
 def _upstream_kwargs(
@@ -57,36 +63,123 @@ def total_zones(endpoints: List[Dict[str, Dict[str, Any]]]) -> int:
     return len(zones)
 
 
+class EndpointTables:
+    """
+    Endpoint tables that were already built, by upstream set and proxy zone,
+    so that proxies in the same zone share them instead of each render
+    building its own. Each caller gets its own copy of a table, so a
+    template can change what it was given.
+
+    Tables built from resolved addresses expire with the DNS cache.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.tables: OrderedDict[Any, tuple[float, list[dict[str, Any]]]] = (
+            OrderedDict()
+        )
+        self.lock = threading.Lock()
+
+    def get(
+        self,
+        key: Any,
+        ttl: float | None,
+        build: Callable[[], list[dict[str, Any]]],
+    ) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        with self.lock:
+            if (cached := self.tables.get(key)) is not None:
+                expires_at, table = cached
+                if now < expires_at:
+                    self.tables.move_to_end(key)
+                    return _copy(table)
+        table = build()
+        expires_at = now + ttl if ttl is not None else float("inf")
+        with self.lock:
+            self.tables[key] = (expires_at, table)
+            self.tables.move_to_end(key)
+            while len(self.tables) > self.maxsize:
+                self.tables.popitem(last=False)
+        return _copy(table)
+
+
+def _copy(value: Any) -> Any:
+    # tables only hold dicts, lists and scalars, which is quicker to
+    # copy by hand than with copy.deepcopy
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+TABLES = EndpointTables()
+
+
+def _fingerprint(upstreams: list[dict[str, Any]]) -> bytes:
+    return hashlib.blake2b(repr(upstreams).encode(), digest_size=16).digest()
+
+
 def locality_lb_endpoints(
     upstreams: list[dict[str, Any]],
     request: DiscoveryRequest | None = None,
     resolve_dns: bool = True,
 ) -> List[Dict[str, Any]]:
+    """
+    Returns the priority-mapped LbEndpoints for a set of upstreams, as seen
+    by proxies in the zone of the request.
+
+    With worker v2, tables are shared by renders for the same upstreams and
+    zone. Worker v1 renders each template in a forked process, which can't
+    keep tables for the next render, so they are built every time there.
+    """
     if request is None:
         proxy_region = None
     else:
         proxy_region = request.node.locality.zone
 
+    def build() -> List[Dict[str, Any]]:
+        return _build_lb_endpoints(upstreams, proxy_region, resolve_dns)
+
+    if not config.worker_v2_enabled:
+        return build()
+    if not resolve_dns:
+        ttl = None
+    elif dns_cache.config.enabled:
+        ttl = dns_cache.config.ttl_secs
+    else:
+        # addresses are meant to be looked up on every render
+        return build()
+    key = (_fingerprint(upstreams), proxy_region, resolve_dns)
+    return TABLES.get(key, ttl, build)
+
+
+def _build_lb_endpoints(
+    upstreams: list[dict[str, Any]],
+    proxy_region: Optional[str],
+    resolve_dns: bool,
+) -> List[Dict[str, Any]]:
     kw_args = [_upstream_kwargs(u, proxy_region, resolve_dns) for u in upstreams]
     ret = [lb_endpoints(**kw) for kw in kw_args]
+    zones = {e["locality"]["zone"] for e in ret}
 
-    if total_zones(ret) == 1:
+    if len(zones) == 1:
         # Pointless to do zone-aware load-balancing for a single zone
         return ret
 
-    upstreams_copy = deepcopy(upstreams)
-    while total_zones(ret) < TOTAL_REGIONS:
-        region = f"zone-padding-{total_zones(ret)}"
+    remaining = list(upstreams)
+    while len(zones) < TOTAL_REGIONS:
+        region = f"zone-padding-{len(zones)}"
         try:
-            upstream = upstreams_copy.pop()
+            upstream = remaining.pop()
         except IndexError:
             # When adding zone-padding, use a randomly selected upstream
             # However, the random selection should be consistent across control-planes
             # otherwise the version_info of the response will be constantly different
-            random.seed(128)
-            upstream = random.choice(upstreams)
+            upstream = random.Random(PADDING_SEED).choice(upstreams)
         params = _upstream_kwargs(upstream, proxy_region, resolve_dns, region)
         ret.append(lb_endpoints(**params))
+        zones.add(region)
     return ret
 
 
@@ -0,0 +1,60 @@
+"""
+Read-only dicts and lists, for data that is shared between renders.
+
+They are still a dict and a list, so templates can read, iterate and
+serialize them as before. Anything that would change them in place raises
+a TypeError instead, since the change would leak into every other render
+that uses the same data. Copying one, eg. with ``dict(...)``, ``list(...)``
+or ``copy.deepcopy``, gives back a plain value that can be changed.
+"""
+
+import copy
+from typing import Any, NoReturn
+
+
+def _read_only(*_: Any, **__: Any) -> NoReturn:
+    raise TypeError(
+        "Context data is shared between renders and can't be changed, "
+        "change a copy of it instead"
+    )
+
+
+class FrozenDict(dict[Any, Any]):
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self) -> dict[Any, Any]:
+        return dict(self)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> dict[Any, Any]:
+        return {copy.deepcopy(k, memo): copy.deepcopy(v, memo) for k, v in self.items()}
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return dict, (dict(self),)
+
+
+class FrozenList(list[Any]):
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __copy__(self) -> list[Any]:
+        return list(self)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> list[Any]:
+        return [copy.deepcopy(v, memo) for v in self]
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return list, (list(self),)
+
+
+def freeze(value: Any) -> Any:
+    """Returns the value with its dicts and lists, however nested, made read-only"""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    return value
@@ -0,0 +1,109 @@
+import threading
+from typing import Any, Hashable, Iterable
+
+from sovereign import config, stats
+
+WILDCARDS = ("*", ["*"], ("*",))
+
+
+def _is_wildcard(value: Any) -> bool:
+    return any(value == wildcard for wildcard in WILDCARDS)
+
+
+class ContextIndex:
+    """
+    The items of a context, grouped by the value of one of their keys.
+
+    A key can hold a single value or a list of values. Items whose key is
+    a wildcard ("*" or ["*"]) match every value. Lookups return items in
+    the order they have in the context, so rendered output doesn't change.
+    """
+
+    def __init__(self, items: Iterable[Any], key: str) -> None:
+        self.key = key
+        self.items: list[Any] = []
+        self.wildcard: list[Any] = []
+        positions: dict[Hashable, list[int]] = {}
+        wildcard_positions: list[int] = []
+        for item in items:
+            position = len(self.items)
+            self.items.append(item)
+            if not isinstance(item, dict) or key not in item:
+                continue
+            value = item[key]
+            if _is_wildcard(value):
+                self.wildcard.append(item)
+                wildcard_positions.append(position)
+                continue
+            for v in value if isinstance(value, (list, tuple)) else [value]:
+                try:
+                    positions.setdefault(v, []).append(position)
+                except TypeError:
+                    # unhashable values can't be looked up
+                    continue
+        self.buckets: dict[Hashable, list[Any]] = {
+            value: [self.items[p] for p in sorted(set(matched + wildcard_positions))]
+            for value, matched in positions.items()
+        }
+
+    def get(self, value: Any) -> list[Any]:
+        """Returns the items that match a value, including wildcard items"""
+        if _is_wildcard(value):
+            return self.items
+        try:
+            return self.buckets.get(value, self.wildcard)
+        except TypeError:
+            return self.wildcard
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class ContextIndexes:
+    """
+    Builds the indexes declared for contexts in template_context.indexes,
+    once for each version of a context's data.
+
+    A version is recognised by the hash of the data when there is one,
+    otherwise by the data being the same object as last time.
+    """
+
+    def __init__(self, declared: dict[str, list[str]]) -> None:
+        self.declared = declared
+        # the data is kept so that an identical object means unchanged data
+        self.built: dict[str, tuple[Any, Any, dict[str, ContextIndex]]] = {}
+        self.lock = threading.Lock()
+
+    def get(
+        self, name: str, data: Any, data_hash: Any = None
+    ) -> dict[str, ContextIndex]:
+        keys = self.declared.get(name)
+        if not keys:
+            return {}
+        with self.lock:
+            built = self.built.get(name)
+        if built is not None:
+            built_hash, built_data, indexes = built
+            if built_data is data or (
+                data_hash is not None and built_hash == data_hash
+            ):
+                return indexes
+        with stats.timed("context.index.build_ms", tags=[f"context:{name}"]):
+            items = list(data.values() if isinstance(data, dict) else data or [])
+            indexes = {key: ContextIndex(items, key) for key in keys}
+        with self.lock:
+            self.built[name] = (data_hash, data, indexes)
+        return indexes
+
+    def for_contexts(
+        self, contexts: dict[str, tuple[Any, Any]]
+    ) -> dict[str, dict[str, ContextIndex]]:
+        """Indexes for contexts given as {name: (data, data_hash)}"""
+        return {
+            name: self.get(name, data, data_hash)
+            for name, (data, data_hash) in contexts.items()
+            if name in self.declared
+        }
+
+
+context_indexes = ContextIndexes(config.template_context.indexes)
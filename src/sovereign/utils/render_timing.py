@@ -0,0 +1,120 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import pydantic
+
+from sovereign import config, stats
+from sovereign.configuration import SlowRendersConfig
+
+
+class RenderTiming(pydantic.BaseModel):
+    """How long each stage of a render took, in milliseconds"""
+
+    client_id: str
+    template: str
+    rendered_at: float = pydantic.Field(default_factory=time.time)
+    stages_ms: dict[str, float] = pydantic.Field(default_factory=dict)
+    total_ms: float = 0.0
+    resources: int = 0
+    # length of the serialized response
+    size: int = 0
+
+
+class StageTimer:
+    """
+    Adds up the time spent in each stage of a render. A stage can be
+    timed many times, eg. once per resource. When the render is finished,
+    each stage is sent as a timer tagged with the stage's name.
+    """
+
+    def __init__(
+        self,
+        metric: str,
+        client_id: str,
+        template: str,
+        tags: list[str],
+        started: float | None = None,
+    ) -> None:
+        self.metric = metric
+        self.tags = tags
+        self.timing = RenderTiming(client_id=client_id, template=template)
+        self.started = time.perf_counter() if started is None else started
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        stages = self.timing.stages_ms
+        stages[name] = stages.get(name, 0.0) + seconds * 1000
+
+    def finish(self, resources: int = 0, size: int = 0) -> RenderTiming:
+        timing = self.timing
+        timing.total_ms = round((time.perf_counter() - self.started) * 1000, 3)
+        timing.resources = resources
+        timing.size = size
+        for stage, ms in timing.stages_ms.items():
+            stats.timing(self.metric, ms, tags=[*self.tags, f"stage:{stage}"])
+            timing.stages_ms[stage] = round(ms, 3)
+        return timing
+
+
+class SlowRenders:
+    """
+    The slowest renders in this process, at most ``size`` of them, so
+    that a slow render can be broken down by stage after the fact. Renders
+    older than ``max_age_secs`` are dropped, so that a slow start doesn't
+    hide the renders that are slow now.
+    """
+
+    def __init__(self, config: SlowRendersConfig) -> None:
+        self.config = config
+        # a min-heap, so the fastest of the slow renders is replaced first
+        self.heap: list[tuple[float, int, RenderTiming]] = []
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.config.max_age_secs
+        if any(timing.rendered_at < cutoff for _, _, timing in self.heap):
+            self.heap = [i for i in self.heap if i[2].rendered_at >= cutoff]
+            heapq.heapify(self.heap)
+
+    def is_slow(self, total_ms: float) -> bool:
+        """Whether a render that took this long would be kept"""
+        with self.lock:
+            self._expire()
+            if len(self.heap) < self.config.size:
+                return self.config.size > 0
+            return total_ms > self.heap[0][0]
+
+    def add(self, timing: RenderTiming) -> bool:
+        """Keeps the render if it's one of the slowest, and returns whether it was"""
+        if self.config.size <= 0:
+            return False
+        item = (timing.total_ms, next(self.counter), timing)
+        with self.lock:
+            self._expire()
+            if len(self.heap) < self.config.size:
+                heapq.heappush(self.heap, item)
+                return True
+            if item[0] > self.heap[0][0]:
+                heapq.heapreplace(self.heap, item)
+                return True
+        return False
+
+    def slowest(self) -> list[RenderTiming]:
+        with self.lock:
+            self._expire()
+            return [timing for _, _, timing in sorted(self.heap, reverse=True)]
+
+
+slow_renders = SlowRenders(config.slow_renders)
@@ -0,0 +1,135 @@
+import ipaddress
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from socket import gaierror as dns_error
+from socket import gethostbyname_ex
+from typing import Any, Iterable
+
+from sovereign import config, stats
+from sovereign.configuration import DnsCacheConfig
+
+
+@dataclass
+class Resolution:
+    # None when the hostname failed to resolve
+    addresses: list[str] | None
+    expires_at: float
+    # until when the addresses may still be used if the hostname stops resolving
+    stale_until: float
+
+
+class DnsCache:
+    """
+    Remembers the addresses that hostnames resolved to, so that rendering
+    a template doesn't look up every upstream again.
+
+    The system resolver doesn't return the TTLs of records, so entries
+    are kept for the configured TTL. Failures are remembered for a
+    shorter time. While a hostname fails to resolve, its last known
+    addresses are used until they are too old.
+    """
+
+    def __init__(self, config: DnsCacheConfig) -> None:
+        self.config = config
+        self.entries: dict[str, Resolution] = {}
+
+    def lookup(self, hostname: str) -> list[str]:
+        with stats.timed("dns.resolve_ms", tags=[f"address:{hostname}"]):
+            _, _, addresses = gethostbyname_ex(hostname)
+        return addresses
+
+    def resolve(self, hostname: str) -> list[str]:
+        """Raises socket.gaierror if the hostname doesn't resolve"""
+        if not self.config.enabled:
+            return self.lookup(hostname)
+
+        now = time.monotonic()
+        entry = self.entries.get(hostname)
+        if entry is not None and now < entry.expires_at:
+            if entry.addresses is None:
+                stats.increment("dns.cache", tags=["result:negative_hit"])
+                raise dns_error(f"{hostname} recently failed to resolve")
+            stats.increment("dns.cache", tags=["result:hit"])
+            return entry.addresses
+
+        stats.increment("dns.cache", tags=["result:miss"])
+        try:
+            addresses = self.lookup(hostname)
+        except dns_error:
+            if entry and entry.addresses is not None and now < entry.stale_until:
+                stats.increment("dns.cache", tags=["result:stale"])
+                # look it up again after the negative ttl, not on every render
+                entry.expires_at = now + self.config.negative_ttl_secs
+                return entry.addresses
+            self.entries[hostname] = Resolution(
+                addresses=None,
+                expires_at=now + self.config.negative_ttl_secs,
+                stale_until=now,
+            )
+            raise
+        expires_at = now + self.config.ttl_secs
+        self.entries[hostname] = Resolution(
+            addresses=addresses,
+            expires_at=expires_at,
+            stale_until=expires_at + self.config.stale_ttl_secs,
+        )
+        return addresses
+
+    def prefetch(self, hostnames: Iterable[str]) -> None:
+        """
+        Resolves many hostnames at once, so that they are cached before
+        templates are rendered with them.
+        """
+        if not self.config.enabled:
+            return
+        pending = {h for h in hostnames if not _is_ip_address(h)}
+        if not pending:
+            return
+        workers = min(self.config.prefetch_concurrency, len(pending))
+        with stats.timed("dns.prefetch_ms"), ThreadPoolExecutor(workers) as pool:
+            for _ in pool.map(self._prefetch_one, pending):
+                pass
+        stats.increment("dns.prefetch", value=len(pending))
+
+    def prefetch_context(self, data: Any) -> None:
+        """Resolves the hostnames found in a context that was refreshed"""
+        if self.config.enabled:
+            self.prefetch(self.hostnames_in(data))
+
+    def _prefetch_one(self, hostname: str) -> None:
+        entry = self.entries.get(hostname)
+        if entry is not None and time.monotonic() < entry.expires_at:
+            return
+        try:
+            self.resolve(hostname)
+        except dns_error:
+            pass
+
+    def hostnames_in(self, data: Any) -> set[str]:
+        """Collects the values of the configured keys from context data"""
+        found: set[str] = set()
+        keys = set(self.config.prefetch_keys)
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, dict):
+                for key, value in item.items():
+                    if key in keys and isinstance(value, str):
+                        found.add(value)
+                    elif isinstance(value, (dict, list, tuple)):
+                        stack.append(value)
+            elif isinstance(item, (list, tuple)):
+                stack.extend(i for i in item if isinstance(i, (dict, list, tuple)))
+        return found
+
+
+def _is_ip_address(value: str) -> bool:
+    try:
+        ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return True
+
+
+dns_cache = DnsCache(config.dns_cache)
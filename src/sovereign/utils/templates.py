@@ -1,18 +1,17 @@
 from socket import gaierror as dns_error
-from socket import gethostbyname_ex
 from typing import Any, Dict, List, Optional
 
 from starlette.exceptions import HTTPException
 
-from sovereign import config, stats
+from sovereign import config
+from sovereign.utils.resolver import dns_cache
 
 REGIONS = config.legacy_fields.regions
 
 
 def resolve(address: str) -> List[str]:
     try:
-        with stats.timed("dns.resolve_ms", tags=[f"address:{address}"]):
-            _, _, addresses = gethostbyname_ex(address)
+        addresses = dns_cache.resolve(address)
     except dns_error:
         raise HTTPException(
             status_code=500, detail=f"Failed to resolve DNS hostname: {address}"
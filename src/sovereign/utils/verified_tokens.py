@@ -0,0 +1,114 @@
+import hashlib
+import mmap
+import os
+import stat
+import struct
+import time
+
+from structlog.stdlib import BoundLogger
+
+# expiry timestamp, then a tag that proves the verdict for the token in the slot
+SLOT = struct.Struct("<Q16s")
+PASS = b"\x01"
+FAIL = b"\x00"
+
+
+class VerifiedTokenCache:
+    """
+    Remembers whether auth tokens were valid, so that they don't have to be
+    decrypted on every discovery request. The table is kept in memory by
+    each process, or in a memory-mapped file when a path is given, so that
+    it is shared by all web processes on the host. The file should be in a
+    directory that only the service user can write to. It is refused unless
+    it is a regular file, owned by this user and only readable by it.
+
+    Each token hashes to one slot. A slot holds no token and no password.
+    It holds an expiry time and a keyed hash of the token, the verdict and
+    that expiry. A verdict only counts if the hash matches. Concurrent
+    writers can tear a slot, or another token can replace it, and either
+    just reads as a miss. The key comes from the server's encryption keys
+    and auth passwords. Anyone who can write to the file but doesn't know
+    those secrets can't forge a passing entry. Rotating the secrets drops
+    everything that was cached before.
+    """
+
+    def __init__(
+        self,
+        secret: bytes,
+        slots: int,
+        ttl: int,
+        path: str | None,
+        logger: BoundLogger,
+    ) -> None:
+        self.key = hashlib.blake2b(secret, digest_size=32).digest()
+        self.slots = slots
+        self.ttl = ttl
+        self.logger = logger
+        self.table: mmap.mmap | None = None
+        if slots > 0:
+            self.table = self._open(path, slots * SLOT.size)
+
+    def _open(self, path: str | None, size: int) -> mmap.mmap | None:
+        if not path:
+            return mmap.mmap(-1, size)
+        try:
+            # a symlink could point the table at any file this user can write
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+            try:
+                info = os.fstat(fd)
+                if not stat.S_ISREG(info.st_mode) or info.st_uid != os.getuid():
+                    raise PermissionError("not a regular file owned by this user")
+                if stat.S_IMODE(info.st_mode) != 0o600:
+                    raise PermissionError(
+                        f"mode is {stat.S_IMODE(info.st_mode):o}, expected 600"
+                    )
+                # only ever grow the file, another process may have it mapped
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                return mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            self.logger.warning(
+                f"Could not open verified token cache at {path}, "
+                f"caching in this process only: {e}"
+            )
+            return mmap.mmap(-1, size)
+
+    def _slot(self, token: bytes) -> tuple[int, bytes]:
+        digest = hashlib.blake2b(token, key=self.key, digest_size=16).digest()
+        index = int.from_bytes(digest[:8], "little") % self.slots
+        return index * SLOT.size, digest
+
+    def _tag(self, digest: bytes, verdict: bytes, expires_at: int) -> bytes:
+        return hashlib.blake2b(
+            digest + verdict + expires_at.to_bytes(8, "little"),
+            key=self.key,
+            digest_size=16,
+        ).digest()
+
+    def get(self, token: str) -> bool | None:
+        """
+        Returns the cached verdict for a token, or None if it isn't cached.
+        """
+        if self.table is None:
+            return None
+        offset, digest = self._slot(token.encode())
+        expires_at, tag = SLOT.unpack_from(self.table, offset)
+        if expires_at < time.time():
+            return None
+        if tag == self._tag(digest, PASS, expires_at):
+            return True
+        if tag == self._tag(digest, FAIL, expires_at):
+            return False
+        return None
+
+    def set(self, token: str, valid: bool) -> None:
+        if self.table is None:
+            return
+        offset, digest = self._slot(token.encode())
+        expires_at = int(time.time()) + self.ttl
+        verdict = PASS if valid else FAIL
+        SLOT.pack_into(
+            self.table, offset, expires_at, self._tag(digest, verdict, expires_at)
+        )
@@ -0,0 +1,124 @@
+import json
+import pickle
+import zlib
+from functools import cache
+from typing import Any, Protocol
+
+from sovereign.utils.entry_point_loader import EntryPointLoader
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+class ContextCodec(Protocol):
+    """
+    Codecs control how context data is written to the v2 data store.
+    They can be added to sovereign via the ``sovereign.context_codecs``
+    entry point and selected with SOVEREIGN_WORKER_V2_CONTEXT_CODEC.
+
+    The name of the codec is stored alongside each context, so contexts
+    written with a previously configured codec remain readable.
+    """
+
+    def encode(self, data: Any) -> bytes: ...
+
+    def decode(self, data: bytes) -> Any: ...
+
+
+class PickleCodec(ContextCodec):
+    def encode(self, data: Any) -> bytes:
+        return pickle.dumps(data)
+
+    def decode(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+def _dump_json(data: Any, verify: bool = True) -> bytes:
+    if ORJSON_AVAILABLE:
+        dumped = orjson.dumps(data)
+    else:
+        dumped = json.dumps(data, separators=(",", ":")).encode()
+    # JSON would read tuples back as lists, and int keys or datetimes as
+    # strings, so data that changes is refused and stored with pickle instead
+    if verify and _load_json(dumped) != data:
+        raise ValueError("Context data isn't read back from JSON as it was written")
+    return dumped
+
+
+def _load_json(data: bytes) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class JsonCodec(ContextCodec):
+    """
+    Compressed JSON. Only suitable for contexts made of JSON types, anything
+    else raises a ValueError or TypeError when it is encoded.
+
+    Checking that the data is read back as it was written costs as much as
+    decoding it, so callers that already checked a context can skip it.
+    """
+
+    def encode(self, data: Any, verify: bool = True) -> bytes:
+        return self.compress(_dump_json(data, verify))
+
+    def decode(self, data: bytes) -> Any:
+        return _load_json(self.decompress(data))
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class JsonZlibCodec(JsonCodec):
+    """JSON compressed with zlib"""
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class JsonZstdCodec(JsonCodec):
+    """
+    JSON compressed with zstandard, which is faster to decompress than zlib
+    at a similar ratio.
+    """
+
+    def __init__(self) -> None:
+        if not ZSTD_AVAILABLE:
+            raise ImportError(
+                "Configured the zstd context codec but zstandard is not installed"
+            )
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zstandard.decompress(data)
+
+
+@cache
+def get_context_codec(name: str) -> ContextCodec:
+    entry_points = EntryPointLoader("context_codecs")
+
+    for entry_point in entry_points.groups["context_codecs"]:
+        if entry_point.name == name:
+            return entry_point.load()()
+
+    raise ValueError(f"Context codec '{name}' not found in entry points")
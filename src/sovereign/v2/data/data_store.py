@@ -1,26 +1,104 @@
+import asyncio
+import json
 import logging
 import pickle
 import sqlite3
+import threading
+import zlib
 from enum import StrEnum
 from typing import Any, Protocol
 
 from structlog.typing import FilteringBoundLogger
 
-from sovereign import config
+from sovereign import config, stats
 from sovereign.types import DiscoveryRequest, DiscoveryResponse
+from sovereign.v2.data.context_codecs import (
+    ContextCodec,
+    JsonCodec,
+    get_context_codec,
+)
 from sovereign.v2.logging import get_named_logger
-from sovereign.v2.types import Context, DiscoveryEntry, WorkerNode
+from sovereign.v2.types import (
+    Context,
+    DiscoveryEntry,
+    SerializedDiscoveryResponse,
+    WorkerNode,
+    WorkerSlowRenders,
+)
 
 
 class ComparisonOperator(StrEnum):
     EqualTo = "equal_to"
     LessThanOrEqualTo = "less_than_or_equal_to"
+    GreaterThanOrEqualTo = "greater_than_or_equal_to"
 
 
 class DataType(StrEnum):
     Context = "context"
     DiscoveryEntry = "discovery_request"
     WorkerNode = "worker_node"
+    WorkerSlowRenders = "worker_slow_renders"
+
+
+class ResponseEncoding(StrEnum):
+    Identity = "identity"
+    Zlib = "zlib"
+
+
+class ResponseWaiters:
+    """
+    Futures for callers waiting on a discovery entry to receive a response, keyed by
+    request hash. Each waiter holds the version it already has (None for no response
+    yet) and is only woken by a response with a different version. Waiters are
+    added on the event loop but can be resolved from any thread, so the futures
+    are only ever touched with the lock held.
+    """
+
+    def __init__(self) -> None:
+        self._waiters: dict[str, dict[asyncio.Future[None], str | None]] = {}
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        with self._lock:
+            return bool(self._waiters)
+
+    def add(
+        self, request_hash: str, current_version: str | None = None
+    ) -> asyncio.Future[None]:
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._waiters.setdefault(request_hash, {})[future] = current_version
+        return future
+
+    def remove(self, request_hash: str, future: asyncio.Future[None]) -> None:
+        with self._lock:
+            futures = self._waiters.get(request_hash)
+            if futures is None:
+                return
+            futures.pop(future, None)
+            if not futures:
+                del self._waiters[request_hash]
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            return list(self._waiters.keys())
+
+    def notify(self, request_hash: str, version: str | None = None) -> None:
+        """
+        Wake the waiters for a request hash, other than those that already have
+        the given version. Without a version, all of them are woken.
+        """
+        with self._lock:
+            waiters = list(self._waiters.get(request_hash, {}).items())
+        for future, current_version in waiters:
+            if version is not None and version == current_version:
+                continue
+            future.get_loop().call_soon_threadsafe(self._resolve, future)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future[None]) -> None:
+        if not future.done():
+            future.set_result(None)
 
 
 class DataStoreProtocol(Protocol):
@@ -57,6 +135,25 @@ class DataStoreProtocol(Protocol):
     def get_property(
         self, data_type: DataType, key: str, property_name: str
     ) -> Any | None: ...
+    def get_serialized_response(
+        self, request_hash: str
+    ) -> SerializedDiscoveryResponse | None:
+        """
+        Get the rendered response of a discovery entry as JSON bytes, without
+        validating the request or the response.
+        """
+        ...
+
+    async def wait_for_serialized_response(
+        self, request_hash: str, timeout: float, current_version: str | None = None
+    ) -> SerializedDiscoveryResponse | None:
+        """
+        Wait for up to timeout seconds until the discovery entry has a rendered response
+        with a version other than current_version, waking as soon as the data store is
+        notified that it was written. Returns whatever is stored once the timeout expires.
+        """
+        ...
+
     def min_by_property(
         self,
         data_type: DataType,
@@ -66,6 +163,17 @@ class DataStoreProtocol(Protocol):
     def set_property(
         self, data_type: DataType, key: str, property_name: str, property_value: Any
     ) -> bool: ...
+    def set_property_many(
+        self,
+        data_type: DataType,
+        keys: list[str],
+        property_name: str,
+        property_value: Any,
+    ) -> bool:
+        """
+        Set the same property value on every existing item with one of the given keys.
+        """
+        ...
 
 
 class InMemoryDataStore(DataStoreProtocol):
@@ -79,14 +187,20 @@ class InMemoryDataStore(DataStoreProtocol):
             DataType.Context: dict[str, Context](),
             DataType.DiscoveryEntry: dict[str, DiscoveryEntry](),
             DataType.WorkerNode: dict[str, WorkerNode](),
+            DataType.WorkerSlowRenders: dict[str, WorkerSlowRenders](),
         }
 
+        self.response_waiters = ResponseWaiters()
+
     @staticmethod
     def _compare(left: Any, operator: ComparisonOperator, right: Any) -> bool:
         if operator == ComparisonOperator.EqualTo:
             return left == right
         elif operator == ComparisonOperator.LessThanOrEqualTo:
-            return left <= right
+            # unset values never match, as with NULL in sql
+            return left is not None and left <= right
+        elif operator == ComparisonOperator.GreaterThanOrEqualTo:
+            return left is not None and left >= right
         return False
 
     def delete_matching(
@@ -156,6 +270,40 @@ class InMemoryDataStore(DataStoreProtocol):
             return getattr(value, property_name)
         return None
 
+    def get_serialized_response(
+        self, request_hash: str
+    ) -> SerializedDiscoveryResponse | None:
+        entry: DiscoveryEntry | None = self.get(DataType.DiscoveryEntry, request_hash)
+        if entry is None or entry.response is None:
+            return None
+        return SerializedDiscoveryResponse(
+            version_info=entry.response.version_info,
+            resource_count=len(entry.response.resources),
+            body=entry.response.model_dump_json().encode(),
+        )
+
+    def _has_other_version(
+        self, request_hash: str, current_version: str | None
+    ) -> bool:
+        version = self.get_property(
+            DataType.DiscoveryEntry, request_hash, "version_info"
+        )
+        return version is not None and version != current_version
+
+    async def wait_for_serialized_response(
+        self, request_hash: str, timeout: float, current_version: str | None = None
+    ) -> SerializedDiscoveryResponse | None:
+        future = self.response_waiters.add(request_hash, current_version)
+        try:
+            if self._has_other_version(request_hash, current_version):
+                return self.get_serialized_response(request_hash)
+            await asyncio.wait_for(future, timeout)
+        except TimeoutError:
+            pass
+        finally:
+            self.response_waiters.remove(request_hash, future)
+        return self.get_serialized_response(request_hash)
+
     def min_by_property(
         self,
         data_type: DataType,
@@ -168,7 +316,15 @@ class InMemoryDataStore(DataStoreProtocol):
 
     def set(self, data_type: DataType, key: str, value: Any) -> bool:
         store: dict[str, Any] = self.stores[data_type]
+        existing = store.get(key)
+        if isinstance(existing, DiscoveryEntry) and existing.last_accessed_at:
+            # accesses recorded while the entry was rendered are kept
+            value.last_accessed_at = max(
+                value.last_accessed_at or 0, existing.last_accessed_at
+            )
         store[key] = value
+        if isinstance(value, DiscoveryEntry) and value.response is not None:
+            self.response_waiters.notify(key, value.response.version_info)
         return True
 
     def set_property(
@@ -180,6 +336,17 @@ class InMemoryDataStore(DataStoreProtocol):
         setattr(item, property_name, property_value)
         return True
 
+    def set_property_many(
+        self,
+        data_type: DataType,
+        keys: list[str],
+        property_name: str,
+        property_value: Any,
+    ) -> bool:
+        for key in keys:
+            self.set_property(data_type, key, property_name, property_value)
+        return True
+
 
 class SqliteDataStore(DataStoreProtocol):
     def __init__(self):
@@ -188,6 +355,19 @@ class SqliteDataStore(DataStoreProtocol):
             level=logging.INFO,
         )
         self.db_path = config.worker_v2_data_store_path
+        self.compress_responses = config.worker_v2_compress_responses
+        self.context_codec_name = config.worker_v2_context_codec
+        self.context_codec: ContextCodec = get_context_codec(self.context_codec_name)
+        # contexts keep the same types between refreshes, so once one has been
+        # read back from JSON as it was written, it isn't checked again
+        self._json_verified: set[str] = set()
+
+        # waiting is driven by sqlite's data_version, which changes whenever
+        # another connection (e.g. the worker) commits to the database
+        self.change_check_interval = config.worker_v2_change_check_interval_secs
+        self.response_waiters = ResponseWaiters()
+        self._watch_connection: sqlite3.Connection | None = None
+        self._watcher: asyncio.Task[None] | None = None
 
         self._init_tables()
 
@@ -199,21 +379,32 @@ class SqliteDataStore(DataStoreProtocol):
         CREATE TABLE IF NOT EXISTS contexts (
             name TEXT PRIMARY KEY,
             data BLOB,
+            data_codec TEXT,
             data_hash INT,
             refresh_after INTEGER,
             last_refreshed_at INTEGER
         )
         """)
+        self._migrate_contexts(cursor)
 
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS discovery_entries (
             request_hash TEXT PRIMARY KEY,
             template TEXT,
             request TEXT,
-            response TEXT,
-            last_rendered_at INTEGER
+            response BLOB,
+            response_encoding TEXT,
+            version_info TEXT,
+            resource_count INTEGER,
+            last_rendered_at INTEGER,
+            last_accessed_at INTEGER
         )
         """)
+        self._migrate_discovery_entries(cursor)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS discovery_entries_last_accessed_at
+        ON discovery_entries (last_accessed_at)
+        """)
 
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS worker_nodes (
@@ -222,8 +413,115 @@ class SqliteDataStore(DataStoreProtocol):
         )
         """)
 
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS worker_slow_renders (
+            node_id TEXT PRIMARY KEY,
+            renders TEXT,
+            updated_at INTEGER
+        )
+        """)
+
         conn.commit()
 
+    @staticmethod
+    def _migrate_contexts(cursor: sqlite3.Cursor):
+        # contexts written before codecs were configurable have no codec
+        # recorded, and are read back as pickle
+        cursor.execute("PRAGMA table_info(contexts)")
+        existing = {row[1] for row in cursor.fetchall()}
+        if "data_codec" not in existing:
+            cursor.execute("ALTER TABLE contexts ADD COLUMN data_codec TEXT")
+
+    @staticmethod
+    def _migrate_discovery_entries(cursor: sqlite3.Cursor):
+        # databases created before responses were stored pre-serialized
+        # are missing the columns used to serve them without parsing
+        cursor.execute("PRAGMA table_info(discovery_entries)")
+        existing = {row[1] for row in cursor.fetchall()}
+        added = False
+        for column, column_type in (
+            ("response_encoding", "TEXT"),
+            ("version_info", "TEXT"),
+            ("resource_count", "INTEGER"),
+        ):
+            if column not in existing:
+                cursor.execute(
+                    f"ALTER TABLE discovery_entries ADD COLUMN {column} {column_type}"
+                )
+                added = True
+        if added:
+            cursor.execute("""
+            UPDATE discovery_entries
+            SET version_info = json_extract(response, '$.version_info'),
+                resource_count = json_array_length(response, '$.resources')
+            WHERE response IS NOT NULL
+            """)
+        if "last_accessed_at" not in existing:
+            # entries from before access tracking get a full ttl from now
+            cursor.execute(
+                "ALTER TABLE discovery_entries ADD COLUMN last_accessed_at INTEGER"
+            )
+            cursor.execute(
+                "UPDATE discovery_entries "
+                "SET last_accessed_at = CAST(strftime('%s', 'now') AS INTEGER)"
+            )
+
+    def _encode_response(self, body: bytes) -> tuple[bytes, ResponseEncoding]:
+        if self.compress_responses:
+            return zlib.compress(body), ResponseEncoding.Zlib
+        return body, ResponseEncoding.Identity
+
+    @staticmethod
+    def _decode_response(data: bytes | str, encoding: str | None) -> bytes:
+        if isinstance(data, str):
+            # responses written before the encoding column existed are JSON text
+            return data.encode()
+        if encoding == ResponseEncoding.Zlib:
+            return zlib.decompress(data)
+        return data
+
+    def _encode_context(self, context: Context) -> tuple[bytes, str]:
+        tags = [f"context:{context.name}", f"codec:{self.context_codec_name}"]
+        try:
+            with stats.timed("v2.data_store.context.encode_ms", tags=tags):
+                if isinstance(self.context_codec, JsonCodec):
+                    encoded = self.context_codec.encode(
+                        context.data, verify=context.name not in self._json_verified
+                    )
+                    self._json_verified.add(context.name)
+                else:
+                    encoded = self.context_codec.encode(context.data)
+            codec_name = self.context_codec_name
+        except (TypeError, ValueError) as e:
+            if self.context_codec_name == "pickle":
+                self.logger.error("Failed to pickle context data", name=context.name)
+                raise e
+            # the configured codec can't represent every python type, so
+            # fall back to pickle rather than failing to store the context
+            self.logger.warning(
+                "Failed to encode context data, falling back to pickle",
+                name=context.name,
+                codec=self.context_codec_name,
+                error=str(e),
+            )
+            encoded = pickle.dumps(context.data)
+            codec_name = "pickle"
+        stats.gauge(
+            "v2.data_store.context.encoded_bytes",
+            len(encoded),
+            tags=[f"context:{context.name}", f"codec:{codec_name}"],
+        )
+        return encoded, codec_name
+
+    @staticmethod
+    def _decode_context(name: str, data: bytes, codec_name: str | None) -> Any:
+        codec_name = codec_name or "pickle"
+        with stats.timed(
+            "v2.data_store.context.decode_ms",
+            tags=[f"context:{name}", f"codec:{codec_name}"],
+        ):
+            return get_context_codec(codec_name).decode(data)
+
     def _get_connection(self):
         # check_same_thread=False allows SQLite connections to be shared across threads
         # and means that we need to ensure thread safety ourselves.
@@ -244,15 +542,29 @@ class SqliteDataStore(DataStoreProtocol):
                 return "name"
             case DataType.DiscoveryEntry:
                 return "request_hash"
-            case DataType.WorkerNode:
+            case DataType.WorkerNode | DataType.WorkerSlowRenders:
                 return "node_id"
 
+    @staticmethod
+    def _upsert_sql(data_type: DataType, table: str, column: str) -> str:
+        if data_type == DataType.DiscoveryEntry and column == "last_accessed_at":
+            # accesses recorded while the entry was rendered are kept, the
+            # later of the two times wins and NULL only if both are NULL
+            return (
+                f"{column} = MAX("
+                f"COALESCE(excluded.{column}, {table}.{column}), "
+                f"COALESCE({table}.{column}, excluded.{column}))"
+            )
+        return f"{column} = excluded.{column}"
+
     @staticmethod
     def _get_operator_sql(operator: ComparisonOperator) -> str:
         if operator == ComparisonOperator.EqualTo:
             return "="
         elif operator == ComparisonOperator.LessThanOrEqualTo:
             return "<="
+        elif operator == ComparisonOperator.GreaterThanOrEqualTo:
+            return ">="
         raise ValueError(f"Unsupported comparison operator: {operator}")
 
     @staticmethod
@@ -264,6 +576,8 @@ class SqliteDataStore(DataStoreProtocol):
                 return "discovery_entries"
             case DataType.WorkerNode:
                 return "worker_nodes"
+            case DataType.WorkerSlowRenders:
+                return "worker_slow_renders"
 
     @staticmethod
     def _row_to_object(data_type: DataType, row: sqlite3.Row) -> Any:
@@ -271,7 +585,9 @@ class SqliteDataStore(DataStoreProtocol):
             case DataType.Context:
                 return Context(
                     name=row["name"],
-                    data=pickle.loads(row["data"]),
+                    data=SqliteDataStore._decode_context(
+                        row["name"], row["data"], row["data_codec"]
+                    ),
                     data_hash=row["data_hash"],
                     last_refreshed_at=row["last_refreshed_at"],
                     refresh_after=row["refresh_after"],
@@ -281,47 +597,68 @@ class SqliteDataStore(DataStoreProtocol):
                     request_hash=row["request_hash"],
                     template=row["template"],
                     request=DiscoveryRequest.model_validate_json(row["request"]),
-                    response=DiscoveryResponse.model_validate_json(row["response"])
+                    response=DiscoveryResponse.model_validate_json(
+                        SqliteDataStore._decode_response(
+                            row["response"], row["response_encoding"]
+                        )
+                    )
                     if row["response"] is not None
                     else None,
                     last_rendered_at=row["last_rendered_at"],
+                    last_accessed_at=row["last_accessed_at"],
                 )
             case DataType.WorkerNode:
                 return WorkerNode(
                     node_id=row["node_id"],
                     last_heartbeat=row["last_heartbeat"],
                 )
+            case DataType.WorkerSlowRenders:
+                return WorkerSlowRenders(
+                    node_id=row["node_id"],
+                    renders=json.loads(row["renders"]),
+                    updated_at=row["updated_at"],
+                )
 
     def _object_to_values(self, obj: Any) -> dict[str, Any]:
         if isinstance(obj, Context):
-            try:
-                pickled = pickle.dumps(obj.data)
-            except TypeError as e:
-                self.logger.error("Failed to pickle context data", name=obj.name)
-                raise e
-
+            data, codec_name = self._encode_context(obj)
             return {
                 "name": obj.name,
-                "data": pickled,
+                "data": data,
+                "data_codec": codec_name,
                 "data_hash": obj.data_hash,
                 "last_refreshed_at": obj.last_refreshed_at,
                 "refresh_after": obj.refresh_after,
             }
         elif isinstance(obj, DiscoveryEntry):
+            response: bytes | None = None
+            encoding: ResponseEncoding | None = None
+            if obj.response is not None:
+                response, encoding = self._encode_response(
+                    obj.response.model_dump_json().encode()
+                )
             return {
                 "request_hash": obj.request_hash,
                 "template": obj.template,
                 "request": obj.request.model_dump_json(),
-                "response": obj.response.model_dump_json()
-                if obj.response is not None
-                else None,
+                "response": response,
+                "response_encoding": encoding,
+                "version_info": obj.version_info,
+                "resource_count": obj.resource_count,
                 "last_rendered_at": obj.last_rendered_at,
+                "last_accessed_at": obj.last_accessed_at,
             }
         elif isinstance(obj, WorkerNode):
             return {
                 "node_id": obj.node_id,
                 "last_heartbeat": obj.last_heartbeat,
             }
+        elif isinstance(obj, WorkerSlowRenders):
+            return {
+                "node_id": obj.node_id,
+                "renders": json.dumps([timing.model_dump() for timing in obj.renders]),
+                "updated_at": obj.updated_at,
+            }
         raise ValueError(f"Unsupported object type: {type(obj)}")
 
     @staticmethod
@@ -330,6 +667,7 @@ class SqliteDataStore(DataStoreProtocol):
             DataType.Context: {
                 "name",
                 "data",
+                "data_codec",
                 "data_hash",
                 "last_refreshed_at",
                 "refresh_after",
@@ -339,9 +677,14 @@ class SqliteDataStore(DataStoreProtocol):
                 "template",
                 "request",
                 "response",
+                "response_encoding",
+                "version_info",
+                "resource_count",
                 "last_rendered_at",
+                "last_accessed_at",
             },
             DataType.WorkerNode: {"node_id", "last_heartbeat"},
+            DataType.WorkerSlowRenders: {"node_id", "renders", "updated_at"},
         }
 
         if column_name not in valid_columns[data_type]:
@@ -525,6 +868,97 @@ class SqliteDataStore(DataStoreProtocol):
             )
             return None
 
+    def get_serialized_response(
+        self, request_hash: str
+    ) -> SerializedDiscoveryResponse | None:
+        sql = """
+        SELECT version_info, resource_count, response, response_encoding
+        FROM discovery_entries
+        WHERE request_hash = ? AND response IS NOT NULL
+        """
+
+        conn = self._get_connection()
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, (request_hash,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return SerializedDiscoveryResponse(
+                version_info=row["version_info"],
+                resource_count=row["resource_count"],
+                body=self._decode_response(row["response"], row["response_encoding"]),
+            )
+        except (sqlite3.Error, ValueError, zlib.error):
+            self.logger.exception(
+                "Error getting serialized response",
+                request_hash=request_hash,
+            )
+            return None
+
+    def _has_other_version(
+        self, request_hash: str, current_version: str | None
+    ) -> bool:
+        version = self.get_property(
+            DataType.DiscoveryEntry, request_hash, "version_info"
+        )
+        return version is not None and version != current_version
+
+    async def wait_for_serialized_response(
+        self, request_hash: str, timeout: float, current_version: str | None = None
+    ) -> SerializedDiscoveryResponse | None:
+        future = self.response_waiters.add(request_hash, current_version)
+        try:
+            if self._has_other_version(request_hash, current_version):
+                return self.get_serialized_response(request_hash)
+            if self._watcher is None or self._watcher.done():
+                self._watcher = asyncio.create_task(self._watch_for_responses())
+            await asyncio.wait_for(future, timeout)
+        except TimeoutError:
+            pass
+        finally:
+            self.response_waiters.remove(request_hash, future)
+        return self.get_serialized_response(request_hash)
+
+    def _data_version(self) -> int:
+        if self._watch_connection is None:
+            self._watch_connection = self._get_connection()
+        return self._watch_connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _notify_rendered_responses(self) -> None:
+        request_hashes = self.response_waiters.keys()
+        conn = self._get_connection()
+        # stay well under sqlite's limit on the number of bound parameters
+        for start in range(0, len(request_hashes), 500):
+            batch = request_hashes[start : start + 500]
+            placeholders = ", ".join("?" for _ in batch)
+            sql = (
+                "SELECT request_hash, version_info FROM discovery_entries "
+                f"WHERE response IS NOT NULL AND request_hash IN ({placeholders})"
+            )
+            for row in conn.execute(sql, batch).fetchall():
+                self.response_waiters.notify(row[0], row[1])
+
+    async def _watch_for_responses(self) -> None:
+        """
+        Runs while there are waiters in this process. Checking data_version is a cheap
+        per-connection lookup, and waiting keys are only queried once it changes.
+        """
+        try:
+            last_version = self._data_version()
+            # catch anything committed before this watcher started
+            self._notify_rendered_responses()
+            while self.response_waiters:
+                await asyncio.sleep(self.change_check_interval)
+                version = self._data_version()
+                if version != last_version:
+                    last_version = version
+                    self._notify_rendered_responses()
+        except sqlite3.Error:
+            # waiters fall back to reading their key when they time out
+            self.logger.exception("Error watching for discovery responses")
+
     def min_by_property(
         self,
         data_type: DataType,
@@ -560,11 +994,20 @@ class SqliteDataStore(DataStoreProtocol):
 
     def set(self, data_type: DataType, key: str, value: Any) -> bool:
         table = self._get_table_name(data_type)
+        primary_key_column = self._get_primary_key(data_type)
         value_dict = self._object_to_values(value)
 
         columns = ", ".join(value_dict.keys())
         placeholders = ", ".join("?" for _ in value_dict)
-        sql = f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})"
+        updates = ", ".join(
+            self._upsert_sql(data_type, table, column)
+            for column in value_dict
+            if column != primary_key_column
+        )
+        sql = (
+            f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({primary_key_column}) DO UPDATE SET {updates}"
+        )
 
         conn = self._get_connection()
 
@@ -619,3 +1062,47 @@ class SqliteDataStore(DataStoreProtocol):
                 value=property_value,
             )
             return False
+
+    def set_property_many(
+        self,
+        data_type: DataType,
+        keys: list[str],
+        property_name: str,
+        property_value: Any,
+    ) -> bool:
+        table = self._get_table_name(data_type)
+        primary_key_column = self._get_primary_key(data_type)
+        property_column = self._validate_column(data_type, property_name)
+
+        if property_column is None:
+            self.logger.error(
+                "Cannot set property, invalid column name",
+                data_type=data_type,
+                column=property_name,
+            )
+            return False
+
+        conn = self._get_connection()
+
+        try:
+            cursor = conn.cursor()
+            # stay well under sqlite's limit on the number of bound parameters
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                sql = (
+                    f"UPDATE {table} SET {property_column} = ? "
+                    f"WHERE {primary_key_column} IN ({placeholders})"
+                )
+                cursor.execute(sql, (property_value, *batch))
+            conn.commit()
+            return True
+        except (sqlite3.Error, ValueError):
+            self.logger.exception(
+                "Error setting property",
+                data_type=data_type,
+                keys=len(keys),
+                property=property_name,
+                value=property_value,
+            )
+            return False
@@ -1,18 +1,54 @@
 import time
 
-from sovereign import stats
+from sovereign import config, stats
+from sovereign.utils.frozen import freeze
+from sovereign.utils.render_timing import RenderTiming
 from sovereign.v2.data.data_store import ComparisonOperator, DataStoreProtocol, DataType
-from sovereign.v2.types import Context, DiscoveryEntry, WorkerNode
+from sovereign.v2.types import (
+    Context,
+    DiscoveryEntry,
+    SerializedDiscoveryResponse,
+    WorkerNode,
+    WorkerSlowRenders,
+)
 
 
 class ContextRepository:
     def __init__(self, data_store: DataStoreProtocol):
         self.data_store: DataStoreProtocol = data_store
+        # decoded contexts held by this process, keyed by name
+        self._decoded: dict[str, Context] = {}
 
     @stats.timed("repository.context.get_ms")
     def get(self, name: str) -> Context | None:
         return self.data_store.get(DataType.Context, name)
 
+    @stats.timed("v2.repository.context.get_cached_ms")
+    def get_cached(self, name: str) -> Context | None:
+        """
+        Returns a previously decoded context if its data_hash still matches the
+        data store, otherwise reads and decodes the full context and keeps it.
+
+        The same data is handed to every render, so it is made read-only rather
+        than copied each time. Templates that change it get a TypeError.
+        """
+        cached = self._decoded.get(name)
+        if cached is not None and self.get_hash(name) == cached.data_hash:
+            stats.increment("v2.repository.context.cache", tags=["result:hit"])
+            return cached
+
+        stats.increment("v2.repository.context.cache", tags=["result:miss"])
+        context = self.get(name)
+        if context is None:
+            self._decoded.pop(name, None)
+            return None
+        return self._keep(context)
+
+    def _keep(self, context: Context) -> Context:
+        kept = context.model_copy(update={"data": freeze(context.data)})
+        self._decoded[context.name] = kept
+        return kept
+
     @stats.timed("v2.repository.context.get_hash_ms")
     def get_hash(self, name: str) -> int | None:
         return self.data_store.get_property(DataType.Context, name, "data_hash")
@@ -22,7 +58,12 @@ class ContextRepository:
 
     @stats.timed("v2.repository.context.save_ms")
     def save(self, context: Context) -> bool:
-        return self.data_store.set(DataType.Context, context.name, context)
+        saved = self.data_store.set(DataType.Context, context.name, context)
+        if saved:
+            self._keep(context)
+        else:
+            self._decoded.pop(context.name, None)
+        return saved
 
     @stats.timed("v2.repository.context.update_refresh_after_ms")
     def update_refresh_after(self, name: str, refresh_after: int) -> bool:
@@ -34,11 +75,60 @@ class ContextRepository:
 class DiscoveryEntryRepository:
     def __init__(self, data_store: DataStoreProtocol):
         self.data_store = data_store
+        # request hashes served since access times were last written,
+        # so that busy clients cost one write per flush interval
+        self._accessed: set[str] = set()
+        self._accessed_flushed_at = time.monotonic()
+        self.access_flush_interval = config.worker_v2_access_flush_interval_secs
 
     @stats.timed("v2.repository.discovery_entry.get_ms")
     def get(self, request_hash: str) -> DiscoveryEntry | None:
         return self.data_store.get(DataType.DiscoveryEntry, request_hash)
 
+    @stats.timed("v2.repository.discovery_entry.exists_ms")
+    def exists(self, request_hash: str) -> bool:
+        return (
+            self.data_store.get_property(
+                DataType.DiscoveryEntry, request_hash, "request_hash"
+            )
+            is not None
+        )
+
+    @stats.timed("v2.repository.discovery_entry.get_response_ms")
+    def get_response(self, request_hash: str) -> SerializedDiscoveryResponse | None:
+        return self.data_store.get_serialized_response(request_hash)
+
+    async def wait_for_response(
+        self, request_hash: str, timeout: float, current_version: str | None = None
+    ) -> SerializedDiscoveryResponse | None:
+        return await self.data_store.wait_for_serialized_response(
+            request_hash, timeout, current_version
+        )
+
+    @stats.timed("v2.repository.discovery_entry.get_last_rendered_at_ms")
+    def get_last_rendered_at(self, request_hash: str) -> int | None:
+        return self.data_store.get_property(
+            DataType.DiscoveryEntry, request_hash, "last_rendered_at"
+        )
+
+    @stats.timed("v2.repository.discovery_entry.get_version_ms")
+    def get_version(self, request_hash: str) -> str | None:
+        return self.data_store.get_property(
+            DataType.DiscoveryEntry, request_hash, "version_info"
+        )
+
+    @stats.timed("v2.repository.discovery_entry.set_last_rendered_at_ms")
+    def set_last_rendered_at(self, request_hash: str, rendered_at: int) -> bool:
+        return self.data_store.set_property(
+            DataType.DiscoveryEntry, request_hash, "last_rendered_at", rendered_at
+        )
+
+    @stats.timed("v2.repository.discovery_entry.get_resource_count_ms")
+    def get_resource_count(self, request_hash: str) -> int | None:
+        return self.data_store.get_property(
+            DataType.DiscoveryEntry, request_hash, "resource_count"
+        )
+
     @stats.timed("v2.repository.discovery_entry.find_by_template_ms")
     def find_all_request_hashes_by_template(self, template: str) -> list[str]:
         return self.data_store.find_all_matching_property(
@@ -53,6 +143,41 @@ class DiscoveryEntryRepository:
     def save(self, entry: DiscoveryEntry) -> bool:
         return self.data_store.set(DataType.DiscoveryEntry, entry.request_hash, entry)
 
+    def record_access(self, request_hash: str) -> None:
+        self._accessed.add(request_hash)
+        if time.monotonic() - self._accessed_flushed_at >= self.access_flush_interval:
+            self.flush_access_times()
+
+    @stats.timed("v2.repository.discovery_entry.flush_access_times_ms")
+    def flush_access_times(self) -> bool:
+        request_hashes, self._accessed = self._accessed, set()
+        self._accessed_flushed_at = time.monotonic()
+        if not request_hashes:
+            return True
+        stats.increment(
+            "v2.repository.discovery_entry.accesses_flushed",
+            value=len(request_hashes),
+        )
+        return self.data_store.set_property_many(
+            DataType.DiscoveryEntry,
+            list(request_hashes),
+            "last_accessed_at",
+            int(time.time()),
+        )
+
+    @stats.timed("v2.repository.discovery_entry.delete_expired_ms")
+    def delete_expired(self, ttl: int) -> bool:
+        """
+        Remove any entries that have not been requested in the last ttl seconds.
+        """
+        now = int(time.time())
+        return self.data_store.delete_matching(
+            DataType.DiscoveryEntry,
+            "last_accessed_at",
+            ComparisonOperator.LessThanOrEqualTo,
+            now - ttl,
+        )
+
 
 class WorkerNodeRepository:
     def __init__(self, data_store: DataStoreProtocol):
@@ -88,3 +213,49 @@ class WorkerNodeRepository:
             ComparisonOperator.LessThanOrEqualTo,
             now - 600,
         )
+
+
+class SlowRenderRepository:
+    """
+    The slowest recent renders of each worker node, so that the web server
+    can serve them from /admin/slow_renders
+    """
+
+    def __init__(self, data_store: DataStoreProtocol):
+        self.data_store = data_store
+
+    @stats.timed("v2.repository.slow_renders.save_ms")
+    def save(self, node_id: str, renders: list[RenderTiming]) -> bool:
+        now = int(time.time())
+        saved = self.data_store.set(
+            DataType.WorkerSlowRenders,
+            node_id,
+            WorkerSlowRenders(node_id=node_id, renders=renders, updated_at=now),
+        )
+        # every render of a node that stopped updating has expired by now
+        self.data_store.delete_matching(
+            DataType.WorkerSlowRenders,
+            "updated_at",
+            ComparisonOperator.LessThanOrEqualTo,
+            now - config.slow_renders.max_age_secs,
+        )
+        return saved
+
+    @stats.timed("v2.repository.slow_renders.slowest_ms")
+    def slowest(self) -> list[RenderTiming]:
+        """The slowest renders across all worker nodes, slowest first"""
+        cutoff = time.time() - config.slow_renders.max_age_secs
+        nodes: list[WorkerSlowRenders] = self.data_store.find_all_matching(
+            DataType.WorkerSlowRenders,
+            "updated_at",
+            ComparisonOperator.GreaterThanOrEqualTo,
+            int(cutoff),
+        )
+        renders = [
+            timing
+            for node in nodes
+            for timing in node.renders
+            if timing.rendered_at >= cutoff
+        ]
+        renders.sort(key=lambda timing: timing.total_ms, reverse=True)
+        return renders[: config.slow_renders.size]
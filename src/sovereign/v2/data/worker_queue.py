@@ -34,6 +34,13 @@ class QueueProtocol(Protocol):
     def ack(self, receipt_handle: str) -> bool: ...
 
 
+@runtime_checkable
+class SizedQueueProtocol(Protocol):
+    """Implemented by queues that can tell how many jobs they hold."""
+
+    def size(self) -> int: ...
+
+
 class InMemoryQueue(QueueProtocol):
     """
     Messages become invisible when retrieved and must be acknowledged within the
@@ -128,6 +135,9 @@ class InMemoryQueue(QueueProtocol):
     def is_empty(self) -> bool:
         return not self._messages
 
+    def size(self) -> int:
+        return len(self._messages)
+
 
 class SqliteQueue(QueueProtocol):
     """
@@ -271,3 +281,11 @@ class SqliteQueue(QueueProtocol):
                 receipt_handle=receipt_handle,
             )
             return False
+
+    def size(self) -> int:
+        try:
+            with self._get_connection() as conn:
+                return conn.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+        except Exception:
+            self.logger.exception("Failed to count jobs in SQLite queue")
+            return 0
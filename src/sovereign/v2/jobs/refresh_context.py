@@ -12,6 +12,7 @@ from structlog.typing import FilteringBoundLogger
 from sovereign.configuration import SovereignConfigv2
 from sovereign.context import CronInterval, SecondsInterval, TaskInterval, stats
 from sovereign.dynamic_config import Loadable
+from sovereign.utils.resolver import dns_cache
 from sovereign.utils.timer import wait_until
 from sovereign.v2.data.repositories import ContextRepository, DiscoveryEntryRepository
 from sovereign.v2.data.worker_queue import QueueProtocol
@@ -60,6 +61,14 @@ def refresh_context(
                     refresh_after=get_refresh_after(config, loadable),
                 )
                 context_repository.save(context)
+                # resolved before the renders below, which then read the cache
+                dns_cache.prefetch_context(value)
+
+                # only re-render for clients that are still active, entries past
+                # their ttl would be removed by the next compaction anyway
+                discovery_job_repository.delete_expired(
+                    config.worker_v2_discovery_entry_ttl_secs
+                )
 
                 request_hashes: set[str] = set()
 
@@ -6,16 +6,18 @@ import time
 from structlog.typing import FilteringBoundLogger
 
 from sovereign import config, disabled_ciphersuite, server_cipher_container, stats
-from sovereign.rendering_common import (
-    add_type_urls,
-    deserialize_config,
-    filter_resources,
-)
-from sovereign.types import DiscoveryResponse, ProcessedTemplate
+from sovereign.rendering_common import stream_resources
+from sovereign.types import DiscoveryResponse
 from sovereign.utils import templates
-from sovereign.v2.data.repositories import ContextRepository, DiscoveryEntryRepository
+from sovereign.utils.indexes import context_indexes
+from sovereign.utils.render_timing import StageTimer, slow_renders
+from sovereign.v2.data.repositories import (
+    ContextRepository,
+    DiscoveryEntryRepository,
+    SlowRenderRepository,
+)
 from sovereign.v2.logging import get_named_logger
-from sovereign.v2.types import Context, DiscoveryEntry
+from sovereign.v2.types import Context, DiscoveryEntry, entry_template
 
 
 # noinspection DuplicatedCode
@@ -24,6 +26,7 @@ def render_discovery_response(
     context_repository: ContextRepository,
     discovery_entry_repository: DiscoveryEntryRepository,
     node_id: str,
+    slow_render_repository: SlowRenderRepository | None = None,
 ):
     logger: FilteringBoundLogger = get_named_logger(
         f"{__name__}.{render_discovery_response.__qualname__} ({__file__})",
@@ -53,10 +56,16 @@ def render_discovery_response(
             logger = logger.bind(
                 template=discovery_entry.request.template.resource_type
             )
+            timer = StageTimer(
+                "v2.worker.job.render_discovery_response.stage_ms",
+                client_id=request_hash,
+                template=request.template.resource_type,
+                tags=[f"template:{request.template.resource_type}"],
+            )
 
             dependencies = request.template.depends_on
             contexts: dict[str, Context | None] = {
-                name: context_repository.get(name) for name in dependencies
+                name: context_repository.get_cached(name) for name in dependencies
             }
 
             missing_contexts = [
@@ -88,6 +97,11 @@ def render_discovery_response(
                 ):
                     # the template was last rendered after all the contexts were refreshed, so we can skip rendering
                     logger.info("Skipping rendering for duplicate job")
+                    # the response is still current, which also stops internal
+                    # requests from queueing another refresh for it
+                    discovery_entry_repository.set_last_rendered_at(
+                        request_hash, int(time.time())
+                    )
                     return True
 
             raw_contexts = {
@@ -95,6 +109,14 @@ def render_discovery_response(
                 for (name, context) in contexts.items()
                 if context is not None
             }
+            if context_indexes.declared:
+                raw_contexts["indexes"] = context_indexes.for_contexts(
+                    {
+                        name: (context.data, context.data_hash)
+                        for (name, context) in contexts.items()
+                        if context is not None
+                    }
+                )
 
             logger.debug(
                 "Contexts loaded for rendering discovery response",
@@ -110,36 +132,53 @@ def render_discovery_response(
                 raw_contexts["crypto"] = server_cipher_container
 
             raw_contexts["config"] = config
-
-            result = request.template.generate(
-                discovery_request=request,
-                host_header=request.desired_controlplane,
-                resource_names=request.resources,
-                utils=templates,
-                **raw_contexts,
+            timer.add("context", time.perf_counter() - timer.started)
+
+            with timer.stage("template"):
+                content = request.template.stream(
+                    discovery_request=request,
+                    host_header=request.desired_controlplane,
+                    resource_names=request.resources,
+                    utils=templates,
+                    **raw_contexts,
+                )
+            stream = stream_resources(
+                content,
+                request.api_version,
+                request.resource_type,
+                request.resources,
+                keep=True,
+                timer=timer,
             )
-
-            if not request.template.is_python_source:
-                assert isinstance(result, str)
-                result = deserialize_config(result)
-
-            assert isinstance(result, dict)
-            resources = filter_resources(result["resources"], request.resources)
-            add_type_urls(request.api_version, request.resource_type, resources)
-            processed_template = ProcessedTemplate(resources=resources)
             response = DiscoveryResponse(
-                resources=resources, version_info=processed_template.version_info
+                resources=stream.resources, version_info=stream.version_info
             )
 
-            if not discovery_entry_repository.save(
-                DiscoveryEntry(
-                    request_hash=request_hash,
-                    template=request.template.resource_type,
-                    request=request,
-                    response=response,
-                    last_rendered_at=int(time.time()),
+            with timer.stage("cache_write"):
+                saved = discovery_entry_repository.save(
+                    DiscoveryEntry(
+                        request_hash=request_hash,
+                        template=entry_template(request),
+                        request=request,
+                        response=response,
+                        last_rendered_at=int(time.time()),
+                    )
                 )
-            ):
+            if not saved:
                 logger.error("Failed to save discovery entry")
+
+            timing = timer.finish(resources=stream.count)
+            # only the slowest renders are serialized again, to measure them
+            if slow_renders.is_slow(timing.total_ms):
+                timing.size = len(stream.text)
+                if slow_renders.add(timing) and slow_render_repository is not None:
+                    slow_render_repository.save(node_id, slow_renders.slowest())
+                logger.info(
+                    "Slow render",
+                    total_ms=timing.total_ms,
+                    stages_ms=timing.stages_ms,
+                    resources=timing.resources,
+                    size=timing.size,
+                )
     finally:
         logger.debug("Finished rendering of discovery response")
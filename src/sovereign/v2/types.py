@@ -4,6 +4,18 @@ import pydantic
 from pydantic import TypeAdapter
 
 from sovereign.types import DiscoveryRequest, DiscoveryResponse
+from sovereign.utils.render_timing import RenderTiming
+
+# entries for internal requests, made by the UI and API, are stored under
+# their own template name, so that refreshing a context doesn't render them
+INTERNAL_TEMPLATE_PREFIX = "__internal__:"
+
+
+def entry_template(request: DiscoveryRequest) -> str:
+    """The template name that a discovery entry for this request is stored under"""
+    if request.is_internal_request:
+        return f"{INTERNAL_TEMPLATE_PREFIX}{request.template.resource_type}"
+    return request.template.resource_type
 
 
 class Context(pydantic.BaseModel):
@@ -20,6 +32,34 @@ class DiscoveryEntry(pydantic.BaseModel):
     request: DiscoveryRequest
     response: DiscoveryResponse | None
     last_rendered_at: int | None = None
+    last_accessed_at: int | None = None
+
+    @property
+    def version_info(self) -> str | None:
+        if self.response is None:
+            return None
+        return self.response.version_info
+
+    @property
+    def resource_count(self) -> int | None:
+        if self.response is None:
+            return None
+        return len(self.response.resources)
+
+
+class SerializedDiscoveryResponse(pydantic.BaseModel):
+    """
+    A rendered discovery response as it is stored, already serialized to JSON,
+    so that it can be served without being parsed into a DiscoveryResponse.
+    """
+
+    version_info: str
+    resource_count: int
+    body: bytes
+
+    @property
+    def text(self) -> str:
+        return self.body.decode()
 
 
 class RefreshContextJob(pydantic.BaseModel):
@@ -39,3 +79,11 @@ queue_job_type_adapter = TypeAdapter(QueueJob)
 class WorkerNode(pydantic.BaseModel):
     node_id: str
     last_heartbeat: int
+
+
+class WorkerSlowRenders(pydantic.BaseModel):
+    """The slowest recent renders of a worker node, for /admin/slow_renders"""
+
+    node_id: str
+    renders: list[RenderTiming]
+    updated_at: int
@@ -1,27 +1,97 @@
-import asyncio
 import logging
 import os
 import threading
+import time
+from functools import cache
 
 from structlog.typing import FilteringBoundLogger
 
 from sovereign import config, stats
-from sovereign.types import DiscoveryRequest, DiscoveryResponse
-from sovereign.v2.data.repositories import DiscoveryEntryRepository
+from sovereign.types import DiscoveryRequest
+from sovereign.utils.admission import admission
+from sovereign.utils.render_timing import RenderTiming
+from sovereign.v2.data.repositories import (
+    DiscoveryEntryRepository,
+    SlowRenderRepository,
+)
 from sovereign.v2.data.utils import get_data_store, get_queue
+from sovereign.v2.data.worker_queue import QueueProtocol, SizedQueueProtocol
 from sovereign.v2.logging import get_named_logger
-from sovereign.v2.types import DiscoveryEntry, RenderDiscoveryJob
+from sovereign.v2.types import (
+    DiscoveryEntry,
+    RenderDiscoveryJob,
+    SerializedDiscoveryResponse,
+    entry_template,
+)
+
+
+# the data store and queue are shared by all requests in this process,
+# so that waiters for responses can be woken by a single watcher
+@cache
+def _discovery_entry_repository() -> DiscoveryEntryRepository:
+    return DiscoveryEntryRepository(get_data_store())
+
+
+@cache
+def _queue() -> QueueProtocol:
+    return get_queue()
+
+
+@cache
+def _slow_render_repository() -> SlowRenderRepository:
+    return SlowRenderRepository(_discovery_entry_repository().data_store)
+
+
+def get_slow_renders() -> list[RenderTiming]:
+    """The slowest recent renders of every worker node, slowest first"""
+    return _slow_render_repository().slowest()
+
+
+def get_response_version(request_hash: str) -> str | None:
+    """
+    Returns the version of the stored response for a request hash, if there is one.
+    Enough to tell an up-to-date client that nothing changed, without reading the response.
+    Responses without resources are left out, since those are answered with a 404.
+    """
+    discovery_entry_repository = _discovery_entry_repository()
+    version = discovery_entry_repository.get_version(request_hash)
+    if version is None:
+        return None
+    discovery_entry_repository.record_access(request_hash)
+    if not discovery_entry_repository.get_resource_count(request_hash):
+        return None
+    return version
+
+
+async def wait_for_response_change(
+    request_hash: str, current_version: str, timeout: float
+) -> SerializedDiscoveryResponse | None:
+    """
+    Holds a long-poll request from an up-to-date client until the worker writes
+    a response with a different version, or the timeout expires.
+    Returns the new response, or None if the version didn't change.
+    """
+    discovery_entry_repository = _discovery_entry_repository()
+    response = await discovery_entry_repository.wait_for_response(
+        request_hash, timeout, current_version
+    )
+    discovery_entry_repository.record_access(request_hash)
+    if response is None or response.version_info == current_version:
+        return None
+    return response
 
 
 async def wait_for_discovery_response(
     request: DiscoveryRequest,
-) -> DiscoveryResponse | None:
+    request_hash: str | None = None,
+) -> SerializedDiscoveryResponse | None:
     # 1 - check if the entry already exists in the database with a non-empty response
     # 2 - if it does, return it
     # 3 - if it doesn't, enqueue a new job to render it
-    # 4 - poll for up to CACHE_READ_TIMEOUT seconds, if we find a response, return it
+    # 4 - wait for up to CACHE_READ_TIMEOUT seconds to be notified of a response, and return it
 
-    request_hash = request.cache_key(config.cache.hash_rules)
+    if request_hash is None:
+        request_hash = request.cache_key(config.cache.hash_rules)
 
     logger: FilteringBoundLogger = get_named_logger(
         f"{__name__}.{wait_for_discovery_response.__qualname__} ({__file__})",
@@ -35,33 +105,16 @@ async def wait_for_discovery_response(
 
     logger.debug("Starting lookup for discovery response")
 
-    data_store = get_data_store()
-    discovery_entry_repository = DiscoveryEntryRepository(data_store)
-
-    queue = get_queue()
+    discovery_entry_repository = _discovery_entry_repository()
+    queue = _queue()
 
-    discovery_entry = discovery_entry_repository.get(request_hash)
+    response = discovery_entry_repository.get_response(request_hash)
 
-    if not discovery_entry:
-        logger.debug(
-            "No existing discovery entry found, creating new entry and enqueuing job"
-        )
-
-        # we need to save this request to the database
-        discovery_entry = DiscoveryEntry(
-            request_hash=request_hash,
-            template=request.template.resource_type,
-            request=request,
-            response=None,
-        )
-        discovery_entry_repository.save(discovery_entry)
-
-    if not discovery_entry.response:
-        # enqueue a job to render this discovery request (duplicates handled in the worker)
-        job = RenderDiscoveryJob(request_hash=request_hash)
-        queue.put(job)
-    else:
+    if response is not None:
         logger.debug("Returning cached response immediately")
+        discovery_entry_repository.record_access(request_hash)
+        if request.is_internal_request:
+            _refresh_internal(request_hash, discovery_entry_repository, queue)
         stats.increment(
             "v2.worker.discovery_response",
             tags=[
@@ -70,34 +123,95 @@ async def wait_for_discovery_response(
                 "source:from_db",
             ],
         )
-        return discovery_entry.response
+        return response
+
+    with admission.waiter(queue_depth):
+        return await _render_and_wait(
+            request, request_hash, discovery_entry_repository, queue, logger
+        )
+
+
+# internal requests with a refresh on the queue, and when it was queued
+_refreshes_queued: dict[str, float] = {}
+
+
+def _refresh_internal(
+    request_hash: str,
+    discovery_entry_repository: DiscoveryEntryRepository,
+    queue: QueueProtocol,
+) -> None:
+    """
+    Internal requests aren't rendered when contexts are refreshed, so one
+    that was rendered a while ago is rendered again in the background.
+    The job is skipped by the worker if no context changed since, which
+    still counts as a render. Each process queues a refresh at most once
+    per ttl, however often the request is viewed meanwhile.
+
+    Unlike worker v1, these jobs share the queue with requests from Envoy.
+    """
+    ttl = config.internal_requests.ttl_secs
+    now = time.time()
+    rendered_at = discovery_entry_repository.get_last_rendered_at(request_hash)
+    if not rendered_at or now - rendered_at <= ttl:
+        return
+    if now - _refreshes_queued.get(request_hash, 0.0) <= ttl:
+        return
+    for queued, queued_at in list(_refreshes_queued.items()):
+        if now - queued_at > ttl:
+            del _refreshes_queued[queued]
+    _refreshes_queued[request_hash] = now
+    queue.put(RenderDiscoveryJob(request_hash=request_hash))
+
+
+def queue_depth() -> int | None:
+    """How many render jobs are waiting in the worker's queue, if the queue can tell"""
+    queue = _queue()
+    if isinstance(queue, SizedQueueProtocol):
+        return queue.size()
+    return None
+
+
+async def _render_and_wait(
+    request: DiscoveryRequest,
+    request_hash: str,
+    discovery_entry_repository: DiscoveryEntryRepository,
+    queue: QueueProtocol,
+    logger: FilteringBoundLogger,
+) -> SerializedDiscoveryResponse | None:
+    if not discovery_entry_repository.exists(request_hash):
+        logger.debug(
+            "No existing discovery entry found, creating new entry and enqueuing job"
+        )
+
+        # we need to save this request to the database
+        discovery_entry_repository.save(
+            DiscoveryEntry(
+                request_hash=request_hash,
+                template=entry_template(request),
+                request=request,
+                response=None,
+                last_accessed_at=int(time.time()),
+            )
+        )
+
+    # enqueue a job to render this discovery request (duplicates handled in the worker)
+    job = RenderDiscoveryJob(request_hash=request_hash)
+    queue.put(job)
 
     # wait for up to CACHE_READ_TIMEOUT seconds for the response to be populated
-    logger.debug(
-        "Polling for response",
-        timeout=config.cache.read_timeout,
-        poll_interval=config.cache.poll_interval_secs,
-    )
+    logger.debug("Waiting for response", timeout=config.cache.read_timeout)
 
-    start_time = asyncio.get_event_loop().time()
-    attempts = 0
+    start_time = time.monotonic()
 
-    while (
-        asyncio.get_event_loop().time() - start_time
-    ) < config.cache.read_timeout and discovery_entry.response is None:
-        attempts += 1
-        discovery_entry = discovery_entry_repository.get(request_hash)
-        if discovery_entry is None:
-            logger.error("No discovery entry found while polling for response")
-            return None
-        await asyncio.sleep(config.cache.poll_interval_secs)
+    response = await discovery_entry_repository.wait_for_response(
+        request_hash, config.cache.read_timeout
+    )
 
-    elapsed_time = asyncio.get_event_loop().time() - start_time
+    elapsed_time = time.monotonic() - start_time
 
-    if discovery_entry.response:
+    if response is not None:
         logger.debug(
-            "Response received after polling",
-            attempts=attempts,
+            "Response received after waiting",
             elapsed_time=elapsed_time,
         )
 
@@ -110,13 +224,11 @@ async def wait_for_discovery_response(
             ],
         )
     else:
-        logger.error(
-            "Timeout waiting for response", attempts=attempts, elapsed_time=elapsed_time
-        )
+        logger.error("Timeout waiting for response", elapsed_time=elapsed_time)
 
         stats.increment(
             "v2.worker.discovery_response",
             tags=[f"template:{request.template.resource_type}", "result:timed_out"],
         )
 
-    return discovery_entry.response
+    return response
@@ -13,6 +13,7 @@ from sovereign.v2.data.data_store import DataStoreProtocol
 from sovereign.v2.data.repositories import (
     ContextRepository,
     DiscoveryEntryRepository,
+    SlowRenderRepository,
     WorkerNodeRepository,
 )
 from sovereign.v2.data.utils import get_data_store, get_queue
@@ -31,6 +32,7 @@ class Worker:
     context_repository: ContextRepository
     discovery_entry_repository: DiscoveryEntryRepository
     worker_node_repository: WorkerNodeRepository
+    slow_render_repository: SlowRenderRepository
 
     queue: QueueProtocol
 
@@ -56,6 +58,7 @@ class Worker:
         self.context_repository = ContextRepository(data_store)
         self.discovery_entry_repository = DiscoveryEntryRepository(data_store)
         self.worker_node_repository = WorkerNodeRepository(data_store)
+        self.slow_render_repository = SlowRenderRepository(data_store)
 
         self.queue = queue if queue is not None else get_queue()
 
@@ -119,6 +122,7 @@ class Worker:
                     self.context_repository,
                     self.discovery_entry_repository,
                     self.node_id,
+                    self.slow_render_repository,
                 )
 
     def context_refresh_loop(self):
@@ -130,6 +134,7 @@ class Worker:
         )
 
         is_leader = False
+        next_compaction = 0.0
 
         while True:
             try:
@@ -211,8 +216,32 @@ class Worker:
                             - time_now,
                         )
 
+                if time.time() >= next_compaction:
+                    self.compact_discovery_entries()
+                    next_compaction = (
+                        time.time()
+                        + config.worker_v2_discovery_entry_compaction_interval_secs
+                    )
+
                 time.sleep(1)
             except Exception:
                 stats.increment("v2.worker.context_refresh.error")
                 self.logger.exception("Error while refreshing context")
                 time.sleep(5)
+
+    def compact_discovery_entries(self):
+        """
+        Expire discovery entries that no client has requested within the ttl,
+        e.g. from proxies that have gone away or one-off requests from the UI.
+        """
+        self.logger.info(
+            "Removing expired discovery entries",
+            node_id=self.node_id,
+            ttl=config.worker_v2_discovery_entry_ttl_secs,
+        )
+        if self.discovery_entry_repository.delete_expired(
+            config.worker_v2_discovery_entry_ttl_secs
+        ):
+            stats.increment("v2.worker.discovery_entry_compaction.success")
+        else:
+            stats.increment("v2.worker.discovery_entry_compaction.error")
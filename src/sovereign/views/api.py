@@ -64,8 +64,8 @@ async def resource(
         discovery_response = await wait_for_discovery_response(req)
         if discovery_response is not None:
             entry = Entry(
-                text=discovery_response.model_dump_json(indent=None),
-                len=len(discovery_response.resources),
+                text=discovery_response.text,
+                len=discovery_response.resource_count,
                 version=discovery_response.version_info,
                 node=req.node,
             )
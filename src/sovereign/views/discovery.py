@@ -1,20 +1,29 @@
-from fastapi import Body, Header
+from fastapi import Header, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import Response
 from fastapi.routing import APIRouter
+from pydantic import ValidationError
 
-from sovereign import cache, config, logs
+from sovereign import cache, config, logs, stats
 from sovereign.cache.types import Entry
 from sovereign.types import (
     DiscoveryRequest,
     DiscoveryResponse,
+    RequestSummary,
+    summarize_request,
+)
+from sovereign.utils.auth import authenticate, authenticate_node
+from sovereign.v2.types import SerializedDiscoveryResponse
+from sovereign.v2.web import (
+    get_response_version,
+    wait_for_discovery_response,
+    wait_for_response_change,
 )
-from sovereign.utils.auth import authenticate
-from sovereign.v2.web import wait_for_discovery_response
 from sovereign.views import reader
 
 
 def response_headers(
-    discovery_request: DiscoveryRequest, response: Entry, xds: str
+    discovery_request: DiscoveryRequest | RequestSummary, version: str, xds: str
 ) -> dict[str, str]:
     return {
         "X-Sovereign-Client-Build": discovery_request.envoy_version,
@@ -22,10 +31,105 @@ def response_headers(
         "X-Sovereign-Requested-Resources": ",".join(discovery_request.resource_names)
         or "all",
         "X-Sovereign-Requested-Type": xds,
-        "X-Sovereign-Response-Version": response.version,
+        "X-Sovereign-Response-Version": version,
     }
 
 
+async def read_entry(
+    xds_req: DiscoveryRequest, request_hash: str | None = None
+) -> Entry | None:
+    """
+    Reads the rendered resources for a discovery request, from whichever
+    worker is configured. Shared by the REST endpoint and the gRPC ADS server.
+    """
+    if config.worker_v2_enabled:
+        response = await wait_for_discovery_response(xds_req, request_hash)
+        if response is None:
+            return None
+        return _entry(xds_req, response)
+    return await reader.blocking_read(xds_req)  # ty: ignore[possibly-missing-attribute]
+
+
+async def wait_for_change(
+    xds_req: DiscoveryRequest, version: str, request_hash: str | None = None
+) -> Entry | None:
+    """
+    Long-poll: holds a request from an up-to-date client until its resources
+    change, or the configured hold timeout expires, in which case None is returned.
+    """
+    entry = await changed_entry(
+        xds_req, version, config.long_poll.hold_timeout_secs, request_hash
+    )
+    result = "changed" if entry else "unchanged"
+    stats.increment("discovery.long_poll", tags=[f"result:{result}"])
+    return entry
+
+
+async def changed_entry(
+    xds_req: DiscoveryRequest,
+    version: str,
+    timeout: float,
+    request_hash: str | None = None,
+) -> Entry | None:
+    """
+    Waits for the rendered resources of a discovery request to have a version
+    other than the given one, for up to timeout seconds. Shared by long-polls
+    and the gRPC ADS server.
+    """
+    if config.worker_v2_enabled:
+        if request_hash is None:
+            request_hash = xds_req.cache_key(config.cache.hash_rules)
+        response = await wait_for_response_change(request_hash, version, timeout)
+        return None if response is None else _entry(xds_req, response)
+    return await reader.wait_for_change(xds_req, version, timeout)  # ty: ignore[possibly-missing-attribute]
+
+
+def _entry(xds_req: DiscoveryRequest, response: SerializedDiscoveryResponse) -> Entry:
+    return Entry(
+        text=response.text,
+        len=response.resource_count,
+        version=response.version_info,
+        node=xds_req.node,
+    )
+
+
+def up_to_date_response(summary: RequestSummary, xds_type: str) -> Response | None:
+    """
+    Answers a client that already has the current version with a 304, using only
+    the fields read from its request body. Returns None if the request needs the
+    full DiscoveryRequest to be handled.
+    """
+    if config.long_poll.enabled:
+        # up-to-date requests are held, which needs the full request
+        return None
+    if config.worker_v2_enabled:
+        version = get_response_version(summary.request_hash)
+    elif entry := reader.local.get(summary.request_hash):  # ty: ignore[possibly-missing-attribute]
+        version = entry.version if entry.len else None
+    else:
+        version = None
+    if version is None or version != summary.version_info:
+        return None
+
+    authenticate_node(summary.node_id, summary.node_metadata)
+    logs.access_logger.queue_log_fields(
+        XDS_RESOURCES=summary.resource_names,
+        XDS_ENVOY_VERSION=summary.envoy_version,
+        XDS_CLIENT_VERSION=summary.version_info,
+        XDS_SERVER_VERSION=version,
+    )
+    headers = response_headers(summary, version, xds_type)
+    return Response(status_code=304, headers=headers)
+
+
+def parse_discovery_request(body: bytes) -> DiscoveryRequest:
+    try:
+        return DiscoveryRequest.model_validate_json(body)
+    except ValidationError as e:
+        errors = [{**error, "loc": ("body", *error["loc"])} for error in e.errors()]
+        raise RequestValidationError(errors, body=body)
+
+
 router = APIRouter()
 
 
@@ -38,13 +142,35 @@ router = APIRouter()
         304: {"description": "Resources are up-to-date"},
         404: {"description": "No resources found"},
     },
+    # the body is parsed in the endpoint, so that up-to-date clients can be
+    # answered before the request is validated
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {"schema": DiscoveryRequest.model_json_schema()}
+            },
+            "required": True,
+        }
+    },
 )
 async def discovery_response(
     version: str,
     xds_type: str,
-    xds_req: DiscoveryRequest = Body(...),
+    request: Request,
     host: str = Header("no_host_provided"),
 ) -> Response:
+    body = await request.body()
+    summary = summarize_request(
+        body,
+        config.cache.hash_rules,
+        desired_controlplane=host,
+        resource_type=xds_type,
+        api_version=version,
+    )
+    if summary and (response := up_to_date_response(summary, xds_type)):
+        return response
+
+    xds_req = parse_discovery_request(body)
     authenticate(xds_req)
 
     # Pack additional info into the request
@@ -65,7 +191,7 @@ async def discovery_response(
         logs.access_logger.queue_log_fields(
             XDS_SERVER_VERSION=entry.version,
         )
-        headers = response_headers(xds_req, entry, xds_type)
+        headers = response_headers(xds_req, entry.version, xds_type)
         if entry.len == 0:
             return Response(status_code=404, headers=headers)
         if entry.version == xds_req.version_info:
@@ -74,19 +200,28 @@ async def discovery_response(
 
     if config.worker_v2_enabled:
         # we're set up to use v2 of the worker
-        response = await wait_for_discovery_response(xds_req)
-        if response is not None:
-            entry = Entry(
-                text=response.model_dump_json(indent=None),
-                len=len(response.resources),
-                version=response.version_info,
-                node=xds_req.node,
+        if summary is None:
+            request_hash = xds_req.cache_key(config.cache.hash_rules)
+        else:
+            request_hash = summary.request_hash
+
+        # up-to-date clients only need the stored version, not the response
+        if (version := get_response_version(request_hash)) == xds_req.version_info:
+            if config.long_poll.enabled and version is not None:
+                if entry := await wait_for_change(xds_req, version, request_hash):
+                    return handle_response(entry)
+            logs.access_logger.queue_log_fields(
+                XDS_SERVER_VERSION=version,
             )
-            return handle_response(entry)
+            headers = response_headers(xds_req, version, xds_type)
+            return Response(status_code=304, headers=headers)
 
-    else:
-        entry: Entry | None
-        if entry := await reader.blocking_read(xds_req):  # ty: ignore[possibly-missing-attribute]
+        if entry := await read_entry(xds_req, request_hash):
             return handle_response(entry)
 
+    elif entry := await read_entry(xds_req):
+        if config.long_poll.enabled and entry.version == xds_req.version_info:
+            entry = await wait_for_change(xds_req, entry.version) or entry
+        return handle_response(entry)
+
     return Response(content="Something went wrong", status_code=500)
@@ -1,4 +1,5 @@
 import asyncio
+import time
 
 import pydantic
 import requests
@@ -7,13 +8,20 @@ from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.routing import APIRouter
 from typing_extensions import Annotated, Literal
 
-from sovereign import __version__
-from sovereign.configuration import XDS_TEMPLATES, config
+from sovereign import WORKER_URL, __version__
+from sovereign.configuration import XDS_TEMPLATES, DeepCheckConfig, config
 from sovereign.response_class import json_response_class
 from sovereign.utils.mock import mock_discovery_request
 from sovereign.v2.web import wait_for_discovery_response
 from sovereign.views import reader
 
+try:
+    import httpx
+
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
 router = APIRouter()
 
 State = Literal["FAIL"] | Literal["OK"]
@@ -59,6 +67,128 @@ async def health_check() -> Response:
     return PlainTextResponse("OK", status_code=200)
 
 
+async def check_template(template: str, service_cluster: str) -> CheckResult:
+    discovery_request = mock_discovery_request(
+        "v3",
+        template,
+        expressions=[f"cluster={service_cluster}"],
+    )
+    if config.worker_v2_enabled:
+        # we're set up to use v2 of the worker
+        try:
+            if await wait_for_discovery_response(discovery_request):
+                return "OK"
+        except Exception as e:
+            return ("FAIL", f"Failed {template}: {str(e)}")
+        return ("FAIL", f"Failed to render {template}")
+    try:
+        _ = await reader.blocking_read(discovery_request)  # ty: ignore[possibly-missing-attribute]
+        return "OK"
+    except Exception as e:
+        return ("FAIL", f"Failed {template}: {str(e)}")
+
+
+async def worker_is_healthy(timeout: float) -> bool:
+    url = f"{WORKER_URL}/health"
+    if HTTPX_AVAILABLE:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            return (await client.get(url)).is_success
+    response = await asyncio.to_thread(requests.get, url, timeout=timeout)
+    return response.ok
+
+
+async def check_worker(attempts: int, deadline: float) -> CheckResult:
+    result: CheckResult = ("FAIL", "Worker unavailable")
+    for attempt in range(attempts):
+        try:
+            remaining = deadline - time.monotonic()
+            if await worker_is_healthy(timeout=max(remaining, 0.1)):
+                return "OK"
+        except Exception as e:
+            result = ("FAIL", str(e))
+        await asyncio.sleep(attempt)
+    return result
+
+
+class DeepCheck:
+    """
+    Checks every default template, and the worker, at the same time and
+    within one deadline.
+
+    Results are reused for a short time, and callers that arrive while a
+    check is running wait for that check instead of starting another.
+    """
+
+    def __init__(self, config: DeepCheckConfig) -> None:
+        self.config = config
+        self.results: dict[tuple[str, int], tuple[float, DeepCheckResult]] = {}
+        self.running: dict[tuple[str, int], asyncio.Future[DeepCheckResult]] = {}
+
+    async def check(
+        self, service_cluster: str, worker_attempts: int
+    ) -> DeepCheckResult:
+        key = (service_cluster, worker_attempts)
+        cached = self.results.get(key)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+        if (running := self.running.get(key)) is None:
+            running = asyncio.ensure_future(self.run(service_cluster, worker_attempts))
+            self.running[key] = running
+            running.add_done_callback(lambda _: self.running.pop(key, None))
+        # a caller giving up doesn't cancel the check for the others
+        result = await asyncio.shield(running)
+        self.keep(key, result)
+        return result
+
+    def keep(self, key: tuple[str, int], result: DeepCheckResult) -> None:
+        # keys come from query parameters, so expired results are dropped
+        # and only the most recent are kept
+        now = time.monotonic()
+        for expired in [k for k, (until, _) in self.results.items() if until <= now]:
+            del self.results[expired]
+        self.results.pop(key, None)
+        self.results[key] = (now + self.config.cache_ttl_secs, result)
+        while len(self.results) > self.config.max_results:
+            del self.results[next(iter(self.results))]
+
+    async def run(self, service_cluster: str, worker_attempts: int) -> DeepCheckResult:
+        deadline = time.monotonic() + self.config.timeout_secs
+        result = DeepCheckResult()
+        templates = {
+            asyncio.ensure_future(check_template(template, service_cluster)): template
+            for template in XDS_TEMPLATES["default"].keys()
+        }
+        tasks: set[asyncio.Future[CheckResult]] = set(templates)
+        worker = None
+        if config.worker_v2_enabled:
+            result.worker = "OK"
+        else:
+            worker = asyncio.ensure_future(check_worker(worker_attempts, deadline))
+            tasks.add(worker)
+        done: set[asyncio.Future[CheckResult]] = set()
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=self.config.timeout_secs)
+            for task in pending:
+                task.cancel()
+        for task, template in templates.items():
+            if task in done:
+                result.templates[template] = task.result()
+            else:
+                result.templates[template] = (
+                    "FAIL",
+                    f"Timed out rendering {template}",
+                )
+        if worker is not None:
+            if worker in done:
+                result.worker = worker.result()
+            else:
+                result.worker = ("FAIL", "Timed out contacting the worker")
+        return result
+
+
+deepcheck = DeepCheck(config.deepcheck)
+
+
 @router.get(
     "/deepcheck",
     summary="Deepcheck (Can the server render all default templates?)",
@@ -78,43 +208,7 @@ async def deep_check(
         ),
     ] = "*",
 ) -> Response:
-    result = DeepCheckResult()
-    for template in list(XDS_TEMPLATES["default"].keys()):
-        discovery_request = mock_discovery_request(
-            "v3",
-            template,
-            expressions=[f"cluster={envoy_service_cluster}"],
-        )
-
-        if config.worker_v2_enabled:
-            # we're set up to use v2 of the worker
-            response = await wait_for_discovery_response(discovery_request)
-            if response:
-                result.templates[template] = "OK"
-            else:
-                result.templates[template] = (
-                    "FAIL",
-                    f"Failed to render {template}",
-                )
-
-            result.worker = "OK"
-        else:
-            try:
-                _ = await reader.blocking_read(discovery_request)  # ty: ignore[possibly-missing-attribute]
-                result.templates[template] = "OK"
-            except Exception as e:
-                result.templates[template] = ("FAIL", f"Failed {template}: {str(e)}")
-
-    if not config.worker_v2_enabled:
-        for attempt in range(worker_attempts):
-            try:
-                worker_health = requests.get("http://localhost:9080/health")
-                if worker_health.ok:
-                    result.worker = "OK"
-                    break
-            except Exception as e:
-                result.worker = ("FAIL", str(e))
-                await asyncio.sleep(attempt)
+    result = await deepcheck.check(envoy_service_cluster, worker_attempts)
 
     if "json" in request.headers.get("Accept", ""):
         return result.json_response()
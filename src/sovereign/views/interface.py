@@ -29,6 +29,47 @@ html_templates = Jinja2Templates(
 )
 
 
+def find_resource(entry: Entry, name: str) -> dict[str, Any] | None:
+    """
+    Reads one resource from an entry, using the entry's index when it
+    has one, instead of parsing every resource in it. When names are
+    repeated, the first resource with the name is returned either way.
+
+    Only worker v1 entries are indexed. Worker v2 stores the response
+    as a DiscoveryResponse, so its entries are always parsed.
+    """
+    index = getattr(entry, "index", None)
+    if index is not None:
+        if (span := index.resources.get(name)) is None:
+            return None
+        return json.loads(entry.text[span[0] : span[1]])
+    for res in json.loads(entry.text).get("resources", []):
+        if res.get("name", res.get("cluster_name")) == name:
+            return res
+    return None
+
+
+def find_virtual_host(
+    entry: Entry, route_configuration: str, name: str
+) -> dict[str, Any] | None:
+    """
+    Reads one virtual host from the first route configuration with the
+    given name, like find_resource
+    """
+    index = getattr(entry, "index", None)
+    if index is not None and route_configuration in index.virtual_hosts:
+        if (span := index.virtual_hosts[route_configuration].get(name)) is None:
+            return None
+        return json.loads(entry.text[span[0] : span[1]])
+    route_config = find_resource(entry, route_configuration)
+    if route_config is None:
+        return None
+    for vhost in route_config.get("virtual_hosts", []):
+        if vhost.get("name") == name:
+            return vhost
+    return None
+
+
 @router.get("/")
 @router.get("/resources")
 async def ui_main(request: Request) -> HTMLResponse:
@@ -110,8 +151,8 @@ async def resources(
         discovery_response = await wait_for_discovery_response(mock_request)
         if discovery_response is not None:
             entry = Entry(
-                text=discovery_response.model_dump_json(indent=None),
-                len=len(discovery_response.resources),
+                text=discovery_response.text,
+                len=discovery_response.resource_count,
                 version=discovery_response.version_info,
                 node=mock_request.node,
             )
@@ -185,8 +226,8 @@ async def resource(
         discovery_response = await wait_for_discovery_response(mock_request)
         if discovery_response is not None:
             entry = Entry(
-                text=discovery_response.model_dump_json(indent=None),
-                len=len(discovery_response.resources),
+                text=discovery_response.text,
+                len=discovery_response.resource_count,
                 version=discovery_response.version_info,
                 node=mock_request.node,
             )
@@ -194,14 +235,12 @@ async def resource(
     else:
         entry = await reader.blocking_read(mock_request)  # ty: ignore[possibly-missing-attribute]
 
-    if entry:
-        for res in json.loads(entry.text).get("resources", []):
-            if res.get("name", res.get("cluster_name")) == resource_name:
-                safe_response = jsonable_encoder(res)
-                try:
-                    return json_response_class(content=safe_response)
-                except TypeError:
-                    return JSONResponse(content=safe_response)
+    if entry and (res := find_resource(entry, resource_name)) is not None:
+        safe_response = jsonable_encoder(res)
+        try:
+            return json_response_class(content=safe_response)
+        except TypeError:
+            return JSONResponse(content=safe_response)
     return Response(
         json.dumps({"title": "No resources found", "status": 404}),
         media_type="application/json+problem",
@@ -249,8 +288,8 @@ async def virtual_hosts(
         discovery_response = await wait_for_discovery_response(mock_request)
         if discovery_response is not None:
             entry = Entry(
-                text=discovery_response.model_dump_json(indent=None),
-                len=len(discovery_response.resources),
+                text=discovery_response.text,
+                len=discovery_response.resource_count,
                 version=discovery_response.version_info,
                 node=mock_request.node,
             )
@@ -258,20 +297,12 @@ async def virtual_hosts(
     else:
         entry = await reader.blocking_read(mock_request)  # ty: ignore[possibly-missing-attribute]
 
-    if entry:
-        route_configs = [
-            resource_
-            for resource_ in json.loads(entry.text).get("resources", [])
-            if resource_["name"] == route_configuration
-        ]
-        for route_config in route_configs:
-            for vhost in route_config["virtual_hosts"]:
-                if vhost["name"] == virtual_host:
-                    safe_response = jsonable_encoder(vhost)
-                    try:
-                        return json_response_class(content=safe_response)
-                    except TypeError:
-                        return JSONResponse(content=safe_response)
+    if entry and (vhost := find_virtual_host(entry, route_configuration, virtual_host)):
+        safe_response = jsonable_encoder(vhost)
+        try:
+            return json_response_class(content=safe_response)
+        except TypeError:
+            return JSONResponse(content=safe_response)
     return Response(
         json.dumps({"title": "No resources found", "status": 404}),
         media_type="application/json+problem",
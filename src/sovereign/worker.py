@@ -1,8 +1,10 @@
 import asyncio
+import time
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 from typing import final
 
-from fastapi import Body, FastAPI
+from fastapi import Body, FastAPI, Response
 
 from sovereign import (
     application_logger as log,
@@ -18,6 +20,7 @@ from sovereign.configuration import config
 from sovereign.context import TemplateContext
 from sovereign.events import Topic, bus
 from sovereign.types import DiscoveryRequest, RegisterClientRequest
+from sovereign.utils.render_timing import RenderTiming, slow_renders
 
 
 # noinspection PyUnusedLocal
@@ -71,13 +74,42 @@ class RenderQueue:
     def full(self):
         return self._queue.full()
 
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
     async def task_done(self, cid):
         async with self._lock:
             self._set.remove(cid)
         self._queue.task_done()
 
 
+@final
+class InternalEntries:
+    """
+    Client ids of the internal requests that have been rendered, least
+    recently rendered first, so that the oldest can be removed from the
+    cache once there are too many.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._ids: OrderedDict[ClientId, None] = OrderedDict()
+
+    def add(self, cid: ClientId) -> list[ClientId]:
+        """Returns the client ids that no longer fit"""
+        self._ids[cid] = None
+        self._ids.move_to_end(cid)
+        evicted = []
+        while len(self._ids) > self.maxsize:
+            oldest, _ = self._ids.popitem(last=False)
+            evicted.append(oldest)
+        return evicted
+
+
 ONDEMAND = RenderQueue()
+# requests made by the UI and API, which aren't registered as clients
+INTERNAL = RenderQueue(maxsize=config.internal_requests.queue_size)
+INTERNAL_ENTRIES = InternalEntries(config.internal_requests.max_entries)
 
 
 poller = None
@@ -92,6 +124,20 @@ if config.sources is not None:
         source_key = None
 
 
+def render_job(
+    ctx: TemplateContext, cid: str, request: DiscoveryRequest, internal: bool = False
+) -> rendering.RenderJob:
+    start = time.perf_counter()
+    context = ctx.get_context(request)
+    return rendering.RenderJob(
+        id=cid,
+        request=request,
+        context=context,
+        internal=internal,
+        context_secs=time.perf_counter() - start,
+    )
+
+
 async def render_on_event(ctx):
     subscription = bus.subscribe(Topic.CONTEXT)
     while True:
@@ -106,15 +152,14 @@ async def render_on_event(ctx):
                 stats.increment("template.render_on_event", tags=[f"batch_size:{size}"])
 
                 for client, request in registered:
+                    if request.is_internal_request:
+                        # registered before internal requests had their own lane
+                        continue
                     if context_name in request.template.depends_on:
                         log.info(
                             f"Rendering template on-event for {request} because {context_name} was updated"
                         )
-                        job = rendering.RenderJob(
-                            id=client,
-                            request=request,
-                            context=ctx.get_context(request),
-                        )
+                        job = render_job(ctx, client, request)
                         job.submit()
 
         finally:
@@ -128,19 +173,34 @@ async def render_on_demand(ctx):
         log.debug(
             f"Received on-demand request to render templates for {cid} ({request})"
         )
-        job = rendering.RenderJob(
-            id=cid, request=request, context=ctx.get_context(request)
-        )
+        job = render_job(ctx, cid, request)
         _ = job.submit()
         await ONDEMAND.task_done(cid)
 
 
-# noinspection PyProtectedMember
+async def render_internal(ctx):
+    while True:
+        cid, request = await INTERNAL.get()
+        # requests from Envoy are rendered first, for up to max_wait_secs
+        deadline = time.monotonic() + config.internal_requests.max_wait_secs
+        while ONDEMAND.qsize() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        stats.increment("template.render_internal")
+        log.debug(f"Received internal request to render templates for {cid}")
+        job = render_job(ctx, cid, request, internal=True)
+        _ = job.submit()
+        for evicted in INTERNAL_ENTRIES.add(cid):
+            writer.local.delete(evicted)
+            stats.increment("template.internal_entry_evicted")
+        await INTERNAL.task_done(cid)
+
+
 async def monitor_render_queue():
     """Periodically report render queue size metrics"""
     while True:
         await asyncio.sleep(10)
-        stats.gauge("template.on_demand_queue_size", ONDEMAND._queue.qsize())
+        stats.gauge("template.on_demand_queue_size", ONDEMAND.qsize())
+        stats.gauge("template.internal_queue_size", INTERNAL.qsize())
 
 
 @asynccontextmanager
@@ -149,6 +209,7 @@ async def lifespan(_: FastAPI):
     log.debug("Starting rendering loops")
     asyncio.create_task(render_on_event(template_context))
     asyncio.create_task(render_on_demand(template_context))
+    asyncio.create_task(render_internal(template_context))
     asyncio.create_task(monitor_render_queue())
 
     # Template context
@@ -182,12 +243,30 @@ def health():
     return "OK"
 
 
+@worker.get("/admin/slow_renders")
+def slowest_renders() -> list[RenderTiming]:
+    return slow_renders.slowest()
+
+
 @worker.put("/client")
 async def client_add(
+    response: Response,
     registration: RegisterClientRequest = Body(...),
 ):
     log.info(f"Received registration: {registration.request}")
     xds = registration.request
+    if xds.is_internal_request:
+        # rendered once for the UI or API, never on context changes
+        try:
+            INTERNAL.put_nowait((cache.client_id(xds), xds))
+        except asyncio.QueueFull:
+            stats.increment("template.internal_queue_full")
+            response.status_code = 429
+            return "Too many internal requests", 429
+        response.status_code = 202
+        return "Queued", 202
     client_id, req = writer.register(xds)
     ONDEMAND.put_nowait((client_id, req))
+    # lets web processes turn requests away while renders are backlogged
+    response.headers["X-Sovereign-Queue-Depth"] = str(ONDEMAND.qsize())
     return "Registered", 200
@@ -6,18 +6,30 @@ def _is_wildcard(value):
     return value in [["*"], "*", ("*",)]
 
 
-# noinspection PyUnusedLocal
-def call(backends, dynamic_backends, discovery_request, **kwargs):
-    all_backends = backends + dynamic_backends
-
+def _matching(backends, node_value):
     filtered_backends = []
-    node_value = discovery_request.node.cluster
-    for backend in all_backends:
+    for backend in backends:
         backend_value = backend.get("service_clusters", [])
         node_is_wildcard = _is_wildcard(node_value)
         backend_is_wildcard = _is_wildcard(backend_value)
         if node_value in backend_value or node_is_wildcard or backend_is_wildcard:
             filtered_backends.append(backend)
+    return filtered_backends
+
+
+def _indexed(indexes, name, backends, node_value):
+    index = (indexes or {}).get(name, {}).get("service_clusters")
+    if index is None:
+        return _matching(backends, node_value)
+    return index.get(node_value)
+
+
+# noinspection PyUnusedLocal
+def call(backends, dynamic_backends, discovery_request, indexes=None, **kwargs):
+    node_value = discovery_request.node.cluster
+    filtered_backends = _indexed(indexes, "backends", backends, node_value) + _indexed(
+        indexes, "dynamic_backends", dynamic_backends, node_value
+    )
 
     for backend in filtered_backends:
         yield {
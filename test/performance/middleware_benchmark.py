@@ -0,0 +1,139 @@
+"""
+Micro-benchmark of the per-request overhead added by the access log middleware.
+
+Runs requests in-process through the ASGI transport, so the numbers only cover
+the application and its middleware, not the network or a server.
+
+    python test/performance/middleware_benchmark.py [--requests N]
+
+The BaseHTTPMiddleware pair that AccessLogMiddleware replaced is kept below,
+so that the two can be compared.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from uuid import uuid4
+
+import httpx
+from fastapi import FastAPI
+from fastapi.requests import Request
+from fastapi.responses import PlainTextResponse, Response
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette_context.middleware import RawContextMiddleware
+
+from sovereign import _request_id_ctx_var, config, get_request_id, logs, stats
+from sovereign.middlewares import AccessLogMiddleware
+
+
+class RequestContextLogMiddleware(BaseHTTPMiddleware):
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        response = Response("Internal server error", status_code=500)
+        token = _request_id_ctx_var.set(str(uuid4()))
+        try:
+            response = await call_next(request)
+        finally:
+            req_id = response.headers.setdefault("X-Request-Id", get_request_id())
+            logs.access_logger.queue_log_fields(REQUEST_ID=req_id)
+            _request_id_ctx_var.reset(token)
+        return response
+
+
+class LoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        start_time = time.time()
+        response = Response("Internal server error", status_code=500)
+
+        source_ip, source_port = "0.0.0.0", 0
+        if addr := request.client:
+            source_ip = addr.host
+            source_port = addr.port
+        if xff := request.headers.get("X-Forwarded-For"):
+            source_ip = xff.split(",")[0]
+        logs.access_logger.queue_log_fields(
+            ENVIRONMENT=config.legacy_fields.environment,
+            HOST=request.headers.get("host", "-"),
+            METHOD=request.method,
+            PATH=request.url.path,
+            QUERY=dict(request.query_params.items()),
+            SOURCE_IP=source_ip,
+            SOURCE_PORT=source_port,
+            PID=os.getpid(),
+            USER_AGENT=request.headers.get("user-agent", "-"),
+            BYTES_RX=request.headers.get("content-length", "-"),
+        )
+        try:
+            response = await call_next(request)
+        finally:
+            duration = time.time() - start_time
+            logs.access_logger.queue_log_fields(
+                BYTES_TX=response.headers.get("content-length", "-"),
+                STATUS_CODE=response.status_code,
+                DURATION=duration,
+            )
+            if "discovery" in str(request.url):
+                tags = [
+                    f"path:{request.url.path}",
+                    f"response_code:{response.status_code}",
+                ]
+                stats.increment("discovery.rq_total", tags=tags)
+                stats.timing("discovery.rq_ms", value=duration * 1000, tags=tags)
+            logs.access_logger.logger.info("request")
+        return response
+
+
+def build_app(*middlewares: type) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v3/discovery:clusters")
+    async def discovery() -> PlainTextResponse:
+        return PlainTextResponse('{"resources": []}')
+
+    for middleware in middlewares:
+        app.add_middleware(middleware)  # type: ignore
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> list[float]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        # warm up routing and the logger
+        for _ in range(50):
+            await c.post("/v3/discovery:clusters", json={})
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            await c.post("/v3/discovery:clusters", json={})
+            timings.append((time.perf_counter() - start) * 1_000_000)
+    return timings
+
+
+async def main(requests: int) -> None:
+    variants = {
+        "no middleware": build_app(),
+        "BaseHTTPMiddleware pair": build_app(
+            RequestContextLogMiddleware, LoggingMiddleware, RawContextMiddleware
+        ),
+        "AccessLogMiddleware": build_app(AccessLogMiddleware, RawContextMiddleware),
+    }
+    baseline = None
+    print(f"{'variant':<26}{'median µs':>12}{'p99 µs':>12}{'overhead µs':>14}")
+    for name, app in variants.items():
+        timings = await measure(app, requests)
+        median = statistics.median(timings)
+        p99 = statistics.quantiles(timings, n=100)[98]
+        if baseline is None:
+            baseline = median
+        print(f"{name:<26}{median:>12.1f}{p99:>12.1f}{median - baseline:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    asyncio.run(main(parser.parse_args().requests))
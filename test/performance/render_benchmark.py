@@ -0,0 +1,350 @@
+"""
+Offline benchmark of the render pipeline, with synthetic contexts and fleets.
+Runs in-process, without the docker-compose stack or any network access.
+
+    SOVEREIGN_CONFIG=file://test/config/config.yaml \\
+        python test/performance/render_benchmark.py [--backends N] [--endpoints M]
+            [--nodes K] [--output results.json] [--baseline baseline.json]
+
+Renders the default clusters (python) and routes (jinja) templates for every
+node in a fleet of K proxies, with a context of N backends of M endpoints each,
+and times each stage for the v1 path (filesystem cache) and the v2 path (data
+store). The "pipeline" stage is the streaming render that the workers run, the
+other stages are its steps taken one at a time.
+
+Results are written as JSON with --output. With --baseline, stages whose median
+got slower than the baseline's by more than --tolerance are listed, and the
+script exits with status 1. render_benchmark_baseline.json holds the baseline
+for the default parameters; regenerate it with --output when a change is meant
+to move the numbers.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from sovereign.cache.filesystem import FilesystemCache
+from sovereign.cache.types import Entry
+from sovereign.configuration import config
+from sovereign.context import ContextResult, TemplateContext
+from sovereign.rendering_common import (
+    add_type_urls,
+    deserialize_config,
+    filter_resources,
+    stream_resources,
+)
+from sovereign.types import DiscoveryRequest, Locality, Node, ProcessedTemplate
+from sovereign.utils import templates
+from sovereign.utils.indexes import context_indexes
+from sovereign.utils.version_info import compute_hash
+from sovereign.v2.data.data_store import InMemoryDataStore
+from sovereign.v2.data.repositories import DiscoveryEntryRepository
+from sovereign.v2.types import Context, DiscoveryEntry, entry_template
+
+BASELINE = Path(__file__).parent / "render_benchmark_baseline.json"
+RESOURCE_TYPES = ("clusters", "routes")
+ZONES = ("ap-southeast-2", "us-west-1", "eu-west-1")
+BUILD_VERSION = "e5f864a82d4f27110359daa2fbdcb12d99e415b9/1.36.0/Clean/RELEASE"
+# differences smaller than this are noise, whatever the ratio
+NOISE_FLOOR_US = 5.0
+
+Timings = dict[str, list[float]]
+
+
+def synthetic_backends(backends: int, endpoints: int, clusters: int) -> list[dict]:
+    return [
+        {
+            "name": f"backend-{b}",
+            "domains": [f"backend-{b}.local"],
+            "service_clusters": [f"cluster-{b % clusters}"],
+            "routes": [f"/path-{b}"],
+            "endpoints": [
+                {
+                    "address": f"10.{b // 256 % 256}.{b % 256}.{e % 256}",
+                    "port": 443,
+                    "region": ZONES[e % len(ZONES)],
+                }
+                for e in range(endpoints)
+            ],
+        }
+        for b in range(backends)
+    ]
+
+
+def synthetic_fleet(nodes: int, clusters: int) -> list[Node]:
+    return [
+        Node(
+            id=f"proxy-{n}",
+            cluster=f"cluster-{n % clusters}",
+            build_version=BUILD_VERSION,
+            locality=Locality(zone=ZONES[n % len(ZONES)]),
+        )
+        for n in range(nodes)
+    ]
+
+
+def discovery_request(node: Node, resource_type: str) -> DiscoveryRequest:
+    return DiscoveryRequest(
+        node=node,
+        resource_type=resource_type,
+        api_version="v3",
+        desired_controlplane="benchmark.local",
+    )
+
+
+@contextmanager
+def timed(timings: Timings, request: DiscoveryRequest, stage: str) -> Iterator[None]:
+    """Times a stage separately for each resource type, whose costs differ a lot"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1_000_000
+        timings[f"{request.resource_type}.{stage}"].append(elapsed)
+
+
+def render_kwargs(request: DiscoveryRequest, context: dict[str, Any]) -> dict:
+    return dict(
+        discovery_request=request,
+        host_header=request.desired_controlplane,
+        resource_names=request.resources,
+        utils=templates,
+        **context,
+    )
+
+
+def render_stages(
+    timings: Timings, request: DiscoveryRequest, context: dict[str, Any]
+) -> tuple[list[dict], str, str]:
+    """The steps of a render, one at a time; returns resources, version and text"""
+    with timed(timings, request, "generate"):
+        content = request.template.generate(**render_kwargs(request, context))
+    if isinstance(content, str):
+        with timed(timings, request, "deserialize_config"):
+            content = deserialize_config(content)
+    assert isinstance(content, dict)
+    with timed(timings, request, "filter"):
+        resources = filter_resources(content["resources"], request.resources)
+        add_type_urls(request.api_version, request.resource_type, resources)
+    with timed(timings, request, "version_hash"):
+        version = compute_hash(resources)
+    with timed(timings, request, "serialization"):
+        text = ProcessedTemplate(resources=resources).model_dump_json()
+    return resources, version, text
+
+
+def bench_v1(
+    timings: Timings,
+    requests: list[DiscoveryRequest],
+    contexts: dict[str, Any],
+    cache_path: str,
+) -> None:
+    template_context = TemplateContext()
+    template_context.results = {
+        name: ContextResult(name=name, data=data) for name, data in contexts.items()
+    }
+    cache = FilesystemCache(cache_path=cache_path)
+    for request in requests:
+        with timed(timings, request, "cache_key"):
+            key = request.cache_key(config.cache.hash_rules)
+        with timed(timings, request, "context"):
+            context = template_context.get_context(request)
+        _, version, text = render_stages(timings, request, context)
+        entry = Entry(text=text, len=0, version=version, node=request.node)
+        with timed(timings, request, "cache_write"):
+            cache.set(key, entry)
+
+        with timed(timings, request, "pipeline"):
+            content = request.template.stream(**render_kwargs(request, context))
+            stream = stream_resources(
+                content, request.api_version, request.resource_type, request.resources
+            )
+            cache.set(
+                key,
+                Entry(
+                    text=stream.text,
+                    len=stream.count,
+                    index=stream.index,
+                    version=stream.version_info,
+                    node=request.node,
+                ),
+            )
+
+
+def bench_v2(
+    timings: Timings, requests: list[DiscoveryRequest], contexts: dict[str, Any]
+) -> None:
+    stored = {
+        name: Context(name=name, data=data, data_hash=hash(repr(data)), refresh_after=0)
+        for name, data in contexts.items()
+    }
+    repository = DiscoveryEntryRepository(InMemoryDataStore())
+    for request in requests:
+        with timed(timings, request, "cache_key"):
+            request_hash = request.cache_key(config.cache.hash_rules)
+        with timed(timings, request, "context"):
+            context: dict[str, Any] = {
+                name: c.data for name, c in stored.items() if c is not None
+            }
+            if context_indexes.declared:
+                context["indexes"] = context_indexes.for_contexts(
+                    {name: (c.data, c.data_hash) for name, c in stored.items()}
+                )
+        resources, version, _ = render_stages(timings, request, context)
+        entry = DiscoveryEntry(
+            request_hash=request_hash,
+            template=entry_template(request),
+            request=request,
+            response={"resources": resources, "version_info": version},
+            last_rendered_at=int(time.time()),
+        )
+        with timed(timings, request, "cache_write"):
+            repository.save(entry)
+
+        with timed(timings, request, "pipeline"):
+            content = request.template.stream(**render_kwargs(request, context))
+            stream = stream_resources(
+                content,
+                request.api_version,
+                request.resource_type,
+                request.resources,
+                keep=True,
+            )
+            repository.save(
+                DiscoveryEntry(
+                    request_hash=request_hash,
+                    template=entry_template(request),
+                    request=request,
+                    response={
+                        "resources": stream.resources,
+                        "version_info": stream.version_info,
+                    },
+                    last_rendered_at=int(time.time()),
+                )
+            )
+
+
+def summarize(timings: Timings) -> dict[str, dict[str, float]]:
+    summary = {}
+    for stage, samples in timings.items():
+        ordered = sorted(samples)
+        summary[stage] = {
+            "calls": len(samples),
+            "mean_us": round(statistics.fmean(samples), 1),
+            "p50_us": round(statistics.median(samples), 1),
+            "p95_us": round(ordered[int(0.95 * (len(ordered) - 1))], 1),
+            "total_ms": round(sum(samples) / 1000, 2),
+        }
+    return summary
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    contexts = {
+        "backends": synthetic_backends(args.backends, args.endpoints, args.clusters),
+        "dynamic_backends": [],
+    }
+    fleet = synthetic_fleet(args.nodes, args.clusters)
+    requests = [
+        discovery_request(node, resource_type)
+        for node in fleet
+        for resource_type in RESOURCE_TYPES
+    ]
+    results: dict[str, Any] = {}
+    paths: dict[str, Callable[[Timings], None]] = {
+        "v1": lambda t: bench_v1(t, requests, contexts, cache_path),
+        "v2": lambda t: bench_v2(t, requests, contexts),
+    }
+    with tempfile.TemporaryDirectory() as cache_path:
+        for path, bench in paths.items():
+            # the first round loads templates and warms caches
+            bench(defaultdict(list))
+            timings: Timings = defaultdict(list)
+            for _ in range(args.rounds):
+                bench(timings)
+            results[path] = summarize(timings)
+    return {
+        "parameters": {
+            "backends": args.backends,
+            "endpoints": args.endpoints,
+            "nodes": args.nodes,
+            "clusters": args.clusters,
+            "rounds": args.rounds,
+        },
+        "results": results,
+    }
+
+
+def regressions(
+    report: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    found = []
+    for path, stages in report["results"].items():
+        for stage, current in stages.items():
+            before = baseline["results"].get(path, {}).get(stage)
+            if before is None:
+                continue
+            slower = current["p50_us"] - before["p50_us"]
+            if slower > NOISE_FLOOR_US and current["p50_us"] > before["p50_us"] * (
+                1 + tolerance
+            ):
+                found.append(
+                    f"{path} {stage}: {before['p50_us']}µs -> {current['p50_us']}µs"
+                )
+    return found
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print(json.dumps(report["parameters"]))
+    print(f"{'path':<6}{'stage':<28}{'calls':>8}{'p50 µs':>12}{'p95 µs':>12}")
+    for path, stages in report["results"].items():
+        for stage, result in stages.items():
+            print(
+                f"{path:<6}{stage:<28}{result['calls']:>8}"
+                f"{result['p50_us']:>12.1f}{result['p95_us']:>12.1f}"
+            )
+
+
+def main(args: argparse.Namespace) -> int:
+    report = run(args)
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline["parameters"] != report["parameters"]:
+            print("Baseline was recorded with different parameters, not comparing")
+            return 0
+        if found := regressions(report, baseline, args.tolerance):
+            print(f"Slower than the baseline by more than {args.tolerance:.0%}:")
+            for line in found:
+                print(f"  {line}")
+            return 1
+        print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backends", type=int, default=100)
+    parser.add_argument("--endpoints", type=int, default=4)
+    parser.add_argument("--nodes", type=int, default=20)
+    parser.add_argument(
+        "--clusters", type=int, default=10, help="distinct service clusters"
+    )
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument(
+        "--baseline",
+        nargs="?",
+        const=str(BASELINE),
+        help="compare against this JSON file (default: the stored baseline)",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+"""
+Micro-benchmark of parsing a discovery request and computing its cache key,
+using samples/discovery_request.json.
+
+    python test/performance/request_parsing_benchmark.py [--iterations N]
+
+Compares computing the key on a validated request, the way it was done before
+hash rules were compiled, with the current cache_key and with the fast path
+that reads the key straight from the request body.
+"""
+
+import argparse
+import hashlib
+import timeit
+from pathlib import Path
+
+import jmespath
+
+from sovereign.configuration import config
+from sovereign.types import DiscoveryRequest, summarize_request
+
+SAMPLE = Path(__file__).parents[2] / "samples" / "discovery_request.json"
+FIELDS = {
+    "desired_controlplane": "example.com",
+    "resource_type": "clusters",
+    "api_version": "v3",
+}
+
+
+def validated_request(body: bytes) -> DiscoveryRequest:
+    request = DiscoveryRequest.model_validate_json(body)
+    for field, value in FIELDS.items():
+        setattr(request, field, value)
+    return request
+
+
+def uncompiled_cache_key(body: bytes) -> str:
+    map = validated_request(body).model_dump()
+    hash = hashlib.sha256()
+    for expr in sorted(config.cache.hash_rules):
+        value = jmespath.search(expr, map)
+        hash.update(f"{expr}={repr(value)}".encode())
+    return hash.hexdigest()
+
+
+def compiled_cache_key(body: bytes) -> str:
+    return validated_request(body).cache_key(config.cache.hash_rules)
+
+
+def fast_path_cache_key(body: bytes) -> str:
+    summary = summarize_request(body, config.cache.hash_rules, **FIELDS)
+    assert summary is not None
+    return summary.request_hash
+
+
+def main(iterations: int) -> None:
+    body = SAMPLE.read_bytes()
+    variants = {
+        "validate + uncompiled rules": uncompiled_cache_key,
+        "validate + cache_key": compiled_cache_key,
+        "summarize_request": fast_path_cache_key,
+    }
+    keys = {fn(body) for fn in variants.values()}
+    assert len(keys) == 1, "all variants should compute the same cache key"
+
+    print(f"{'variant':<30}{'µs per request':>16}")
+    for name, fn in variants.items():
+        seconds = min(timeit.repeat(lambda: fn(body), number=iterations, repeat=5))
+        print(f"{name:<30}{seconds / iterations * 1_000_000:>16.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=5000)
+    main(parser.parse_args().iterations)
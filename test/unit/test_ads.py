@@ -0,0 +1,204 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+
+from sovereign.cache.types import Entry
+from sovereign.types import DiscoveryRequest
+from sovereign.utils.version_info import compute_hash
+
+grpc = pytest.importorskip("grpc")
+
+from envoy.config.core.v3 import base_pb2  # noqa: E402
+from envoy.service.discovery.v3 import ads_pb2_grpc, discovery_pb2  # noqa: E402
+from google.protobuf import struct_pb2  # noqa: E402
+
+from sovereign.ads import AggregatedDiscoveryService, create_server  # noqa: E402
+
+# grpc.aio binds to the event loop it is first used from
+pytestmark = pytest.mark.asyncio(loop_scope="module")
+
+CLUSTER_TYPE = "type.googleapis.com/envoy.config.cluster.v3.Cluster"
+
+
+class Resources:
+    """Stands in for the rendered entries, so versions can be changed by a test"""
+
+    def __init__(self) -> None:
+        self.version = "1"
+        self.names = ["cluster_a"]
+        self.requests: list[DiscoveryRequest] = []
+
+    async def read(self, request: DiscoveryRequest, _: str | None) -> Entry:
+        self.requests.append(request)
+        resources = [
+            {"name": name, "connect_timeout": "1s", "type": "STRICT_DNS"}
+            for name in self.names
+        ]
+        return Entry(
+            text=json.dumps({"version_info": self.version, "resources": resources}),
+            len=len(resources),
+            version=self.version,
+            node=request.node,
+        )
+
+    async def wait_for_change(
+        self, request: DiscoveryRequest, version: str, timeout: float, _: str | None
+    ) -> Entry | None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.version == version and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+        if self.version == version:
+            return None
+        return await self.read(request, None)
+
+
+def _node(auth_string: str) -> base_pb2.Node:
+    metadata = struct_pb2.Struct()
+    metadata.update({"auth": auth_string})
+    return base_pb2.Node(id="envoy-1", cluster="T1", metadata=metadata)
+
+
+@pytest.fixture(scope="module")
+def module_resources() -> Resources:
+    return Resources()
+
+
+@pytest.fixture
+def resources(module_resources: Resources) -> Resources:
+    module_resources.__init__()
+    return module_resources
+
+
+@pytest_asyncio.fixture(scope="module", loop_scope="module")
+async def stub(module_resources: Resources):
+    server = create_server(
+        AggregatedDiscoveryService(
+            module_resources.read,
+            check_interval=0.1,
+            wait_for_change=module_resources.wait_for_change,
+        )
+    )
+    port = server.add_insecure_port("127.0.0.1:0")
+    await server.start()
+    async with grpc.aio.insecure_channel(f"127.0.0.1:{port}") as channel:
+        yield ads_pb2_grpc.AggregatedDiscoveryServiceStub(channel)
+    await server.stop(None)
+
+
+async def test_pushes_only_when_version_changes(stub, resources, auth_string):
+    stream = stub.StreamAggregatedResources()
+    await stream.write(
+        discovery_pb2.DiscoveryRequest(node=_node(auth_string), type_url=CLUSTER_TYPE)
+    )
+
+    response = await asyncio.wait_for(stream.read(), 5)
+    assert response.version_info == "1"
+    assert response.type_url == CLUSTER_TYPE
+    assert [r.type_url for r in response.resources] == [CLUSTER_TYPE]
+    assert resources.requests[0].node.cluster == "T1"
+    assert resources.requests[0].resource_type == "clusters"
+
+    # ack, after which nothing is sent while the version is unchanged
+    await stream.write(
+        discovery_pb2.DiscoveryRequest(
+            type_url=CLUSTER_TYPE,
+            version_info=response.version_info,
+            response_nonce=response.nonce,
+        )
+    )
+    reads = len(resources.requests)
+    read = asyncio.ensure_future(stream.read())
+    await asyncio.sleep(0.2)
+    assert not read.done()
+    # nor are the resources read again until they change
+    assert len(resources.requests) == reads
+
+    resources.version = "2"
+    resources.names = ["cluster_a", "cluster_b"]
+    response = await asyncio.wait_for(read, 5)
+    assert response.version_info == "2"
+    assert len(response.resources) == 2
+
+    await stream.done_writing()
+
+
+async def test_rejects_invalid_auth(stub):
+    stream = stub.StreamAggregatedResources()
+    await stream.write(
+        discovery_pb2.DiscoveryRequest(node=_node("not valid"), type_url=CLUSTER_TYPE)
+    )
+    with pytest.raises(grpc.aio.AioRpcError) as e:
+        await asyncio.wait_for(stream.read(), 5)
+    assert e.value.code() in (
+        grpc.StatusCode.UNAUTHENTICATED,
+        grpc.StatusCode.INVALID_ARGUMENT,
+    )
+
+
+async def test_delta_sends_only_changed_resources(stub, resources, auth_string):
+    stream = stub.DeltaAggregatedResources()
+    await stream.write(
+        discovery_pb2.DeltaDiscoveryRequest(
+            node=_node(auth_string), type_url=CLUSTER_TYPE
+        )
+    )
+
+    response = await asyncio.wait_for(stream.read(), 5)
+    assert [r.name for r in response.resources] == ["cluster_a"]
+    assert not response.removed_resources
+    await stream.write(
+        discovery_pb2.DeltaDiscoveryRequest(
+            type_url=CLUSTER_TYPE, response_nonce=response.nonce
+        )
+    )
+
+    # cluster_a is unchanged, so only the new cluster is sent
+    resources.version = "2"
+    resources.names = ["cluster_a", "cluster_b"]
+    response = await asyncio.wait_for(stream.read(), 5)
+    assert [r.name for r in response.resources] == ["cluster_b"]
+    assert not response.removed_resources
+
+    resources.version = "3"
+    resources.names = ["cluster_b"]
+    response = await asyncio.wait_for(stream.read(), 5)
+    assert not response.resources
+    assert list(response.removed_resources) == ["cluster_a"]
+
+    await stream.done_writing()
+
+
+async def test_delta_explicit_subscription(stub, resources, auth_string):
+    stream = stub.DeltaAggregatedResources()
+    resources.names = ["cluster_a", "cluster_b", "cluster_c"]
+    await stream.write(
+        discovery_pb2.DeltaDiscoveryRequest(
+            node=_node(auth_string),
+            type_url=CLUSTER_TYPE,
+            resource_names_subscribe=["cluster_a", "cluster_b"],
+            # the client already has the current version of cluster_b
+            initial_resource_versions={
+                "cluster_b": compute_hash(
+                    {"name": "cluster_b", "connect_timeout": "1s", "type": "STRICT_DNS"}
+                )
+            },
+        )
+    )
+
+    response = await asyncio.wait_for(stream.read(), 5)
+    assert [r.name for r in response.resources] == ["cluster_a"]
+
+    await stream.write(
+        discovery_pb2.DeltaDiscoveryRequest(
+            type_url=CLUSTER_TYPE,
+            response_nonce=response.nonce,
+            resource_names_subscribe=["cluster_c"],
+        )
+    )
+    response = await asyncio.wait_for(stream.read(), 5)
+    assert [r.name for r in response.resources] == ["cluster_c"]
+
+    await stream.done_writing()
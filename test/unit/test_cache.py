@@ -4,11 +4,12 @@ Tests for the sovereign caching system.
 Tests the essential contracts:
 - FilesystemCache: get/set and client registration
 - S3Backend: get/set with pickling
-- CacheReader: local-first with remote fallback and write-back
+- CacheReader: local-first with remote fallback and write-back, long-poll waits
 - CacheWriter: dual-write to local and remote
 - client_id: deterministic hashing
 """
 
+import asyncio
 import sqlite3
 import time
 from pathlib import Path
@@ -268,6 +269,49 @@ class TestCacheReader:
 
             reader.register_over_http.assert_called_with(mock_cache_discovery_request)
 
+    async def test_parked_request_wakes_when_version_changes(
+        self, temp_cache_dir, mock_cache_entry, mock_cache_discovery_request
+    ):
+        """A long-poll request is only released by an entry with a new version."""
+        with patch("sovereign.cache.config") as cfg:
+            cfg.cache.local_fs_path = temp_cache_dir
+            cfg.cache.remote_backend = None
+            cfg.cache.hash_rules = ["node.cluster"]
+            cfg.cache.poll_interval_secs = 0.01
+
+            from sovereign.cache import CacheReader, client_id
+            from sovereign.cache.filesystem import FilesystemCache
+
+            local = FilesystemCache(cache_path=temp_cache_dir)
+            cid = client_id(mock_cache_discovery_request)
+            local.set(cid, mock_cache_entry)
+
+            reader = CacheReader()
+            reader.local = local
+            reader.remote = None
+
+            async def write_new_version():
+                await asyncio.sleep(0.1)
+                local.set(cid, mock_cache_entry.model_copy(update={"version": "v2"}))
+
+            _, entry = await asyncio.gather(
+                write_new_version(),
+                reader.wait_for_change(
+                    mock_cache_discovery_request, mock_cache_entry.version, 5
+                ),
+            )
+
+            assert entry is not None
+            assert entry.version == "v2"
+            assert not reader.parked
+
+            # nothing changes after that, so the request is held until the timeout
+            assert (
+                await reader.wait_for_change(mock_cache_discovery_request, "v2", 0.1)
+                is None
+            )
+            assert not reader.parked
+
 
 class TestCacheWriter:
     """Tests for CacheWriter - dual-write logic."""
@@ -334,6 +378,26 @@ class TestCacheWriter:
             assert cached is True  # Local succeeded
             assert any("remote" in m[1].lower() for m in messages)
 
+    def test_local_only_writes_skip_remote(self, temp_cache_dir, mock_cache_entry):
+        """Internal requests from the UI are only cached locally."""
+        with patch("sovereign.cache.config") as cfg:
+            cfg.cache.local_fs_path = temp_cache_dir
+            cfg.cache.remote_backend = None
+            cfg.cache.hash_rules = ["node.cluster"]
+
+            from sovereign.cache import CacheWriter
+            from sovereign.cache.filesystem import FilesystemCache
+
+            writer = CacheWriter()
+            writer.local = FilesystemCache(cache_path=temp_cache_dir)
+            writer.remote = MagicMock()
+
+            cached, _ = writer.set("key", mock_cache_entry, timeout=60, remote=False)
+
+            assert cached is True
+            assert writer.local.get("key") is not None
+            writer.remote.set.assert_not_called()
+
 
 class TestClientId:
     """Tests for client_id - deterministic cache key generation."""
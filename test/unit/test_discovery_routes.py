@@ -0,0 +1,118 @@
+from unittest.mock import patch
+
+from starlette.testclient import TestClient
+
+from sovereign import config
+from sovereign.types import DiscoveryRequest, DiscoveryResponse, RequestSummary
+from sovereign.utils.admission import admission
+from sovereign.utils.mock import mock_discovery_request
+from sovereign.v2 import web
+from sovereign.v2.data.data_store import InMemoryDataStore
+from sovereign.v2.data.repositories import DiscoveryEntryRepository
+from sovereign.v2.types import DiscoveryEntry
+from sovereign.views import discovery, reader
+
+
+def _request(auth_string: str, version_info: str) -> dict:
+    return {
+        "node": {
+            "cluster": "T1",
+            "metadata": {"auth": auth_string},
+            "build_version": "e5f864a82d4f27110359daa2fbdcb12d99e415b9/1.9.0/Clean/RELEASE",
+        },
+        "version_info": version_info,
+    }
+
+
+def _cache_key(body: dict) -> str:
+    request = DiscoveryRequest.model_validate(body)
+    request.desired_controlplane = "testserver"
+    request.resource_type = "clusters"
+    request.api_version = "v3"
+    return request.cache_key(config.cache.hash_rules)
+
+
+def test_up_to_date_client_is_answered_before_validation(
+    testclient: TestClient, auth_string, mock_cache_entry
+):
+    body = _request(auth_string, mock_cache_entry.version)
+    reader.local.set(_cache_key(body), mock_cache_entry)
+
+    with patch(
+        "sovereign.views.discovery.parse_discovery_request",
+        side_effect=AssertionError("should not be validated"),
+    ):
+        response = testclient.post("/v3/discovery:clusters", json=body)
+
+    assert response.status_code == 304
+    assert response.headers["X-Sovereign-Response-Version"] == "test_v1"
+    assert response.headers["X-Sovereign-Requested-Type"] == "clusters"
+
+
+def test_up_to_date_client_is_still_authenticated(
+    testclient: TestClient, mock_cache_entry
+):
+    body = _request("not-a-valid-token", mock_cache_entry.version)
+    reader.local.set(_cache_key(body), mock_cache_entry)
+
+    response = testclient.post("/v3/discovery:clusters", json=body)
+
+    assert response.status_code == 400
+
+
+def test_up_to_date_client_of_an_empty_response_is_not_answered_by_worker_v2(
+    auth_string, monkeypatch
+):
+    repository = DiscoveryEntryRepository(InMemoryDataStore())
+    monkeypatch.setattr(web, "_discovery_entry_repository", lambda: repository)
+    monkeypatch.setattr(discovery.config, "worker_v2_enabled", True)
+    monkeypatch.setattr(discovery.config.long_poll, "enabled", False)
+    summary = RequestSummary(
+        request_hash="abc",
+        version_info="123",
+        envoy_version="1.34.1",
+        resource_names=[],
+        node_id="node",
+        node_metadata={"auth": auth_string},
+    )
+
+    for resources, expected in (([{"name": "a"}], 304), ([], None)):
+        entry = DiscoveryEntry(
+            request_hash="abc",
+            template="clusters",
+            request=mock_discovery_request("v3", "clusters"),
+            response=DiscoveryResponse(version_info="123", resources=resources),
+        )
+        repository.save(entry)
+
+        response = discovery.up_to_date_response(summary, "clusters")
+
+        # empty responses are left for the full handler, which returns a 404
+        status = response and response.status_code
+        assert status == expected
+
+
+def test_invalid_request_is_rejected(testclient: TestClient):
+    response = testclient.post("/v3/discovery:clusters", json={"node": {}})
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "node", "cluster"]
+
+
+def test_cache_misses_are_shed_while_backlogged(
+    testclient: TestClient, auth_string, mock_cache_entry, monkeypatch
+):
+    monkeypatch.setattr(admission.config, "enabled", True)
+    monkeypatch.setattr(admission.config, "max_waiters", 0)
+
+    miss = _request(auth_string, "")
+    miss["node"]["cluster"] = "uncached"
+    response = testclient.post("/v3/discovery:clusters", json=miss)
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # cached responses are still served
+    body = _request(auth_string, "")
+    reader.local.set(_cache_key(body), mock_cache_entry)
+    response = testclient.post("/v3/discovery:clusters", json=body)
+    assert response.status_code == 200
@@ -1,7 +1,13 @@
+import asyncio
+import time
+
 import pytest
+from fastapi import HTTPException
 from starlette.testclient import TestClient
 
 from sovereign import __version__
+from sovereign.configuration import DeepCheckConfig
+from sovereign.views import healthchecks
 
 
 def test_openapi_json(testclient: TestClient):
@@ -24,3 +30,86 @@ def test_healthcheck_route(testclient: TestClient):
 def test_deepcheck_route(testclient: TestClient):
     response = testclient.get("/deepcheck")
     assert response.status_code == 200
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    """Templates take as long as given here to check; others are instant"""
+    delays: dict[str, float] = {}
+    calls: list[str] = []
+
+    async def check_template(template: str, service_cluster: str):
+        calls.append(template)
+        await asyncio.sleep(delays.get(template, 0))
+        return "OK"
+
+    async def worker_is_healthy(timeout: float) -> bool:
+        return True
+
+    monkeypatch.setattr(healthchecks, "check_template", check_template)
+    monkeypatch.setattr(healthchecks, "worker_is_healthy", worker_is_healthy)
+    monkeypatch.setattr(healthchecks.config, "worker_v2_enabled", False)
+    return delays, calls
+
+
+async def test_deepcheck_checks_templates_within_one_deadline(checks):
+    delays, _ = checks
+    templates = list(healthchecks.XDS_TEMPLATES["default"])
+    for template in templates:
+        delays[template] = 0.2
+    delays[templates[0]] = 60
+    deepcheck = healthchecks.DeepCheck(DeepCheckConfig(timeout_secs=1))
+
+    start = time.monotonic()
+    result = await deepcheck.check("*", 1)
+
+    # checked at the same time, so the deadline isn't spent on each in turn
+    assert time.monotonic() - start < 5
+    assert result.templates[templates[0]] == (
+        "FAIL",
+        f"Timed out rendering {templates[0]}",
+    )
+    assert all(result.templates[t] == "OK" for t in templates[1:])
+    assert result.worker == "OK"
+
+
+async def test_deepcheck_results_are_reused(checks):
+    _, calls = checks
+    deepcheck = healthchecks.DeepCheck(DeepCheckConfig(cache_ttl_secs=60))
+    templates = len(healthchecks.XDS_TEMPLATES["default"])
+
+    first, second = await asyncio.gather(
+        deepcheck.check("*", 1), deepcheck.check("*", 1)
+    )
+    third = await deepcheck.check("*", 1)
+    assert first is second is third
+    assert len(calls) == templates
+
+    await deepcheck.check("other", 1)
+    assert len(calls) == 2 * templates
+
+
+async def test_deepcheck_keeps_a_bounded_number_of_results(checks):
+    deepcheck = healthchecks.DeepCheck(
+        DeepCheckConfig(cache_ttl_secs=60, max_results=2)
+    )
+
+    for cluster in ("a", "b", "c"):
+        await deepcheck.check(cluster, 1)
+
+    assert list(deepcheck.results) == [("b", 1), ("c", 1)]
+
+
+async def test_deepcheck_fails_templates_that_v2_turns_away(monkeypatch):
+    async def wait_for_discovery_response(request):
+        raise HTTPException(status_code=503, detail="Too many requests waiting")
+
+    monkeypatch.setattr(healthchecks.config, "worker_v2_enabled", True)
+    monkeypatch.setattr(
+        healthchecks, "wait_for_discovery_response", wait_for_discovery_response
+    )
+
+    state, message = await healthchecks.check_template("clusters", "*")
+
+    assert state == "FAIL"
+    assert "Too many requests waiting" in message
@@ -0,0 +1,106 @@
+import json
+import random
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI, Request, Response
+
+from sovereign import loadgen
+from sovereign.loadgen import LoadGenerator, MetricsListener, fleet, main
+from sovereign.types import DiscoveryRequest
+
+SEED = json.loads(Path("samples/discovery_request.json").read_text())
+
+
+def test_seeds_are_fanned_out_into_node_variants():
+    streams = fleet(
+        [SEED],
+        nodes=10,
+        resource_types=["clusters", "routes"],
+        clusters=["T1", "T2"],
+        zones=["us-east-1a"],
+        envoy_versions=["1.34.1"],
+        resource_names=["rds-a", "rds-b", "rds-c"],
+        rng=random.Random(1),
+    )
+
+    assert len(streams) == 20
+    assert len({s.node["id"] for s in streams}) == 10
+    for stream in streams:
+        request = DiscoveryRequest.model_validate_json(stream.body())
+        assert request.node.cluster in ("T1", "T2")
+        assert request.node.locality.zone == "us-east-1a"
+        assert request.envoy_version == "1.34.1"
+        assert request.version_info == ""
+        if stream.resource_type == "routes":
+            assert set(request.resource_names) <= {"rds-a", "rds-b", "rds-c"}
+            assert request.resource_names
+        else:
+            # requested whole, as Envoy does for clusters
+            assert request.resource_names == []
+
+
+def test_metrics_listener_counts_render_waits_and_backlog():
+    listener = MetricsListener("sovereign")
+    listener.datagram_received(
+        b"sovereign.client.registration:1|c|#status:registered,env:local\n"
+        b"sovereign.client.registration:1|c|#status:ratelimited\n"
+        b"sovereign.v2.worker.discovery_response:1|c|@0.5|#source:after_polling\n"
+        b"sovereign.template.on_demand_queue_size:7|g\n"
+        b"sovereign.cache.read_ms:1.5|ms",
+        None,
+    )
+
+    assert listener.render_waits == 3
+    assert listener.gauges == {"template.on_demand_queue_size": 7}
+
+
+async def test_polls_send_back_the_version_they_were_given():
+    app = FastAPI()
+
+    @app.post("/v3/discovery:clusters")
+    async def discovery(request: Request) -> Response:
+        body = await request.json()
+        headers = {"X-Sovereign-Response-Version": "abc"}
+        if body["version_info"] == "abc":
+            return Response(status_code=304, headers=headers)
+        return Response("{}", headers=headers)
+
+    streams = fleet([SEED], nodes=4, resource_types=["clusters"])
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+        generator = LoadGenerator(client, streams, qps=200)
+        await generator.run(duration=0.2)
+
+    summary = generator.summary()
+    assert summary["statuses"]["200"] == 4
+    assert summary["statuses"]["304"] == summary["requests"] - 4
+    assert all(stream.version_info == "abc" for stream in streams)
+    assert summary["cache_hit_ratio"] is None
+
+
+async def test_errors_raised_by_the_app_are_counted():
+    app = FastAPI()
+
+    @app.post("/v3/discovery:clusters")
+    async def discovery() -> Response:
+        raise RuntimeError("broken template")
+
+    streams = fleet([SEED], nodes=2, resource_types=["clusters"])
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+        generator = LoadGenerator(client, streams, qps=100)
+        await generator.run(duration=0.1)
+
+    summary = generator.summary()
+    assert summary["statuses"] == {"RuntimeError": summary["requests"]}
+    assert not any(stream.polling for stream in streams)
+
+
+def test_in_process_runs_need_the_v1_worker(monkeypatch, capsys):
+    monkeypatch.setattr(loadgen.config, "worker_v2_enabled", False)
+    # nothing listens on the discard port
+    monkeypatch.setattr(loadgen, "WORKER_URL", "http://127.0.0.1:9")
+
+    assert main(["samples/discovery_request.json", "--duration", "1"]) == 1
+    assert "No worker is running" in capsys.readouterr().out
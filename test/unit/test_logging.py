@@ -1,6 +1,9 @@
+import io
 import json
+import time
 
 import structlog
+from starlette_context import request_cycle_context
 from structlog.testing import CapturingLoggerFactory
 
 from sovereign.configuration import (
@@ -10,6 +13,7 @@ from sovereign.configuration import (
     SovereignConfigv2,
     TemplateConfiguration,
 )
+from sovereign.logging.access_log_writer import AccessLogWriter
 from sovereign.logging.bootstrapper import LoggerBootstrapper
 from sovereign.logging.types import LoggingType
 
@@ -358,3 +362,93 @@ def test_application_logs_contain_correct_type_field():
     args = input_log_call.args[0]
     parsed_args = json.loads(args)
     assert parsed_args.get("type") == LoggingType.APPLICATION
+
+
+def batched_access_logger(**kwargs):
+    access_log_config = AccessLogConfiguration(enabled=True, batched=True, **kwargs)
+    logging_config = LoggingConfiguration(access_logs=access_log_config)
+    sovereign_config = SovereignConfigv2(
+        sources=[], templates=EMPTY_TEMPLATE_CONF, logging=logging_config
+    )
+    access_logger = LoggerBootstrapper(config=sovereign_config).access_logger
+    access_logger.writer.stream = io.BytesIO()
+    # flushed explicitly by the tests instead of from a thread
+    access_logger.writer.thread = object()
+    return access_logger
+
+
+def test_batched_access_logs_are_formatted_when_flushed():
+    access_logger = batched_access_logger()
+    cf = CapturingLoggerFactory()
+    structlog.configure(logger_factory=cf)
+
+    with request_cycle_context({"METHOD": "POST", "STATUS_CODE": 200}):
+        access_logger.log_request(200)
+    with request_cycle_context({"METHOD": "GET", "STATUS_CODE": 404}):
+        access_logger.log_request(404)
+
+    assert len(cf.logger.calls) == 0
+    access_logger.writer.flush()
+
+    lines = access_logger.writer.stream.getvalue().splitlines()
+    entries = [json.loads(line) for line in lines]
+    assert [(e["method"], e["status"]) for e in entries] == [
+        ("POST", "200"),
+        ("GET", "404"),
+    ]
+    assert entries[0]["type"] == "access"
+    assert entries[0]["event"] == "request"
+    assert entries[0]["env"] == "-"
+
+
+def test_batched_access_logs_are_dropped_when_buffer_is_full():
+    access_logger = batched_access_logger(buffer_size=2)
+
+    for _ in range(5):
+        with request_cycle_context({}):
+            access_logger.log_request(200)
+
+    assert len(access_logger.writer.buffer) == 2
+    assert access_logger.writer.dropped == 3
+    access_logger.writer.flush()
+    assert access_logger.writer.dropped == 0
+    assert len(access_logger.writer.stream.getvalue().splitlines()) == 2
+
+
+def test_not_modified_access_logs_are_sampled():
+    access_logger = batched_access_logger(not_modified_sample_rate=0.0)
+
+    for status in (200, 304, 304, 500):
+        with request_cycle_context({}):
+            access_logger.log_request(status)
+
+    assert len(access_logger.writer.buffer) == 2
+
+
+def test_access_log_writer_thread_flushes_on_its_own():
+    stream = io.BytesIO()
+    writer = AccessLogWriter(
+        formatter=lambda event_dict: dict(event_dict),
+        buffer_size=10,
+        flush_interval=0.01,
+        stream=stream,
+    )
+    writer.submit({"event": "request"})
+    writer.wake.set()
+    for _ in range(100):
+        if stream.getvalue():
+            break
+        time.sleep(0.01)
+    assert json.loads(stream.getvalue()) == {"event": "request"}
+
+
+def test_batched_access_logs_are_rendered_like_unbatched_ones():
+    access_logger = batched_access_logger()
+
+    with request_cycle_context({"METHOD": "GET", "STATUS_CODE": 200}):
+        access_logger.log_request(200)
+    access_logger.writer.flush()
+
+    line = access_logger.writer.stream.getvalue().decode().rstrip("\n")
+    rendered = structlog.processors.JSONRenderer()(None, "info", json.loads(line))
+    assert line == rendered
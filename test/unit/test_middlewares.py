@@ -0,0 +1,36 @@
+from unittest.mock import patch
+
+from starlette.testclient import TestClient
+from starlette_context import context
+
+from sovereign import logs
+
+
+def test_access_log_fields_are_gathered(testclient: TestClient):
+    fields = {}
+
+    def capture(event):
+        fields.update(context.data)
+
+    with patch.object(logs.access_logger.logger, "info", side_effect=capture):
+        response = testclient.get(
+            "/healthcheck?a=b",
+            headers={"X-Forwarded-For": "10.0.0.1, 10.0.0.2", "User-Agent": "test"},
+        )
+
+    assert response.status_code == 200
+    assert fields["REQUEST_ID"] == response.headers["X-Request-Id"]
+    assert fields["METHOD"] == "GET"
+    assert fields["PATH"] == "/healthcheck"
+    assert fields["QUERY"] == {"a": "b"}
+    assert fields["SOURCE_IP"] == "10.0.0.1"
+    assert fields["USER_AGENT"] == "test"
+    assert fields["STATUS_CODE"] == 200
+    assert fields["BYTES_TX"] == "2"
+    assert fields["DURATION"] >= 0
+
+
+def test_request_ids_are_unique(testclient: TestClient):
+    first = testclient.get("/healthcheck").headers["X-Request-Id"]
+    second = testclient.get("/healthcheck").headers["X-Request-Id"]
+    assert first != second
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+from sovereign.cache.types import Entry
+from sovereign.rendering_common import stream_resources, type_urls
+from sovereign.types import Node, ProcessedTemplate
+from sovereign.views.interface import find_resource, find_virtual_host
+
+
+def generated():
+    yield {"name": "a", "connect_timeout": "5s", "hosts": [{"port": 80}]}
+    yield {"name": "b", "@type": "custom", "weight": 1.5, "tags": None}
+    yield {"cluster_name": "c", "endpoints": []}
+
+
+@pytest.mark.parametrize("requested", [[], ["a", "c"], ["missing"]])
+@pytest.mark.parametrize("keep", [False, True])
+def test_streamed_resources_match_a_processed_template(requested, keep):
+    expected_resources = [
+        r
+        for r in generated()
+        if not requested or (r.get("name") or r.get("cluster_name")) in requested
+    ]
+    for resource in expected_resources:
+        resource.setdefault("@type", type_urls["v3"]["clusters"])
+    expected = ProcessedTemplate(resources=expected_resources)
+
+    stream = stream_resources(generated(), "v3", "clusters", requested, keep=keep)
+
+    assert stream.count == len(expected.resources)
+    assert stream.version_info == expected.version_info
+    assert stream.text == expected.model_dump_json(indent=None)
+    assert stream.resources == (expected.resources if keep else [])
+
+
+def test_text_templates_are_deserialized():
+    content = "resources:\n  - name: a\n  - name: b\n"
+
+    stream = stream_resources(content, "v3", "listeners", ["b"], keep=True)
+
+    assert stream.resources == [{"name": "b", "@type": type_urls["v3"]["listeners"]}]
+
+
+def test_resources_must_be_mappings():
+    with pytest.raises(ValueError):
+        stream_resources(iter(["a"]), "v3", "clusters", [])
+
+
+def routes():
+    yield {"name": "cluster-é", "connect_timeout": "5s"}
+    yield {
+        "name": "rc",
+        "virtual_hosts": [
+            {"name": "vh-ü", "domains": ["ü.example"]},
+            {"name": "vh2", "domains": ["*"]},
+        ],
+    }
+
+
+def test_index_locates_resources_and_virtual_hosts_in_the_text():
+    stream = stream_resources(routes(), "v3", "routes", [])
+    text = stream.text
+
+    def at(span):
+        return json.loads(text[span[0] : span[1]])
+
+    # written key by key, but the same as when serialized whole
+    assert text == stream_resources(routes(), "v3", "routes", [], keep=True).text
+    expected = json.loads(text)["resources"]
+    assert at(stream.index.resources["cluster-é"]) == expected[0]
+    assert at(stream.index.resources["rc"]) == expected[1]
+    assert at(stream.index.virtual_hosts["rc"]["vh-ü"]) == {
+        "name": "vh-ü",
+        "domains": ["ü.example"],
+    }
+    assert at(stream.index.virtual_hosts["rc"]["vh2"])["domains"] == ["*"]
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_views_read_single_resources_from_entries(indexed):
+    stream = stream_resources(routes(), "v3", "routes", [])
+    entry = Entry(
+        text=stream.text,
+        len=stream.count,
+        version=stream.version_info,
+        node=Node(cluster="*"),
+        index=stream.index if indexed else None,
+    )
+
+    assert find_resource(entry, "cluster-é")["connect_timeout"] == "5s"
+    assert find_resource(entry, "missing") is None
+    assert find_virtual_host(entry, "rc", "vh2")["domains"] == ["*"]
+    assert find_virtual_host(entry, "rc", "missing") is None
+    assert find_virtual_host(entry, "missing", "vh2") is None
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_the_first_of_resources_with_the_same_name_is_found(indexed):
+    def duplicates():
+        yield {"name": "a", "weight": 1}
+        yield {"name": "a", "weight": 2}
+        yield {"name": "rc", "virtual_hosts": [{"name": "vh", "domains": ["1"]}]}
+        yield {
+            "name": "rc",
+            "virtual_hosts": [
+                {"name": "vh", "domains": ["2"]},
+                {"name": "only-in-second", "domains": ["3"]},
+            ],
+        }
+
+    stream = stream_resources(duplicates(), "v3", "routes", [])
+    entry = Entry(
+        text=stream.text,
+        len=stream.count,
+        version=stream.version_info,
+        node=Node(cluster="*"),
+        index=stream.index if indexed else None,
+    )
+
+    assert find_resource(entry, "a")["weight"] == 1
+    assert find_resource(entry, "rc")["virtual_hosts"][0]["domains"] == ["1"]
+    assert find_virtual_host(entry, "rc", "vh")["domains"] == ["1"]
+    assert find_virtual_host(entry, "rc", "only-in-second") is None
@@ -1,3 +1,4 @@
+import json
 import random
 
 import pytest
@@ -10,6 +11,7 @@ from sovereign.configuration import (
     SupervisordConfig,
     default_hash_rules,
 )
+from sovereign.types import DiscoveryRequest, summarize_request
 from sovereign.utils.crypto.suites import EncryptionType
 from sovereign.utils.mock import mock_discovery_request
 
@@ -305,3 +307,74 @@ def test_discovery_request_cache_key_is_deterministic():
         )
         new = req.cache_key(default_hash_rules())
         assert new == key
+
+
+@pytest.mark.parametrize(
+    "node",
+    [
+        {"cluster": "T1"},
+        {"cluster": "T1", "locality": {"zone": "us-east-1a"}, "metadata": {"a": 1}},
+        {"cluster": "T1", "build_version": "abc/1.9.0/Clean/RELEASE"},
+        {
+            "cluster": "T1",
+            "user_agent_build_version": {
+                "version": {"major_number": 1, "minor_number": 25}
+            },
+        },
+    ],
+)
+@pytest.mark.parametrize(
+    "rules",
+    [default_hash_rules(), [*default_hash_rules(), "node.metadata.a", "version_info"]],
+)
+def test_request_summary_matches_cache_key(node, rules):
+    """
+    The cache key computed from the raw request body is the same as the one
+    computed from the validated request.
+    """
+    body = json.dumps({"node": node, "resource_names": ["b", "a"]}).encode()
+    req = DiscoveryRequest.model_validate_json(body)
+    req.desired_controlplane = "example.com"
+    req.resource_type = "clusters"
+    req.api_version = "v3"
+
+    summary = summarize_request(
+        body,
+        rules,
+        desired_controlplane="example.com",
+        resource_type="clusters",
+        api_version="v3",
+    )
+
+    assert summary is not None
+    assert summary.request_hash == req.cache_key(rules)
+    assert summary.envoy_version == req.envoy_version
+    assert summary.version_info == req.version_info
+
+
+@pytest.mark.parametrize(
+    "body,rules",
+    [
+        # the whole node needs to be validated
+        ({"node": {"cluster": "T1"}}, ["node"]),
+        # not an expression that starts with fields
+        ({"node": {"cluster": "T1"}}, ["[node.cluster, node.id]"]),
+        # invalid requests are left to validation
+        ({"node": {}}, default_hash_rules()),
+        ({"node": {"cluster": "T1", "locality": []}}, default_hash_rules()),
+        # rejected config needs to be logged
+        (
+            {"node": {"cluster": "T1"}, "error_detail": {"code": 1, "message": "x"}},
+            default_hash_rules(),
+        ),
+    ],
+)
+def test_request_summary_falls_back_to_validation(body, rules):
+    summary = summarize_request(
+        json.dumps(body).encode(),
+        rules,
+        desired_controlplane="example.com",
+        resource_type="clusters",
+        api_version="v3",
+    )
+    assert summary is None
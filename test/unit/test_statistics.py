@@ -0,0 +1,73 @@
+import multiprocessing
+import socket
+
+import pytest
+
+from sovereign import statistics
+from sovereign.configuration import StatsdConfig
+
+
+@pytest.fixture
+def statsd_server(monkeypatch):
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    server.settimeout(2)
+    monkeypatch.setitem(statistics.STATSD, "instance", None)
+    yield server
+    server.close()
+
+
+def configure(monkeypatch, server, **kwargs) -> statistics.StatsDProxy:
+    config = StatsdConfig(
+        enabled=True,
+        host="127.0.0.1",
+        port=server.getsockname()[1],
+        namespace="test",
+        **kwargs,
+    )
+    monkeypatch.setattr(statistics.sovereign_config, "statsd", config)
+    return statistics.configure_statsd()
+
+
+def test_aggregated_counters_are_sent_once_per_flush(monkeypatch, statsd_server):
+    stats = configure(monkeypatch, statsd_server, aggregate=True)
+    try:
+        for _ in range(50):
+            stats.increment("cache.fs.hit", tags=["a:b"])
+        stats.timing("discovery.auth.ms", value=3)
+        stats.flush_aggregated_metrics()
+        stats.flush()
+
+        lines = statsd_server.recv(4096).decode().splitlines()
+        assert "test.cache.fs.hit:50|c|#a:b" in lines
+        assert "test.discovery.auth.ms:3|ms" in lines
+    finally:
+        stats.stop(timeout=1)
+
+
+def test_metrics_are_sent_immediately_without_aggregation(monkeypatch, statsd_server):
+    stats = configure(monkeypatch, statsd_server)
+    stats.increment("cache.fs.hit")
+    stats.increment("cache.fs.hit")
+
+    assert statsd_server.recv(4096).strip() == b"test.cache.fs.hit:1|c"
+    assert statsd_server.recv(4096).strip() == b"test.cache.fs.hit:1|c"
+
+
+def test_metrics_from_a_forked_process_are_flushed(monkeypatch, statsd_server):
+    stats = configure(monkeypatch, statsd_server, aggregate=True)
+
+    def render():
+        # as rendering.generate does, before the render process exits
+        stats.increment("template.render", tags=["result:ok"])
+        stats.flush_pending()
+
+    try:
+        process = multiprocessing.get_context("fork").Process(target=render)
+        process.start()
+        process.join(timeout=10)
+
+        lines = statsd_server.recv(4096).decode().splitlines()
+        assert "test.template.render:1|c|#result:ok" in lines
+    finally:
+        stats.stop(timeout=1)
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from sovereign import tracing
+from sovereign.configuration import TracingConfig
+
+
+class Collector(HTTPServer):
+    def __init__(self) -> None:
+        self.batches: list[list[dict]] = []
+
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                length = int(self.headers["content-length"])
+                collector.batches.append(json.loads(self.rfile.read(length)))
+                self.send_response(202)
+                self.end_headers()
+
+            def log_message(self, *args) -> None:
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+
+
+@pytest.fixture
+def collector():
+    server = Collector()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class RecordingExporter:
+    def __init__(self) -> None:
+        self.spans: list[tracing.Trace] = []
+
+    def submit(self, trace: tracing.Trace) -> None:
+        self.spans.append(trace)
+
+
+def enable_tracing(monkeypatch, **kwargs) -> RecordingExporter:
+    exporter = RecordingExporter()
+    monkeypatch.setattr(tracing, "TRACING_DISABLED", False)
+    monkeypatch.setattr(tracing, "TRACING", TracingConfig(enabled=True, **kwargs))
+    monkeypatch.setattr(tracing, "EXPORTER", exporter)
+    return exporter
+
+
+def span(number: int) -> tracing.Trace:
+    return tracing.Trace(
+        traceId="t", id=str(number), name="span", timestamp=0.0, tags={}
+    )
+
+
+def test_exporter_sends_spans_in_batches(collector):
+    exporter = tracing.SpanExporter(
+        TracingConfig(
+            collector=f"http://127.0.0.1:{collector.server_port}",
+            queue_size=3,
+            batch_size=2,
+        )
+    )
+    # flushed explicitly by the test instead of from a thread
+    exporter.thread = object()
+
+    for number in range(4):
+        exporter.submit(span(number))
+    exporter.flush()
+
+    assert [[s["id"] for s in batch] for batch in collector.batches] == [
+        ["0", "1"],
+        ["2"],
+    ]
+
+
+def test_exporter_thread_sends_spans_on_its_own(collector):
+    exporter = tracing.SpanExporter(
+        TracingConfig(
+            collector=f"http://127.0.0.1:{collector.server_port}",
+            flush_interval_secs=0.01,
+        )
+    )
+    exporter.submit(span(1))
+    for _ in range(100):
+        if collector.batches:
+            break
+        time.sleep(0.01)
+
+    assert [[s["id"] for s in batch] for batch in collector.batches] == [["1"]]
+
+
+def test_nested_spans_share_a_trace(monkeypatch):
+    exporter = enable_tracing(monkeypatch)
+
+    with tracing.Tracer("outer") as outer:
+        with tracing.Tracer("inner"):
+            pass
+    with tracing.Tracer("other"):
+        pass
+
+    inner, outer_span, other = exporter.spans
+    assert inner["traceId"] == outer_span["traceId"]
+    assert inner["parentSpanId"] == outer.span_id
+    assert "parentSpanId" not in outer_span
+    assert "parentSpanId" not in other
+    assert other["traceId"] != outer_span["traceId"]
+    assert tracing.get_span_id() == ""
+
+
+def test_traces_are_sampled_as_a_whole(monkeypatch):
+    exporter = enable_tracing(monkeypatch, sample_rate=0.0)
+
+    with tracing.Tracer("outer"):
+        with tracing.Tracer("inner"):
+            pass
+
+    assert exporter.spans == []
@@ -0,0 +1,58 @@
+import pytest
+from fastapi import HTTPException
+
+from sovereign.configuration import AdmissionConfig
+from sovereign.utils.admission import AdmissionController
+
+
+def controller(**kwargs) -> AdmissionController:
+    return AdmissionController(AdmissionConfig(enabled=True, **kwargs))
+
+
+def test_waiters_over_budget_are_shed_with_retry_after():
+    admission = controller(max_waiters=2)
+    admission.wait_secs = 4.0
+
+    with admission.waiter(), admission.waiter():
+        with pytest.raises(HTTPException) as e:
+            with admission.waiter():
+                pass
+        assert admission.waiters == 2
+
+    assert admission.waiters == 0
+    assert e.value.status_code == 503
+    assert e.value.headers == {"Retry-After": "4"}
+
+
+def test_deep_worker_queue_sheds_requests():
+    admission = controller(max_queue_depth=10, max_retry_after_secs=5)
+    admission.wait_secs = 2.0
+
+    with pytest.raises(HTTPException) as e:
+        with admission.waiter(lambda: 40):
+            pass
+
+    # four times over budget, capped at the maximum
+    assert e.value.headers == {"Retry-After": "5"}
+
+
+def test_queue_depth_is_forgotten_when_not_reported_again():
+    admission = controller(max_queue_depth=10, queue_depth_ttl_secs=0)
+    admission.report_queue_depth(100)
+
+    with admission.waiter():
+        pass
+
+
+def test_unknown_queue_depth_is_admitted():
+    admission = controller(max_queue_depth=1)
+
+    with admission.waiter(lambda: None):
+        pass
+
+
+def test_nothing_is_shed_when_disabled():
+    admission = AdmissionController(AdmissionConfig(enabled=False, max_waiters=0))
+
+    with admission.waiter(lambda: 10**6):
+        assert admission.waiters == 0
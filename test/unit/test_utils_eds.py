@@ -1,7 +1,10 @@
+import random
+
 import yaml
 
 from sovereign import config
-from sovereign.utils.eds import locality_lb_endpoints
+from sovereign.utils import eds
+from sovereign.utils.eds import EndpointTables, locality_lb_endpoints
 
 
 def test_eds_utility_adds_padding_to_zones_with_multiple_regions():
@@ -104,3 +107,73 @@ def test_health_check_config_added():
             endpoint["lb_endpoints"][0]["endpoint"]["health_check_config"]["port_value"]
             == 8080
         )
+
+
+UPSTREAMS = [
+    {"address": "google.com", "port": 443, "region": "us-west-2"},
+    {"address": "facebook.com", "port": 443, "region": "us-west-1"},
+]
+
+
+def test_endpoint_tables_are_shared_by_proxies_in_a_zone(
+    discovery_request, monkeypatch
+):
+    monkeypatch.setattr(eds.config, "worker_v2_enabled", True)
+    monkeypatch.setattr(eds, "TABLES", EndpointTables())
+    discovery_request.node.locality.zone = "us-west-1"
+    first = locality_lb_endpoints(UPSTREAMS, discovery_request, resolve_dns=False)
+    second = locality_lb_endpoints(
+        [dict(u) for u in UPSTREAMS], discovery_request, resolve_dns=False
+    )
+    locality_lb_endpoints(UPSTREAMS, resolve_dns=False)
+
+    assert first == second
+    assert len(eds.TABLES.tables) == 2
+
+
+def test_endpoint_tables_are_not_kept_by_worker_v1(monkeypatch):
+    monkeypatch.setattr(eds.config, "worker_v2_enabled", False)
+    monkeypatch.setattr(eds, "TABLES", EndpointTables())
+
+    locality_lb_endpoints(UPSTREAMS, resolve_dns=False)
+
+    assert not eds.TABLES.tables
+
+
+def test_changing_a_shared_endpoint_table_leaves_the_next_render_alone():
+    tables = EndpointTables()
+
+    def build():
+        return [{"lb_endpoints": [{"endpoint": {"port_value": 443}}]}]
+
+    first = tables.get("key", None, build)
+    first[0]["lb_endpoints"][0]["endpoint"]["port_value"] = 80
+    first.append({})
+
+    assert tables.get("key", None, build) == build()
+
+
+def test_zone_padding_leaves_global_random_state_alone():
+    random.seed(1)
+    expected = random.random()
+    random.seed(1)
+
+    locality_lb_endpoints(UPSTREAMS[:1] + UPSTREAMS, resolve_dns=False)
+
+    assert random.random() == expected
+
+
+def test_endpoint_tables_expire():
+    tables = EndpointTables()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return []
+
+    tables.get("key", None, build)
+    tables.get("key", None, build)
+    tables.get("other", 0, build)
+    tables.get("other", 0, build)
+
+    assert len(builds) == 3
@@ -0,0 +1,61 @@
+from sovereign.utils.indexes import ContextIndex, ContextIndexes
+
+BACKENDS = [
+    {"name": "a", "service_clusters": ["x", "y"]},
+    {"name": "any", "service_clusters": ["*"]},
+    {"name": "b", "service_clusters": ["y"]},
+    {"name": "none"},
+]
+
+
+def names(items) -> list[str]:
+    return [item["name"] for item in items]
+
+
+def test_lookups_keep_the_order_of_the_context():
+    index = ContextIndex(BACKENDS, "service_clusters")
+
+    assert names(index.get("x")) == ["a", "any"]
+    assert names(index.get("y")) == ["a", "any", "b"]
+
+
+def test_unknown_values_match_only_wildcard_items():
+    index = ContextIndex(BACKENDS, "service_clusters")
+
+    assert names(index.get("z")) == ["any"]
+
+
+def test_wildcard_values_match_every_item():
+    index = ContextIndex(BACKENDS, "service_clusters")
+
+    assert names(index.get("*")) == ["a", "any", "b", "none"]
+    assert len(index) == 4
+
+
+def test_scalar_keys_are_indexed():
+    index = ContextIndex(BACKENDS, "name")
+
+    assert index.get("b") == [BACKENDS[2]]
+    assert index.get(["unhashable"]) == []
+
+
+def test_indexes_are_rebuilt_only_when_the_data_changes():
+    indexes = ContextIndexes({"backends": ["service_clusters"]})
+
+    first = indexes.get("backends", BACKENDS, data_hash=1)
+    assert indexes.get("backends", list(BACKENDS), data_hash=1) is first
+    assert indexes.get("backends", BACKENDS) is first
+    changed = indexes.get("backends", BACKENDS[:1], data_hash=2)
+    assert changed is not first
+    assert names(changed["service_clusters"].get("y")) == ["a"]
+
+
+def test_only_declared_contexts_are_indexed():
+    indexes = ContextIndexes({"backends": ["service_clusters"]})
+
+    built = indexes.for_contexts(
+        {"backends": (BACKENDS, None), "other": (BACKENDS, None)}
+    )
+
+    assert list(built) == ["backends"]
+    assert list(built["backends"]) == ["service_clusters"]
@@ -0,0 +1,74 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from sovereign.configuration import SlowRendersConfig
+from sovereign.rendering_common import stream_resources
+from sovereign.utils.render_timing import (
+    RenderTiming,
+    SlowRenders,
+    StageTimer,
+    slow_renders,
+)
+
+
+def timing(total_ms: float, **kwargs) -> RenderTiming:
+    kwargs.setdefault("client_id", "client")
+    return RenderTiming(template="clusters", total_ms=total_ms, **kwargs)
+
+
+def test_only_the_slowest_renders_are_kept():
+    renders = SlowRenders(SlowRendersConfig(size=2))
+    for total_ms in (5, 1, 9, 3):
+        renders.add(timing(total_ms))
+
+    assert [r.total_ms for r in renders.slowest()] == [9, 5]
+    assert not renders.add(timing(2))
+    assert renders.is_slow(6)
+    assert not renders.is_slow(4)
+
+
+def test_old_renders_are_forgotten():
+    renders = SlowRenders(SlowRendersConfig(size=2, max_age_secs=60))
+    renders.add(timing(100, rendered_at=time.time() - 120))
+    renders.add(timing(1))
+
+    assert [r.total_ms for r in renders.slowest()] == [1]
+
+
+def test_stages_are_timed_while_resources_are_streamed():
+    timer = StageTimer("render_ms", client_id="client", template="clusters", tags=[])
+
+    def resources():
+        for i in range(3):
+            time.sleep(0.01)
+            yield {"name": f"cluster-{i}"}
+
+    stream = stream_resources(resources(), "v3", "clusters", [], timer=timer)
+    result = timer.finish(resources=stream.count, size=len(stream.text))
+
+    assert set(result.stages_ms) == {"template", "hash", "serialize"}
+    # the template runs as its resources are asked for
+    assert result.stages_ms["template"] >= 30
+    assert result.total_ms >= sum(result.stages_ms.values())
+    assert result.resources == 3
+    assert result.size == len(stream.text)
+
+
+def test_deserializing_is_timed_for_text_templates():
+    timer = StageTimer("render_ms", client_id="client", template="clusters", tags=[])
+
+    stream_resources("resources:\n- name: a\n", "v3", "clusters", [], timer=timer)
+
+    assert "deserialize" in timer.timing.stages_ms
+
+
+def test_worker_serves_its_slowest_renders():
+    from sovereign.worker import worker
+
+    slow_renders.add(timing(10**6, client_id="slowest-client"))
+
+    response = TestClient(worker).get("/admin/slow_renders")
+
+    assert response.status_code == 200
+    assert response.json()[0]["client_id"] == "slowest-client"
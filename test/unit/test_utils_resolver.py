@@ -0,0 +1,112 @@
+from socket import gaierror
+
+import pytest
+
+from sovereign.configuration import DnsCacheConfig
+from sovereign.utils import resolver
+from sovereign.utils.resolver import DnsCache
+
+
+class FakeDns:
+    def __init__(self) -> None:
+        self.records = {"upstream.example.com": ["10.0.0.1", "10.0.0.2"]}
+        self.lookups: list[str] = []
+
+    def __call__(self, hostname: str):
+        self.lookups.append(hostname)
+        if hostname not in self.records:
+            raise gaierror(f"{hostname} not found")
+        return hostname, [], self.records[hostname]
+
+
+@pytest.fixture
+def dns(monkeypatch) -> FakeDns:
+    fake = FakeDns()
+    monkeypatch.setattr(resolver, "gethostbyname_ex", fake)
+    return fake
+
+
+def cache(**kwargs) -> DnsCache:
+    return DnsCache(DnsCacheConfig(enabled=True, **kwargs))
+
+
+def test_addresses_are_cached(dns):
+    dns_cache = cache()
+
+    for _ in range(3):
+        assert dns_cache.resolve("upstream.example.com") == ["10.0.0.1", "10.0.0.2"]
+
+    assert dns.lookups == ["upstream.example.com"]
+
+
+def test_expired_addresses_are_looked_up_again(dns):
+    dns_cache = cache(ttl_secs=0)
+
+    dns_cache.resolve("upstream.example.com")
+    dns.records["upstream.example.com"] = ["10.0.0.3"]
+
+    assert dns_cache.resolve("upstream.example.com") == ["10.0.0.3"]
+    assert len(dns.lookups) == 2
+
+
+def test_failures_are_cached(dns):
+    dns_cache = cache(negative_ttl_secs=60)
+
+    for _ in range(2):
+        with pytest.raises(gaierror):
+            dns_cache.resolve("missing.example.com")
+
+    assert dns.lookups == ["missing.example.com"]
+
+
+def test_stale_addresses_are_used_while_lookups_fail(dns):
+    dns_cache = cache(ttl_secs=0, negative_ttl_secs=60)
+    dns_cache.resolve("upstream.example.com")
+    del dns.records["upstream.example.com"]
+
+    assert dns_cache.resolve("upstream.example.com") == ["10.0.0.1", "10.0.0.2"]
+    # retried after the negative ttl instead of on every call
+    assert dns_cache.resolve("upstream.example.com") == ["10.0.0.1", "10.0.0.2"]
+    assert len(dns.lookups) == 2
+
+
+def test_stale_addresses_expire(dns):
+    dns_cache = cache(ttl_secs=0, stale_ttl_secs=0)
+    dns_cache.resolve("upstream.example.com")
+    del dns.records["upstream.example.com"]
+
+    with pytest.raises(gaierror):
+        dns_cache.resolve("upstream.example.com")
+
+
+def test_hostnames_in_context_are_prefetched(dns):
+    dns_cache = cache()
+    dns.records["other.example.com"] = ["10.0.1.1"]
+    context = {
+        "upstreams": [
+            {"address": "upstream.example.com", "port": 443},
+            {"address": "10.0.0.9", "port": 80},
+            {"hosts": [{"address": "other.example.com"}]},
+        ],
+        "address": "missing.example.com",
+    }
+
+    dns_cache.prefetch_context(context)
+
+    assert sorted(dns.lookups) == [
+        "missing.example.com",
+        "other.example.com",
+        "upstream.example.com",
+    ]
+    assert dns_cache.resolve("other.example.com") == ["10.0.1.1"]
+    assert len(dns.lookups) == 3
+
+
+def test_every_lookup_goes_to_dns_when_disabled(dns):
+    dns_cache = DnsCache(DnsCacheConfig(enabled=False))
+
+    dns_cache.prefetch_context({"address": "upstream.example.com"})
+    dns_cache.resolve("upstream.example.com")
+    dns_cache.resolve("upstream.example.com")
+
+    assert len(dns.lookups) == 2
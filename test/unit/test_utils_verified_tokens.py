@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from sovereign.utils import auth
+from sovereign.utils.verified_tokens import SLOT, VerifiedTokenCache
+
+
+def _cache(path: str | None = None, secret: bytes = b"secret", ttl: int = 60):
+    return VerifiedTokenCache(
+        secret=secret, slots=64, ttl=ttl, path=path, logger=MagicMock()
+    )
+
+
+@pytest.mark.parametrize("valid", [True, False])
+def test_verdicts_are_cached(valid):
+    cache = _cache()
+    assert cache.get("token") is None
+
+    cache.set("token", valid)
+
+    assert cache.get("token") is valid
+    assert cache.get("other-token") is None
+
+
+def test_verdicts_expire():
+    cache = _cache(ttl=-1)
+    cache.set("token", True)
+    assert cache.get("token") is None
+
+
+def test_table_is_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "verified_tokens")
+    _cache(path).set("token", True)
+
+    assert _cache(path).get("token") is True
+    # a different secret can't read, or be fooled by, the existing entries
+    assert _cache(path, secret=b"rotated").get("token") is None
+
+
+def test_files_that_others_could_write_are_refused(tmp_path):
+    target = tmp_path / "target"
+    target.write_bytes(b"precious")
+    target.chmod(0o600)
+    link = tmp_path / "link"
+    link.symlink_to(target)
+    readable = tmp_path / "readable"
+    readable.write_bytes(b"")
+    readable.chmod(0o644)
+
+    for path in (link, readable):
+        cache = _cache(str(path))
+        cache.set("token", True)
+
+        # cached in this process only
+        assert cache.get("token") is True
+        assert _cache(str(path)).get("token") is None
+        cache.logger.warning.assert_called_once()
+    assert target.read_bytes() == b"precious"
+
+
+def test_overwritten_slots_are_misses():
+    cache = _cache()
+    cache.set("token", True)
+    offset, _ = cache._slot(b"token")
+    expires_at, tag = SLOT.unpack_from(cache.table, offset)
+
+    # a torn write, or a forged verdict without the key
+    SLOT.pack_into(cache.table, offset, expires_at + 1, tag)
+
+    assert cache.get("token") is None
+
+
+def test_cached_tokens_are_not_decrypted(auth_string):
+    with patch.object(auth, "verified_tokens", _cache()):
+        assert auth.validate_authentication_string(auth_string)
+        with patch.object(
+            auth.server_cipher_container, "decrypt", side_effect=AssertionError
+        ):
+            assert auth.validate_authentication_string(auth_string)
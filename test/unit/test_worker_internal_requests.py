@@ -0,0 +1,26 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from sovereign import worker
+from sovereign.utils.mock import mock_discovery_request
+
+
+async def test_internal_requests_are_rendered_despite_a_backlog(monkeypatch):
+    monkeypatch.setattr(worker.config.internal_requests, "max_wait_secs", 0.2)
+    monkeypatch.setattr(worker, "ONDEMAND", worker.RenderQueue())
+    monkeypatch.setattr(worker, "INTERNAL", worker.RenderQueue())
+    monkeypatch.setattr(worker, "INTERNAL_ENTRIES", worker.InternalEntries(8))
+    rendered = asyncio.Event()
+    job = MagicMock()
+    job.submit.side_effect = rendered.set
+    monkeypatch.setattr(worker, "render_job", lambda *args, **kwargs: job)
+    request = mock_discovery_request("v3", "clusters")
+    # an Envoy request that is never taken off the queue
+    await worker.ONDEMAND.put(("envoy", request))
+    await worker.INTERNAL.put(("ui", request))
+
+    task = asyncio.create_task(worker.render_internal(None))
+    try:
+        await asyncio.wait_for(rendered.wait(), timeout=2)
+    finally:
+        task.cancel()
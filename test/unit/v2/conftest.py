@@ -0,0 +1,41 @@
+from typing import Any, Callable
+
+import pytest
+
+from sovereign.types import DiscoveryRequest
+from sovereign.utils.mock import mock_discovery_request
+from sovereign.v2.types import Context, DiscoveryEntry
+
+
+@pytest.fixture(scope="function")
+def make_entry() -> Callable[..., DiscoveryEntry]:
+    """
+    Builds discovery entries for a v3 clusters request, with no response
+    unless one is given.
+    """
+
+    def make(
+        request_hash: str = "abc",
+        request: DiscoveryRequest | None = None,
+        **fields: Any,
+    ) -> DiscoveryEntry:
+        fields.setdefault("template", "clusters")
+        fields.setdefault("response", None)
+        return DiscoveryEntry(
+            request_hash=request_hash,
+            request=request or mock_discovery_request("v3", "clusters"),
+            **fields,
+        )
+
+    return make
+
+
+@pytest.fixture(scope="function")
+def make_context() -> Callable[..., Context]:
+    def make(data: Any = None, data_hash: int = 1, **fields: Any) -> Context:
+        fields.setdefault("name", "backends")
+        fields.setdefault("last_refreshed_at", 1)
+        fields.setdefault("refresh_after", 2)
+        return Context(data={} if data is None else data, data_hash=data_hash, **fields)
+
+    return make
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+
+from sovereign.v2.data.context_codecs import (
+    ZSTD_AVAILABLE,
+    JsonZlibCodec,
+    PickleCodec,
+    get_context_codec,
+)
+
+DATA = {"backends": [{"name": "a", "port": 443}, {"name": "b", "port": 80}]}
+
+
+@pytest.mark.parametrize("codec", [PickleCodec(), JsonZlibCodec()])
+def test_codec_roundtrip(codec):
+    assert codec.decode(codec.encode(DATA)) == DATA
+
+
+@pytest.mark.parametrize(
+    "data",
+    [{443: "https"}, {"ports": (443, 80)}, {"expires": datetime(2026, 1, 1)}],
+)
+def test_json_codec_refuses_data_that_would_change(data):
+    with pytest.raises((TypeError, ValueError)):
+        JsonZlibCodec().encode(data)
+
+
+def test_get_context_codec():
+    assert isinstance(get_context_codec("pickle"), PickleCodec)
+    assert isinstance(get_context_codec("json"), JsonZlibCodec)
+
+
+def test_get_context_codec_unknown():
+    with pytest.raises(ValueError):
+        get_context_codec("does_not_exist")
+
+
+@pytest.mark.skipif(ZSTD_AVAILABLE, reason="zstandard is installed")
+def test_zstd_codec_requires_zstandard():
+    with pytest.raises(ImportError):
+        get_context_codec.__wrapped__("zstd")
@@ -0,0 +1,101 @@
+import copy
+import json
+from unittest.mock import patch
+
+import pytest
+
+from sovereign.v2.data.data_store import DataType, InMemoryDataStore
+from sovereign.v2.data.repositories import ContextRepository
+
+
+@pytest.fixture(scope="function")
+def data_store() -> InMemoryDataStore:
+    return InMemoryDataStore()
+
+
+@pytest.fixture(scope="function")
+def context_repository(data_store: InMemoryDataStore) -> ContextRepository:
+    return ContextRepository(data_store)
+
+
+def test_get_cached_decodes_once_while_hash_is_unchanged(
+    data_store: InMemoryDataStore,
+    context_repository: ContextRepository,
+    make_context,
+):
+    """
+    Repeated lookups of an unchanged context should only read the full context once.
+    """
+    data_store.set(DataType.Context, "backends", make_context({"a": 1}))
+
+    with patch.object(
+        context_repository, "get", wraps=context_repository.get
+    ) as full_reads:
+        for _ in range(10):
+            context = context_repository.get_cached("backends")
+            assert context is not None
+            assert context.data == {"a": 1}
+
+    assert full_reads.call_count == 1
+
+
+def test_get_cached_reloads_when_hash_changes(
+    data_store: InMemoryDataStore,
+    context_repository: ContextRepository,
+    make_context,
+):
+    """
+    A context written by another process should be re-read once its data_hash changes.
+    """
+    data_store.set(DataType.Context, "backends", make_context({"a": 1}))
+    assert context_repository.get_cached("backends").data == {"a": 1}
+
+    # bypass the repository to simulate a write from a different process
+    data_store.set(DataType.Context, "backends", make_context({"a": 2}, 2))
+
+    assert context_repository.get_cached("backends").data == {"a": 2}
+
+
+def test_save_populates_cache(
+    data_store: InMemoryDataStore,
+    context_repository: ContextRepository,
+    make_context,
+):
+    """
+    Saving a context should make it available without another full read.
+    """
+    context_repository.save(make_context({"a": 1}))
+
+    with patch.object(
+        context_repository, "get", wraps=context_repository.get
+    ) as full_reads:
+        assert context_repository.get_cached("backends").data == {"a": 1}
+
+    assert full_reads.call_count == 0
+
+
+def test_get_cached_missing_context(context_repository: ContextRepository):
+    assert context_repository.get_cached("does_not_exist") is None
+
+
+def test_cached_data_can_not_be_changed_by_a_render(
+    data_store: InMemoryDataStore,
+    context_repository: ContextRepository,
+    make_context,
+):
+    """
+    Every render is handed the same cached data, so changing it is refused
+    rather than leaking into the next render. A copy can still be changed.
+    """
+    data_store.set(DataType.Context, "backends", make_context({"hosts": [{"a": 1}]}))
+    data = context_repository.get_cached("backends").data
+
+    with pytest.raises(TypeError):
+        data["hosts"].append({"b": 2})
+    with pytest.raises(TypeError):
+        data["hosts"][0]["a"] = 2
+    copied = copy.deepcopy(data)
+    copied["hosts"][0]["a"] = 2
+
+    assert context_repository.get_cached("backends").data == {"hosts": [{"a": 1}]}
+    assert json.loads(json.dumps(data)) == {"hosts": [{"a": 1}]}
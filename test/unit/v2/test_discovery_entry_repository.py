@@ -0,0 +1,131 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from sovereign.utils.mock import mock_discovery_request
+from sovereign.v2 import web
+from sovereign.v2.data.data_store import DataType, InMemoryDataStore
+from sovereign.v2.data.repositories import ContextRepository, DiscoveryEntryRepository
+from sovereign.v2.data.worker_queue import InMemoryQueue
+from sovereign.v2.jobs.render_discovery_job import render_discovery_response
+from sovereign.v2.types import entry_template
+
+
+@pytest.fixture(scope="function")
+def data_store() -> InMemoryDataStore:
+    return InMemoryDataStore()
+
+
+@pytest.fixture(scope="function")
+def repository(data_store: InMemoryDataStore) -> DiscoveryEntryRepository:
+    return DiscoveryEntryRepository(data_store)
+
+
+def test_access_times_are_written_in_batches(
+    data_store: InMemoryDataStore, repository: DiscoveryEntryRepository, make_entry
+):
+    """
+    Accesses should be held in memory until the flush interval has passed,
+    then written with a single call to the data store.
+    """
+    repository.save(make_entry("a", last_accessed_at=1))
+    repository.save(make_entry("b", last_accessed_at=1))
+    repository.access_flush_interval = 60
+
+    with patch.object(
+        data_store, "set_property_many", wraps=data_store.set_property_many
+    ) as writes:
+        for _ in range(10):
+            repository.record_access("a")
+            repository.record_access("b")
+        assert writes.call_count == 0
+
+        repository._accessed_flushed_at -= 60
+        repository.record_access("a")
+        assert writes.call_count == 1
+
+    for request_hash in ("a", "b"):
+        entry = data_store.get(DataType.DiscoveryEntry, request_hash)
+        assert entry.last_accessed_at >= int(time.time()) - 1
+
+
+def test_delete_expired(
+    data_store: InMemoryDataStore, repository: DiscoveryEntryRepository, make_entry
+):
+    now = int(time.time())
+    repository.save(make_entry("active", last_accessed_at=now))
+    repository.save(make_entry("expired", last_accessed_at=now - 7200))
+    repository.save(make_entry("untracked", last_accessed_at=None))
+
+    assert repository.delete_expired(ttl=3600)
+
+    assert repository.exists("active")
+    assert not repository.exists("expired")
+    assert repository.exists("untracked")
+
+
+def test_internal_entries_are_not_found_by_template(
+    repository: DiscoveryEntryRepository, make_entry
+):
+    """
+    Entries for UI and API requests are kept out of the entries that are
+    rendered again when a context is refreshed.
+    """
+    internal = mock_discovery_request("v3", "clusters")
+    envoy = internal.model_copy(update={"is_internal_request": False})
+    for request_hash, request in (("internal", internal), ("envoy", envoy)):
+        repository.save(
+            make_entry(
+                request_hash,
+                request,
+                template=entry_template(request),
+                last_rendered_at=123,
+            )
+        )
+
+    assert repository.find_all_request_hashes_by_template("clusters") == ["envoy"]
+    assert repository.get_last_rendered_at("internal") == 123
+
+
+def test_stale_internal_entries_are_refreshed_once(
+    repository: DiscoveryEntryRepository, monkeypatch, make_entry
+):
+    monkeypatch.setattr(web, "_refreshes_queued", {})
+    queue = InMemoryQueue()
+    request = mock_discovery_request("v3", "clusters")
+    repository.save(
+        make_entry(
+            "internal",
+            request,
+            template=entry_template(request),
+            last_rendered_at=int(time.time()) - 3600,
+        )
+    )
+
+    for _ in range(3):
+        web._refresh_internal("internal", repository, queue)
+
+    assert queue.size() == 1
+
+
+def test_skipped_renders_count_as_renders(
+    repository: DiscoveryEntryRepository, make_entry, make_context
+):
+    contexts = ContextRepository(InMemoryDataStore())
+    for name in ("backends", "dynamic_backends"):
+        contexts.save(make_context(name=name))
+    request = mock_discovery_request("v3", "clusters")
+    repository.save(
+        make_entry(
+            "internal",
+            request,
+            template=entry_template(request),
+            last_rendered_at=10,
+        )
+    )
+
+    assert render_discovery_response("internal", contexts, repository, "node")
+    # no context changed, so nothing was rendered
+    assert repository.get("internal").response is None
+    assert repository.get_last_rendered_at("internal") > 10
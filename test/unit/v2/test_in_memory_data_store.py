@@ -0,0 +1,85 @@
+import asyncio
+import threading
+
+from sovereign.types import DiscoveryResponse
+from sovereign.v2.data.data_store import DataType, InMemoryDataStore
+
+
+async def test_waiter_wakes_when_response_is_set_from_another_thread(make_entry):
+    """
+    The worker renders on a different thread to the event loop that is waiting.
+    """
+    data_store = InMemoryDataStore()
+    data_store.set(DataType.DiscoveryEntry, "abc", make_entry())
+    response = DiscoveryResponse(version_info="1", resources=[{"name": "a"}])
+
+    timer = threading.Timer(
+        0.05,
+        data_store.set,
+        args=(DataType.DiscoveryEntry, "abc", make_entry(response=response)),
+    )
+    timer.start()
+    try:
+        serialized = await data_store.wait_for_serialized_response("abc", timeout=5)
+    finally:
+        timer.join()
+
+    assert serialized is not None
+    assert serialized.version_info == "1"
+    assert serialized.resource_count == 1
+    assert not data_store.response_waiters
+
+
+async def test_waiter_returns_existing_response_immediately(make_entry):
+    data_store = InMemoryDataStore()
+    response = DiscoveryResponse(version_info="1", resources=[])
+    data_store.set(DataType.DiscoveryEntry, "abc", make_entry(response=response))
+
+    serialized = await asyncio.wait_for(
+        data_store.wait_for_serialized_response("abc", timeout=5), timeout=1
+    )
+
+    assert serialized is not None
+    assert serialized.resource_count == 0
+
+
+async def test_waiter_for_new_version_ignores_same_version(make_entry):
+    """
+    Long-poll waiters already have a version, and are only woken by a different one.
+    """
+    data_store = InMemoryDataStore()
+    unchanged = DiscoveryResponse(version_info="1", resources=[])
+    changed = DiscoveryResponse(version_info="2", resources=[{"name": "a"}])
+    data_store.set(DataType.DiscoveryEntry, "abc", make_entry(response=unchanged))
+
+    async def render(response: DiscoveryResponse, delay: float):
+        await asyncio.sleep(delay)
+        data_store.set(DataType.DiscoveryEntry, "abc", make_entry(response=response))
+
+    results = await asyncio.gather(
+        render(unchanged, 0.05),
+        render(changed, 0.1),
+        data_store.wait_for_serialized_response("abc", timeout=5, current_version="1"),
+    )
+
+    assert results[2].version_info == "2"
+    assert not data_store.response_waiters
+
+    # the timeout returns whatever is stored
+    serialized = await data_store.wait_for_serialized_response(
+        "abc", timeout=0.05, current_version="2"
+    )
+    assert serialized.version_info == "2"
+
+
+def test_saving_a_render_keeps_accesses_recorded_during_it(make_entry):
+    data_store = InMemoryDataStore()
+    data_store.set(DataType.DiscoveryEntry, "abc", make_entry())
+    data_store.set_property(DataType.DiscoveryEntry, "abc", "last_accessed_at", 200)
+
+    rendered = make_entry(response=DiscoveryResponse(version_info="1", resources=[]))
+    data_store.set(DataType.DiscoveryEntry, "abc", rendered)
+
+    entry = data_store.get(DataType.DiscoveryEntry, "abc")
+    assert entry.response is not None
+    assert entry.last_accessed_at == 200
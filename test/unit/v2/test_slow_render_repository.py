@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from sovereign.configuration import config
+from sovereign.utils.render_timing import RenderTiming
+from sovereign.v2 import web
+from sovereign.v2.data.data_store import InMemoryDataStore, SqliteDataStore
+from sovereign.v2.data.repositories import SlowRenderRepository
+
+
+@pytest.fixture(params=["in_memory", "sqlite"])
+def repository(request, tmp_path, monkeypatch) -> SlowRenderRepository:
+    if request.param == "in_memory":
+        return SlowRenderRepository(InMemoryDataStore())
+    monkeypatch.setattr(
+        config, "worker_v2_data_store_path", str(tmp_path / "data_store.db")
+    )
+    return SlowRenderRepository(SqliteDataStore())
+
+
+def timing(total_ms: float, **kwargs) -> RenderTiming:
+    kwargs.setdefault("client_id", "client")
+    return RenderTiming(template="clusters", total_ms=total_ms, **kwargs)
+
+
+def test_slowest_renders_of_every_node_are_merged(repository, monkeypatch):
+    monkeypatch.setattr(config.slow_renders, "size", 3)
+    repository.save("node-a", [timing(9), timing(2)])
+    repository.save("node-b", [timing(5, client_id="other"), timing(3), timing(1)])
+
+    slowest = repository.slowest()
+
+    assert [r.total_ms for r in slowest] == [9, 5, 3]
+    assert slowest[1].client_id == "other"
+
+
+def test_saving_replaces_the_renders_of_a_node(repository):
+    repository.save("node-a", [timing(9)])
+    repository.save("node-a", [timing(10), timing(9)])
+
+    assert [r.total_ms for r in repository.slowest()] == [10, 9]
+
+
+def test_old_renders_are_left_out(repository, monkeypatch):
+    monkeypatch.setattr(config.slow_renders, "max_age_secs", 60)
+    repository.save("node-a", [timing(100, rendered_at=time.time() - 120), timing(1)])
+
+    assert [r.total_ms for r in repository.slowest()] == [1]
+
+
+def test_web_serves_the_slow_renders_of_worker_v2(testclient, monkeypatch):
+    repository = SlowRenderRepository(InMemoryDataStore())
+    repository.save("node-a", [timing(10**6, client_id="slowest-client")])
+    monkeypatch.setattr(config, "worker_v2_enabled", True)
+    monkeypatch.setattr(web, "_slow_render_repository", lambda: repository)
+
+    response = testclient.get("/admin/slow_renders")
+
+    assert response.status_code == 200
+    assert response.json()[0]["client_id"] == "slowest-client"
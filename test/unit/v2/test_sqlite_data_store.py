@@ -0,0 +1,295 @@
+import asyncio
+import json
+import pickle
+import sqlite3
+import time
+
+import pytest
+
+from sovereign.configuration import config
+from sovereign.types import DiscoveryResponse
+from sovereign.v2.data import context_codecs
+from sovereign.v2.data.data_store import DataType, SqliteDataStore
+from sovereign.v2.data.repositories import ContextRepository, DiscoveryEntryRepository
+
+RESPONSE = DiscoveryResponse(
+    version_info="123",
+    resources=[{"name": "cluster_a"}, {"name": "cluster_b"}],
+)
+
+
+@pytest.fixture(scope="function")
+def db_path(tmp_path, monkeypatch) -> str:
+    path = str(tmp_path / "data_store.db")
+    monkeypatch.setattr(config, "worker_v2_data_store_path", path)
+    return path
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_serialized_response_roundtrip(db_path, monkeypatch, compress, make_entry):
+    """
+    The stored response can be read back as JSON bytes, with or without compression.
+    """
+    monkeypatch.setattr(config, "worker_v2_compress_responses", compress)
+    repository = DiscoveryEntryRepository(SqliteDataStore())
+    entry = make_entry("abc", response=RESPONSE)
+    repository.save(entry)
+
+    response = repository.get_response("abc")
+
+    assert response is not None
+    assert response.version_info == "123"
+    assert response.resource_count == 2
+    assert response.body == entry.response.model_dump_json().encode()
+    assert repository.get_version("abc") == "123"
+    # the full entry is still available to the worker
+    assert repository.get("abc").response == entry.response
+
+
+def test_serialized_response_missing_until_rendered(db_path, make_entry):
+    repository = DiscoveryEntryRepository(SqliteDataStore())
+    entry = make_entry("abc")
+    repository.save(entry)
+
+    assert repository.exists("abc")
+    assert repository.get_response("abc") is None
+    assert repository.get_version("abc") is None
+    assert not repository.exists("does_not_exist")
+
+
+def test_legacy_table_is_migrated(db_path, make_entry):
+    """
+    Entries written before the version and count columns existed remain readable.
+    """
+    entry = make_entry("abc", response=RESPONSE)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            """
+            CREATE TABLE discovery_entries (
+                request_hash TEXT PRIMARY KEY,
+                template TEXT,
+                request TEXT,
+                response TEXT,
+                last_rendered_at INTEGER
+            )
+            """
+        )
+        conn.execute(
+            "INSERT INTO discovery_entries VALUES (?, ?, ?, ?, ?)",
+            (
+                "abc",
+                "clusters",
+                entry.request.model_dump_json(),
+                entry.response.model_dump_json(),
+                1,
+            ),
+        )
+
+    data_store = SqliteDataStore()
+    response = data_store.get_serialized_response("abc")
+
+    # legacy entries get a full ttl from the time of the migration
+    last_accessed_at = data_store.get_property(
+        DataType.DiscoveryEntry, "abc", "last_accessed_at"
+    )
+    assert last_accessed_at >= int(time.time()) - 1
+
+    assert response is not None
+    assert response.version_info == "123"
+    assert response.resource_count == 2
+    assert json.loads(response.body) == entry.response.model_dump()
+    assert data_store.get(DataType.DiscoveryEntry, "abc").response == entry.response
+
+
+def test_access_times_and_expiry(db_path, make_entry):
+    data_store = SqliteDataStore()
+    repository = DiscoveryEntryRepository(data_store)
+    for request_hash in ("active", "expired"):
+        entry = make_entry(request_hash, response=RESPONSE)
+        entry.last_accessed_at = 1
+        repository.save(entry)
+
+    repository.record_access("active")
+    assert repository.flush_access_times()
+    assert repository.delete_expired(ttl=3600)
+
+    assert repository.exists("active")
+    assert not repository.exists("expired")
+
+
+def test_saving_a_render_keeps_accesses_recorded_during_it(db_path, make_entry):
+    repository = DiscoveryEntryRepository(SqliteDataStore())
+    queued = make_entry("abc", response=RESPONSE)
+    queued.last_accessed_at = 100
+    repository.save(queued)
+    # flushed by the web server while the worker was rendering
+    repository.data_store.set_property(
+        DataType.DiscoveryEntry, "abc", "last_accessed_at", 200
+    )
+
+    repository.save(make_entry("abc", response=RESPONSE))
+    assert repository.get("abc").last_accessed_at == 200
+
+    accessed_later = make_entry("abc", response=RESPONSE)
+    accessed_later.last_accessed_at = 300
+    repository.save(accessed_later)
+    assert repository.get("abc").last_accessed_at == 300
+
+
+async def test_waiter_wakes_when_response_is_written(db_path, monkeypatch, make_entry):
+    """
+    A waiter should be woken by a response written through a different connection,
+    well before its timeout.
+    """
+    monkeypatch.setattr(config, "worker_v2_change_check_interval_secs", 0.01)
+    web_data_store = SqliteDataStore()
+    worker_repository = DiscoveryEntryRepository(SqliteDataStore())
+    entry = make_entry("abc", response=RESPONSE)
+
+    async def render_later():
+        await asyncio.sleep(0.1)
+        worker_repository.save(entry)
+
+    start = time.monotonic()
+    _, response = await asyncio.gather(
+        render_later(), web_data_store.wait_for_serialized_response("abc", timeout=5)
+    )
+
+    assert response is not None
+    assert response.version_info == "123"
+    assert time.monotonic() - start < 1
+    assert not web_data_store.response_waiters
+
+
+async def test_long_poll_waiter_wakes_on_new_version(db_path, monkeypatch, make_entry):
+    """
+    A waiter holding the current version sleeps through a re-render that produced
+    the same version, and wakes for the next one.
+    """
+    monkeypatch.setattr(config, "worker_v2_change_check_interval_secs", 0.01)
+    web_repository = DiscoveryEntryRepository(SqliteDataStore())
+    worker_repository = DiscoveryEntryRepository(SqliteDataStore())
+    worker_repository.save(make_entry("abc", response=RESPONSE))
+
+    async def render(version: str, delay: float):
+        await asyncio.sleep(delay)
+        response = RESPONSE.model_copy(update={"version_info": version})
+        entry = make_entry("abc", response=response)
+        worker_repository.save(entry)
+
+    results = await asyncio.gather(
+        render("123", 0.05),
+        render("456", 0.2),
+        web_repository.wait_for_response("abc", timeout=5, current_version="123"),
+    )
+
+    assert results[2].version_info == "456"
+
+
+async def test_waiters_beyond_the_sqlite_parameter_limit_are_woken(
+    db_path, monkeypatch, make_entry
+):
+    data_store = SqliteDataStore()
+    connect = data_store._get_connection
+
+    def connect_with_default_limit():
+        # builds vary, older sqlite only allows 999 bound parameters per query
+        conn = connect()
+        conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        return conn
+
+    monkeypatch.setattr(data_store, "_get_connection", connect_with_default_limit)
+    request_hashes = [f"hash-{i}" for i in range(2000)]
+    futures = [data_store.response_waiters.add(h) for h in request_hashes]
+    DiscoveryEntryRepository(data_store).save(
+        make_entry(request_hashes[-1], response=RESPONSE)
+    )
+
+    data_store._notify_rendered_responses()
+
+    await asyncio.wait_for(futures[-1], 1)
+    assert not futures[0].done()
+
+
+async def test_waiter_times_out_without_response(db_path):
+    data_store = SqliteDataStore()
+
+    assert await data_store.wait_for_serialized_response("abc", timeout=0.1) is None
+    assert not data_store.response_waiters
+
+
+@pytest.mark.parametrize("codec", ["pickle", "json"])
+def test_context_roundtrip(db_path, monkeypatch, codec, make_context):
+    monkeypatch.setattr(config, "worker_v2_context_codec", codec)
+    repository = ContextRepository(SqliteDataStore())
+    repository.save(make_context({"backends": [{"name": "a"}]}))
+
+    assert repository.get("backends").data == {"backends": [{"name": "a"}]}
+    with sqlite3.connect(db_path) as conn:
+        (stored_codec,) = conn.execute("SELECT data_codec FROM contexts").fetchone()
+    assert stored_codec == codec
+
+
+@pytest.mark.parametrize(
+    "data",
+    [{"ports": {443, 80}}, {443: "https"}, {"ports": (443, 80)}],
+)
+def test_context_falls_back_to_pickle(db_path, monkeypatch, data, make_context):
+    """
+    Data that the configured codec can't represent is still stored, using pickle.
+    """
+    monkeypatch.setattr(config, "worker_v2_context_codec", "json")
+    repository = ContextRepository(SqliteDataStore())
+    repository.save(make_context(data))
+
+    assert repository.get("backends").data == data
+    with sqlite3.connect(db_path) as conn:
+        (stored_codec,) = conn.execute("SELECT data_codec FROM contexts").fetchone()
+    assert stored_codec == "pickle"
+
+
+def test_json_is_only_checked_on_the_first_save_of_a_context(
+    db_path, monkeypatch, make_context
+):
+    monkeypatch.setattr(config, "worker_v2_context_codec", "json")
+    repository = ContextRepository(SqliteDataStore())
+    checks = []
+    load_json = context_codecs._load_json
+
+    def counting_load_json(data):
+        checks.append(data)
+        return load_json(data)
+
+    monkeypatch.setattr(context_codecs, "_load_json", counting_load_json)
+    for i in range(3):
+        repository.save(make_context({"backends": [{"name": "a", "port": i}]}))
+
+    assert len(checks) == 1
+
+
+def test_legacy_contexts_are_read_as_pickle(db_path, monkeypatch):
+    """
+    Contexts written before the codec column existed remain readable
+    after switching to a different codec.
+    """
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            """
+            CREATE TABLE contexts (
+                name TEXT PRIMARY KEY,
+                data BLOB,
+                data_hash INT,
+                refresh_after INTEGER,
+                last_refreshed_at INTEGER
+            )
+            """
+        )
+        conn.execute(
+            "INSERT INTO contexts VALUES (?, ?, ?, ?, ?)",
+            ("backends", pickle.dumps({"a": 1}), 1, 2, 1),
+        )
+
+    monkeypatch.setattr(config, "worker_v2_context_codec", "json")
+    data_store = SqliteDataStore()
+
+    assert data_store.get(DataType.Context, "backends").data == {"a": 1}